@@ -0,0 +1,111 @@
+"""Benchmark ukuran database dan throughput untuk setiap codec payload.
+
+Jalankan dari root repo:
+
+    python -m benchmarks.bench_compression [--input data.jsonl] [--events 20000]
+
+`--input` berisi satu objek JSON per baris (mis. `requests.jsonl`); setiap
+baris dipakai sebagai payload event. Tanpa `--input` dipakai payload
+sintetis yang mirip event sensor.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from src.compression import CompressionConfig, zstandard
+from src.fastpath import ColumnBatch
+from src.encoding import encode_payload
+from src.store import SQLiteEventStore
+
+BATCH_SIZE = 1000
+
+
+def load_payloads(path, count):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        return [lines[i % len(lines)] for i in range(count)]
+    rng = random.Random(42)
+    return [
+        {
+            "device": f"dev-{rng.randrange(200)}",
+            "reading": {"temperature": round(rng.uniform(15, 30), 2), "humidity": rng.randrange(30, 70)},
+            "status": rng.choice(["ok", "ok", "ok", "degraded"]),
+            "tags": ["building-a", f"floor-{rng.randrange(5)}"],
+            "seq": i,
+        }
+        for i in range(count)
+    ]
+
+
+def make_batches(payloads):
+    batches = []
+    for start in range(0, len(payloads), BATCH_SIZE):
+        batch = ColumnBatch()
+        for i, payload in enumerate(payloads[start:start + BATCH_SIZE], start=start):
+            batch.append("bench.payload", f"e-{i}", "2024-01-01T00:00:00+00:00", "bench", encode_payload(payload))
+        batches.append(batch)
+    return batches
+
+
+async def run_codec(name, batches, workdir):
+    db_path = os.path.join(workdir, f"{name.replace('+', '_')}.db")
+    config = CompressionConfig(default=name)
+    store = SQLiteEventStore(db_path, compression=config)
+    await store.initialize()
+
+    started = time.perf_counter()
+    for batch in batches:
+        await store.store_events(batch)
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    count = 0
+    async for _ in store.iter_events("bench.payload", chunk_size=BATCH_SIZE, raw=True):
+        count += 1
+    read_seconds = time.perf_counter() - started
+
+    async with store._shards[0].pool.write() as db:
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor = await db.execute("SELECT SUM(LENGTH(payload)) FROM events")
+        payload_bytes = (await cursor.fetchone())[0]
+        await cursor.close()
+    await store.close()
+    return {
+        "codec": name,
+        "db_bytes": os.path.getsize(db_path),
+        "payload_bytes": payload_bytes,
+        "write_eps": count / write_seconds,
+        "read_eps": count / read_seconds,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="file JSON lines yang dipakai sebagai payload")
+    parser.add_argument("--events", type=int, default=20_000)
+    args = parser.parse_args()
+
+    batches = make_batches(load_payloads(args.input, args.events))
+    codecs = ["none", "zlib", "zlib+dict"]
+    if zstandard is not None:
+        codecs += ["zstd", "zstd+dict"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [await run_codec(name, batches, workdir) for name in codecs]
+
+    baseline = results[0]["payload_bytes"]
+    print(f"{'codec':<10} {'db MiB':>8} {'payload MiB':>12} {'ratio':>6} {'write ev/s':>11} {'read ev/s':>10}")
+    for r in results:
+        print(
+            f"{r['codec']:<10} {r['db_bytes'] / 2**20:>8.2f} {r['payload_bytes'] / 2**20:>12.2f} "
+            f"{baseline / r['payload_bytes']:>6.2f} {r['write_eps']:>11,.0f} {r['read_eps']:>10,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
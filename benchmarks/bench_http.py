@@ -0,0 +1,117 @@
+"""Benchmark HTTP terhadap uvicorn lokal (proses terpisah, database sementara)."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import httpx
+
+from .workload import WorkloadConfig, generate, summarize
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 30.0
+READ_PAGE_SIZE = 500
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(workdir: str, env: Dict[str, str] = None):
+    """Jalankan `uvicorn src.main:app` dengan cwd `workdir` (events.db baru).
+
+    Log server ditulis ke `workdir/server.log`, bukan ke terminal benchmark.
+    """
+    port = _free_port()
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT, **(env or {})},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                httpx.get(url + "/", timeout=1.0).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn gagal start untuk benchmark HTTP")
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+
+
+async def _publish(url: str, endpoint: str, batches, concurrency: int) -> dict:
+    latencies, rejected = [], 0
+    pending = iter(batches)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal rejected
+        for batch in pending:
+            started = time.perf_counter()
+            response = await client.post(endpoint, json={"events": batch})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code == 429:
+                rejected += 1
+            else:
+                response.raise_for_status()
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+    summary = summarize(latencies, sum(len(batch) for batch in batches), seconds)
+    summary["requests"] = len(latencies)
+    summary["rejected"] = rejected
+    return summary
+
+
+async def _read(url: str, topics) -> dict:
+    latencies, rows = [], 0
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        started = time.perf_counter()
+        for topic in topics:
+            cursor = None
+            while True:
+                params = {"topic": topic, "limit": READ_PAGE_SIZE}
+                if cursor:
+                    params["after"] = cursor
+                requested = time.perf_counter()
+                response = await client.get("/events", params=params)
+                latencies.append(time.perf_counter() - requested)
+                body = response.json()
+                rows += len(body.get("data", []))
+                cursor = body.get("next_cursor")
+                if not cursor:
+                    break
+        seconds = time.perf_counter() - started
+    summary = summarize(latencies, len(latencies), seconds)
+    summary["rows"] = rows
+    return summary
+
+
+async def run(
+    config: WorkloadConfig, workdir: str, concurrency: int = 8, endpoint: str = "/publish/fast"
+) -> Dict[str, dict]:
+    batches = generate(config)
+    topics = sorted({event["topic"] for batch in batches for event in batch})
+    with local_server(workdir) as url:
+        publish = await _publish(url, endpoint, batches, concurrency)
+        read = await _read(url, topics)
+    return {f"http.publish{endpoint.removeprefix('/publish').replace('/', '_')}": publish, "http.events": read}
@@ -0,0 +1,68 @@
+"""Microbenchmark level store: `is_duplicate`, `store_event`, `store_events`, `get_events_page`."""
+import os
+import time
+from typing import Dict, List
+
+from src.fastpath import validate_batch
+from src.models import Event
+from src.store import SQLiteEventStore
+
+from .workload import WorkloadConfig, generate, summarize
+
+# store_event menulis satu transaksi per event; batasi agar suite tetap singkat
+SINGLE_EVENT_LIMIT = 2000
+READ_PAGE_SIZE = 100
+
+
+async def _timed(calls) -> List[float]:
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(config: WorkloadConfig, workdir: str) -> Dict[str, dict]:
+    batches = generate(config)
+    events = [event for batch in batches for event in batch]
+    results = {}
+
+    store = SQLiteEventStore(os.path.join(workdir, "store_batch.db"))
+    await store.initialize()
+    columns = [validate_batch({"events": batch}) for batch in batches]
+    started = time.perf_counter()
+    latencies = await _timed(lambda batch=batch: store.store_events(batch) for batch in columns)
+    # Throughput dalam event/detik, latensi per batch
+    results["store.store_events"] = summarize(latencies, len(events), time.perf_counter() - started)
+
+    # Campuran key yang sudah ada dan key baru: LRU, Bloom dan konfirmasi ke database
+    probes = [Event(**event) for event in events[:SINGLE_EVENT_LIMIT]]
+    probes += [Event(**{**event, "event_id": event["event_id"] + "-new"}) for event in events[:SINGLE_EVENT_LIMIT]]
+    started = time.perf_counter()
+    latencies = await _timed(lambda event=event: store.is_duplicate(event) for event in probes)
+    results["store.is_duplicate"] = summarize(latencies, len(probes), time.perf_counter() - started)
+
+    pages = []
+    for topic in sorted({event["topic"] for event in events}):
+        cursor = None
+        while True:
+            started = time.perf_counter()
+            page, cursor = await store.get_events_page(topic, limit=READ_PAGE_SIZE, after=cursor, raw=True)
+            pages.append((time.perf_counter() - started, len(page)))
+            if cursor is None:
+                break
+    seconds = sum(latency for latency, _ in pages)
+    summary = summarize([latency for latency, _ in pages], len(pages), seconds)
+    summary["rows"] = sum(rows for _, rows in pages)
+    results["store.get_events_page"] = summary
+    await store.close()
+
+    single = SQLiteEventStore(os.path.join(workdir, "store_single.db"))
+    await single.initialize()
+    singles = [Event(**event) for event in events[:SINGLE_EVENT_LIMIT]]
+    started = time.perf_counter()
+    latencies = await _timed(lambda event=event: single.store_event(event) for event in singles)
+    results["store.store_event"] = summarize(latencies, len(singles), time.perf_counter() - started)
+    await single.close()
+    return results
@@ -0,0 +1,131 @@
+"""Suite benchmark: microbenchmark store dan beban HTTP, dengan pembanding baseline.
+
+Jalankan dari root repo:
+
+    python -m benchmarks.run [--suite store,http] [--output hasil.json]
+                             [--baseline baseline.json] [--save-baseline]
+
+Hasil (throughput dan percentile latensi) ditulis ke JSON. Dengan
+`--baseline`, setiap benchmark dibandingkan dengan baseline: throughput
+yang turun atau p99 yang naik lebih dari `--tolerance` dicetak sebagai
+REGRESSION dan proses keluar dengan kode 1. `--save-baseline` menulis hasil
+run ini ke file baseline.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import List
+
+from . import bench_http, bench_store
+from .workload import WorkloadConfig
+
+SUITES = ("store", "http")
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Daftar regresi `current` terhadap `baseline` (kosong jika aman).
+
+    Kenaikan p99 di bawah `min_delta_ms` diabaikan agar noise pada operasi
+    sub-milidetik tidak dianggap regresi.
+    """
+    regressions = []
+    for name, base in baseline["results"].items():
+        result = current["results"].get(name)
+        if result is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {result['throughput']:,.1f}/s < baseline {base['throughput']:,.1f}/s"
+            )
+        if result["p99_ms"] > base["p99_ms"] * (1 + tolerance) and result["p99_ms"] - base["p99_ms"] > min_delta_ms:
+            regressions.append(f"{name}: p99 {result['p99_ms']:.3f} ms > baseline {base['p99_ms']:.3f} ms")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'benchmark':<26} {'ops/s':>12} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<26} {r['throughput']:>12,.1f} {r['p50_ms']:>9.3f} {r['p90_ms']:>9.3f} "
+            f"{r['p99_ms']:>9.3f} {r['max_ms']:>9.3f}"
+        )
+
+
+async def run(args) -> dict:
+    config = WorkloadConfig(
+        events=args.events,
+        batch_size=args.batch_size,
+        duplicate_ratio=args.duplicate_ratio,
+        topics=args.topics,
+        payload_size=args.payload_size,
+        seed=args.seed,
+        input=args.input,
+    )
+    results = {}
+    for suite in args.suite.split(","):
+        if suite not in SUITES:
+            raise SystemExit(f"Suite tidak dikenal: {suite} (pilihan: {', '.join(SUITES)})")
+        with tempfile.TemporaryDirectory() as workdir:
+            if suite == "store":
+                results.update(await bench_store.run(config, workdir))
+            else:
+                results.update(await bench_http.run(config, workdir, args.concurrency, args.endpoint))
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "workload": config.describe(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", default="store,http", help="daftar suite dipisah koma: store, http")
+    parser.add_argument("--input", help="file JSON lines untuk di-replay (mis. requests.jsonl)")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--topics", type=int, default=10, help="kardinalitas topic workload sintetis")
+    parser.add_argument("--payload-size", type=int, default=200, help="perkiraan ukuran payload (byte)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=8, help="jumlah klien HTTP paralel")
+    parser.add_argument("--endpoint", default="/publish/fast", choices=["/publish", "/publish/fast"])
+    parser.add_argument("--output", help="tulis hasil ke file JSON")
+    parser.add_argument("--baseline", help="file baseline untuk pembanding")
+    parser.add_argument("--save-baseline", action="store_true", help="simpan hasil ke file --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="batas regresi relatif (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    # Log per batch/duplikat dari store bukan bagian dari yang diukur; ERROR tetap tampil
+    logging.disable(logging.WARNING)
+    current = asyncio.run(run(args))
+    print_table(current["results"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline disimpan ke {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["workload"] != current["workload"]:
+            print("Peringatan: workload berbeda dari baseline, perbandingan mungkin tidak adil")
+        regressions = compare(current, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("Tidak ada regresi terhadap baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Workload event yang bisa diulang (seed tetap) untuk semua benchmark."""
+import json
+import math
+import random
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+
+@dataclass
+class WorkloadConfig:
+    """Bentuk workload: jumlah event, ukuran batch, rasio duplikat, dll.
+
+    `duplicate_ratio` adalah porsi event yang mengirim ulang `event_id`
+    yang sudah pernah dikirim (redelivery at-least-once). `input` berisi
+    file JSON lines untuk di-replay; baris yang punya `topic` dan `source`
+    dipakai sebagai event, selain itu sebagai payload.
+    """
+
+    events: int = 20_000
+    batch_size: int = 100
+    duplicate_ratio: float = 0.1
+    topics: int = 10
+    payload_size: int = 200
+    seed: int = 42
+    input: Optional[str] = None
+
+    def describe(self) -> dict:
+        return asdict(self)
+
+
+def _synthetic_payload(rng: random.Random, i: int, size: int) -> dict:
+    payload = {"seq": i, "device": f"dev-{rng.randrange(1000)}", "value": round(rng.uniform(0, 100), 3)}
+    # Isi teks acak sampai kira-kira `size` byte JSON
+    filler = size - len(json.dumps(payload)) - 12
+    if filler > 0:
+        payload["data"] = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(filler))
+    return payload
+
+
+def _load_lines(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def generate(config: WorkloadConfig) -> List[List[dict]]:
+    """Daftar batch `{"topic", "event_id", "source", "payload"}` siap di-POST."""
+    rng = random.Random(config.seed)
+    lines = _load_lines(config.input) if config.input else None
+    events = []
+    for i in range(config.events):
+        if events and rng.random() < config.duplicate_ratio:
+            events.append(dict(rng.choice(events)))
+            continue
+        if lines:
+            line = lines[i % len(lines)]
+            if "topic" in line and "source" in line:
+                event = {key: line[key] for key in ("topic", "source", "payload") if key in line}
+                event.setdefault("payload", {})
+                event["event_id"] = f"{line.get('event_id', 'replay')}-{i}"
+                events.append(event)
+                continue
+            payload = line
+        else:
+            payload = _synthetic_payload(rng, i, config.payload_size)
+        events.append({
+            "topic": f"bench.topic{i % config.topics}",
+            "event_id": f"evt-{config.seed}-{i}",
+            "source": f"bench-{i % 3}",
+            "payload": payload,
+        })
+    return [events[i:i + config.batch_size] for i in range(0, len(events), config.batch_size)]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentile nearest-rank dari list yang sudah diurutkan."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], operations: int, seconds: float) -> dict:
+    """Throughput (operasi/detik) dan percentile latensi dalam milidetik."""
+    ordered = sorted(latencies)
+    return {
+        "operations": operations,
+        "seconds": round(seconds, 4),
+        "throughput": round(operations / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
@@ -0,0 +1,532 @@
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from .compression import CODEC_NONE
+from .dedup import BloomFilter
+
+logger = logging.getLogger("event_aggregator.archive")
+
+MAGIC = b"EVARCH01"
+SEGMENT_SUFFIX = ".seg"
+# Ekor file: panjang footer JSON + magic
+_TAIL = struct.Struct("<I8s")
+BLOOM_HASHES = 7
+# Batas panjang nama direktori topic (batas nama file umumnya 255 byte)
+MAX_DIR_NAME = 200
+# Blok payload terdekompresi yang disimpan per segment
+BLOCK_CACHE = 8
+
+# (rowid, event_id, timestamp, source, payload_json, ts_ms) satu event yang diarsipkan
+ArchiveRow = Tuple[int, str, str, str, str, int]
+
+
+@dataclass
+class ArchiveConfig:
+    """Pengaturan tier arsip dingin.
+
+    Event yang lebih tua dari `max_age` detik dipindah dari tabel events ke
+    segment immutable di `directory`, satu segment per topic per partisi
+    waktu (`partition` detik, paling banyak `segment_rows` baris). Tanpa
+    `max_age` segment yang ada tetap dibaca, tetapi tidak ada event baru
+    yang dipindah.
+    """
+
+    directory: str
+    max_age: Optional[float] = None
+    partition: float = 24 * 3600
+    segment_rows: int = 100_000
+    block_rows: int = 256
+    bloom_bits_per_key: int = 10
+    interval: float = 300.0
+    pause: float = 0.01
+
+
+def _pack(typecode: str, values) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def key_hash(event_id: str) -> int:
+    """Hash 64-bit event_id untuk kolom key segment (sama dengan hash tombstone)."""
+    return int.from_bytes(hashlib.blake2b(event_id.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+def _key_index(event_ids: Sequence[str]) -> Tuple[array, array]:
+    """Hash key terurut beserta posisi barisnya: `(hash int64[n], baris uint32[n])`."""
+    hashes = [key_hash(event_id) for event_id in event_ids]
+    order = sorted(range(len(hashes)), key=hashes.__getitem__)
+    return array("q", [hashes[i] for i in order]), array("I", order)
+
+
+def _strings(values: Sequence[str]) -> Tuple[bytes, bytes]:
+    """Kolom string panjang variabel: `(offset uint32[n + 1], blob)`."""
+    encoded = [value.encode() for value in values]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return _pack("I", offsets), b"".join(encoded)
+
+
+def write_segment(
+    path: str, topic: str, rows: Sequence[ArchiveRow], block_rows: int = 256, bits_per_key: int = 10
+) -> int:
+    """Tulis segment kolumnar secara atomik (tmp + fsync + rename); kembalikan ukurannya.
+
+    Baris diurutkan per `(ts_ms, rowid)`. Kolom rowid, ts_ms, dan kode source
+    berupa array lebar tetap yang bisa dibaca langsung dari mmap; event_id
+    dan timestamp berupa offset + blob; payload dikompresi per blok
+    `block_rows` baris. Kolom `rowid_order` berisi posisi baris urut rowid;
+    kolom key berisi hash event_id terurut untuk binary
+    search dedup langsung dari mmap. Footer JSON memuat rentang waktu/rowid, dictionary
+    source, posisi kolom, dan posisi blok payload.
+    """
+    rows = sorted(rows, key=lambda row: (row[5], row[0]))
+    sources = sorted({row[3] for row in rows})
+    codes = {source: i for i, source in enumerate(sources)}
+    parts = [MAGIC]
+    columns = {}
+    size = len(MAGIC)
+
+    def put(data: bytes) -> List[int]:
+        nonlocal size
+        # Rata 8 byte agar view kolom angka bisa di-cast tanpa salinan
+        pad = -size % 8
+        if pad:
+            parts.append(b"\0" * pad)
+            size += pad
+        parts.append(data)
+        position = [size, len(data)]
+        size += len(data)
+        return position
+
+    columns["rowid"] = put(_pack("q", [row[0] for row in rows]))
+    # Permutasi baris urut rowid: paginasi cursor rowid cukup bisect, tanpa sort
+    columns["rowid_order"] = put(_pack("I", sorted(range(len(rows)), key=lambda i: rows[i][0])))
+    columns["ts_ms"] = put(_pack("q", [row[5] for row in rows]))
+    columns["source"] = put(_pack("I", [codes[row[3]] for row in rows]))
+    for name, index in (("event_id", 1), ("timestamp", 2)):
+        offsets, blob = _strings([row[index] for row in rows])
+        columns[name + "_offsets"] = put(offsets)
+        columns[name] = put(blob)
+    blocks = []
+    for start in range(0, len(rows), block_rows):
+        offsets, blob = _strings([row[4] for row in rows[start:start + block_rows]])
+        blocks.append(put(zlib.compress(offsets + blob, 6)))
+    bloom = BloomFilter(max(8, (len(rows) * bits_per_key + 7) // 8), BLOOM_HASHES)
+    for row in rows:
+        bloom.add(row[1])
+    columns["bloom"] = put(bytes(bloom.bits))
+    hashes, order = _key_index([row[1] for row in rows])
+    columns["key_hash"] = put(_pack("q", hashes))
+    columns["key_row"] = put(_pack("I", order))
+
+    footer = json.dumps({
+        "version": 2,
+        "topic": topic,
+        "count": len(rows),
+        "min_ts": rows[0][5] if rows else 0,
+        "max_ts": rows[-1][5] if rows else 0,
+        "min_rowid": min((row[0] for row in rows), default=0),
+        "max_rowid": max((row[0] for row in rows), default=0),
+        "sources": sources,
+        "block_rows": block_rows,
+        "bloom_hashes": BLOOM_HASHES,
+        "columns": columns,
+        "blocks": blocks,
+    }, separators=(",", ":"), ensure_ascii=False).encode()
+    parts += [footer, _TAIL.pack(len(footer), MAGIC)]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for part in parts:
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return size + len(footer) + _TAIL.size
+
+
+def _topic_dir(topic: str) -> str:
+    """Nama direktori aman untuk topic (tanpa `/`, `.`/`..`, atau nama terlalu panjang)."""
+    name = quote(topic, safe="").replace(".", "%2E")
+    if len(name) > MAX_DIR_NAME:
+        name = name[:MAX_DIR_NAME - 41] + "~" + hashlib.sha1(topic.encode()).hexdigest()
+    return name
+
+
+class Segment:
+    """Segment arsip yang dibuka lewat mmap; kolom dibaca tanpa menyalin file."""
+
+    def __init__(self, path: str, name: str = None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        size = len(self._map)
+        if size < len(MAGIC) + _TAIL.size or self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not an archive segment: {self.path}")
+        footer_len, magic = _TAIL.unpack_from(self._map, size - _TAIL.size)
+        if magic != MAGIC:
+            raise ValueError(f"Truncated archive segment: {self.path}")
+        end = size - _TAIL.size
+        meta = json.loads(self._map[end - footer_len:end])
+        self.topic = meta["topic"]
+        self.count = meta["count"]
+        self.min_ts, self.max_ts = meta["min_ts"], meta["max_ts"]
+        self.min_rowid, self.max_rowid = meta["min_rowid"], meta["max_rowid"]
+        self.sources = meta["sources"]
+        self.block_rows = meta["block_rows"]
+        self.bytes = size
+        self._source_codes = {source: i for i, source in enumerate(self.sources)}
+        self._columns = meta["columns"]
+        self._blocks = meta["blocks"]
+        self.rowids = self._ints("rowid", "q")
+        self.ts = self._ints("ts_ms", "q")
+        self._codes = self._ints("source", "I")
+        self._strings = {
+            name: (self._ints(name + "_offsets", "I"), self._column(name))
+            for name in ("event_id", "timestamp")
+        }
+        self.bloom = BloomFilter.from_bytes(self._column("bloom"), meta["bloom_hashes"])
+        if "rowid_order" in self._columns:
+            self._rowid_order = self._ints("rowid_order", "I")
+        else:
+            self._rowid_order = array("I", sorted(range(self.count), key=self.rowids.__getitem__))
+        if "key_hash" in self._columns:
+            self._keys = (self._ints("key_hash", "q"), self._ints("key_row", "I"))
+        else:
+            # Segment versi 1 belum punya kolom key: dibangun sekali saat dibutuhkan
+            self._keys = None
+        self._block_cache = OrderedDict()
+
+    def _column(self, name: str) -> memoryview:
+        start, length = self._columns[name]
+        view = memoryview(self._map)[start:start + length]
+        self._views.append(view)
+        return view
+
+    def _ints(self, name: str, typecode: str):
+        view = self._column(name)
+        if sys.byteorder == "little":
+            view = view.cast(typecode)
+            self._views.append(view)
+            return view
+        values = array(typecode)
+        values.frombytes(view)
+        values.byteswap()
+        return values
+
+    def _string(self, name: str, i: int) -> str:
+        offsets, blob = self._strings[name]
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode()
+
+    def event_id(self, i: int) -> str:
+        return self._string("event_id", i)
+
+    def _payload(self, i: int) -> str:
+        block, offset = divmod(i, self.block_rows)
+        cached = self._block_cache.get(block)
+        if cached is None:
+            start, length = self._blocks[block]
+            data = zlib.decompress(self._map[start:start + length])
+            rows = min(self.block_rows, self.count - block * self.block_rows)
+            offsets = array("I")
+            offsets.frombytes(data[:(rows + 1) * 4])
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            cached = (offsets, data[(rows + 1) * 4:])
+            self._block_cache[block] = cached
+            if len(self._block_cache) > BLOCK_CACHE:
+                self._block_cache.popitem(last=False)
+        else:
+            self._block_cache.move_to_end(block)
+        offsets, blob = cached
+        return blob[offsets[offset]:offsets[offset + 1]].decode()
+
+    def row(self, i: int) -> tuple:
+        """Baris ke-`i` dalam bentuk kolom `EVENT_COLUMNS` store (payload tidak terkompresi)."""
+        return (
+            self.rowids[i], self.topic, self.event_id(i), self._string("timestamp", i),
+            self.sources[self._codes[i]], self._payload(i), self.ts[i], CODEC_NONE,
+        )
+
+    def key_hashes(self):
+        """Hash key terurut dan posisi barisnya (view mmap untuk segment versi 2)."""
+        if self._keys is None:
+            self._keys = _key_index([self.event_id(i) for i in range(self.count)])
+        return self._keys
+
+    def contains(self, event_id: str, hashed: Optional[int] = None) -> bool:
+        """Cek key dedup: Bloom dulu, lalu binary search kolom hash key dan bandingkan event_id."""
+        if event_id not in self.bloom:
+            return False
+        hashes, rows = self.key_hashes()
+        hashed = key_hash(event_id) if hashed is None else hashed
+        i = bisect.bisect_left(hashes, hashed)
+        while i < len(hashes) and hashes[i] == hashed:
+            if self.event_id(rows[i]) == event_id:
+                return True
+            i += 1
+        return False
+
+    def select(self, filters: dict, by_time: bool, after, limit: int, stats: Optional[dict] = None) -> List[int]:
+        """Indeks baris yang cocok dengan filter dan posisi `after`, urut sesuai query.
+
+        `filters["seqs"]` (opsional) membatasi baris ke rowid hasil lookup payload_index.
+        Jumlah baris yang diperiksa ditambahkan ke `stats["scanned"]`.
+        """
+        codes = self._codes
+        seqs = filters.get("seqs")
+        code = None
+        if filters["source"]:
+            code = self._source_codes.get(filters["source"])
+            if code is None:
+                return []
+        since, until = filters["since_ms"], filters["until_ms"]
+        lo = 0 if since is None else bisect.bisect_left(self.ts, since)
+        hi = self.count if until is None else bisect.bisect_left(self.ts, until)
+        if by_time:
+            if after is not None:
+                lo = max(lo, bisect.bisect_left(self.ts, after[0]))
+                while lo < hi and (self.ts[lo], self.rowids[lo]) <= after:
+                    lo += 1
+            found = []
+            i = lo
+            for i in range(lo, hi):
+                if (code is None or codes[i] == code) and (seqs is None or self.rowids[i] in seqs):
+                    found.append(i)
+                    if len(found) >= limit:
+                        break
+            if stats is not None:
+                stats["scanned"] += min(i + 1, hi) - lo
+            return found
+        # Urutan rowid: mulai dari posisi setelah cursor di permutasi rowid
+        rowids, order = self.rowids, self._rowid_order
+        found = []
+        start = j = bisect.bisect_right(order, after, key=rowids.__getitem__)
+        for j in range(start, self.count):
+            i = order[j]
+            if lo <= i < hi and (code is None or codes[i] == code) and (seqs is None or rowids[i] in seqs):
+                found.append(i)
+                if len(found) >= limit:
+                    break
+        if stats is not None:
+            stats["scanned"] += min(j + 1, self.count) - start
+        return found
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+
+
+class KeyFilter:
+    """Bloom gabungan key semua segment satu topic.
+
+    Posisi bit diturunkan langsung dari hash 64-bit di kolom key segment
+    (double hashing), sehingga menambah segment tidak perlu membaca
+    event_id-nya. Dibangun ulang dua kali lebih besar bila kapasitas habis.
+    """
+
+    def __init__(self, capacity: int, bits_per_key: int = 10):
+        self.capacity = max(1024, capacity)
+        self.bits = bytearray((self.capacity * bits_per_key + 7) // 8)
+        self.num_bits = len(self.bits) * 8
+        self.keys = 0
+
+    def _positions(self, hashed: int):
+        hashed &= 0xFFFFFFFFFFFFFFFF
+        h1, h2 = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(BLOOM_HASHES)]
+
+    def add(self, hashes):
+        bits = self.bits
+        for hashed in hashes:
+            for pos in self._positions(hashed):
+                bits[pos >> 3] |= 1 << (pos & 7)
+            self.keys += 1
+
+    def __contains__(self, hashed: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(hashed))
+
+
+class ArchiveTier:
+    """Katalog segment arsip untuk satu shard.
+
+    Daftar segment yang sah disimpan di tabel `archive_segments` database
+    shard (ditulis dalam transaksi yang sama dengan penghapusan barisnya
+    dari tabel events); file di direktori yang tidak tercatat adalah sisa
+    pemindahan yang gagal dan dihapus saat `load`.
+    """
+
+    def __init__(self, directory: str, bits_per_key: int = 10):
+        self.directory = directory
+        self.bits_per_key = bits_per_key
+        self._segments: Dict[str, List[Segment]] = {}
+        # Satu filter key per topic: dedup ingest tidak memeriksa segment satu per satu
+        self._filters: Dict[str, KeyFilter] = {}
+
+    def segment_name(self, topic: str, partition_ms: int, first_rowid: int) -> str:
+        return f"{_topic_dir(topic)}/{partition_ms}-{first_rowid}{SEGMENT_SUFFIX}"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, *name.split("/"))
+
+    def load(self, names: Iterable[str]):
+        names = set(names)
+        for name in sorted(names):
+            try:
+                self.add(Segment(self.path(name), name))
+            except (OSError, ValueError) as e:
+                logger.error("Segment arsip %s tidak bisa dibuka: %s", name, e)
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                if name not in names and filename.endswith((SEGMENT_SUFFIX, ".tmp")):
+                    logger.warning("Menghapus segment arsip yatim: %s", name)
+                    os.unlink(path)
+
+    def add(self, segment: Segment):
+        segments = self._segments.setdefault(segment.topic, [])
+        segments.append(segment)
+        segments.sort(key=lambda s: (s.min_ts, s.min_rowid))
+        key_filter = self._filters.get(segment.topic)
+        if key_filter is None or key_filter.keys + segment.count > key_filter.capacity:
+            self._rebuild_filter(segment.topic)
+        else:
+            key_filter.add(segment.key_hashes()[0])
+
+    def _rebuild_filter(self, topic: str):
+        segments = self._segments.get(topic)
+        if not segments:
+            self._filters.pop(topic, None)
+            return
+        key_filter = KeyFilter(2 * sum(segment.count for segment in segments), self.bits_per_key)
+        for segment in segments:
+            key_filter.add(segment.key_hashes()[0])
+        self._filters[topic] = key_filter
+
+    def remove(self, segment: Segment):
+        segments = self._segments.get(segment.topic, [])
+        segments.remove(segment)
+        if not segments:
+            self._segments.pop(segment.topic, None)
+        # Bit Bloom tidak bisa dihapus: bangun ulang dari segment yang tersisa
+        self._rebuild_filter(segment.topic)
+        segment.close()
+        try:
+            os.unlink(segment.path)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, names: Iterable[str]):
+        """Hapus file segment yang ditulis tetapi tidak jadi dicatat."""
+        for name in names:
+            try:
+                os.unlink(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def topics(self) -> List[str]:
+        return list(self._segments)
+
+    def segments(self, topic: Optional[str] = None) -> List[Segment]:
+        if topic is not None:
+            return list(self._segments.get(topic, ()))
+        return [segment for segments in self._segments.values() for segment in segments]
+
+    @property
+    def max_rowid(self) -> int:
+        return max((segment.max_rowid for segment in self.segments()), default=0)
+
+    def contains(self, topic: str, event_id: str) -> bool:
+        """Cek key dedup lewat filter topic; segment hanya diperiksa bila filter positif."""
+        key_filter = self._filters.get(topic)
+        if key_filter is None:
+            return False
+        hashed = key_hash(event_id)
+        if hashed not in key_filter:
+            return False
+        return any(segment.contains(event_id, hashed) for segment in self._segments[topic])
+
+    def fetch(self, filters: dict, by_time: bool, after, limit: int, stats: Optional[dict] = None) -> List[tuple]:
+        """Sampai `limit` baris arsip setelah `after`, urut seperti query tabel events.
+
+        Segment di luar rentang waktu/rowid dilewati hanya dari footer; untuk
+        urutan rowid segment dibaca urut `min_rowid` dan berhenti begitu
+        halaman lengkap. Payload hanya didekompresi untuk baris yang
+        benar-benar dikembalikan.
+        """
+        topic, prefix = filters["topic"], filters["topic_prefix"]
+        since, until = filters["since_ms"], filters["until_ms"]
+        if filters.get("seqs") is not None and not filters["seqs"]:
+            return []
+        selected = [
+            segment
+            for segment_topic, segments in self._segments.items()
+            if not (topic and segment_topic != topic) and not (prefix and not segment_topic.startswith(prefix))
+            for segment in segments
+        ]
+        if not by_time:
+            selected.sort(key=lambda segment: segment.min_rowid)
+        candidates = []
+        for segment in selected:
+            if not by_time and len(candidates) >= limit and segment.min_rowid > candidates[-1][0]:
+                # Segment berikutnya hanya berisi rowid setelah halaman yang sudah lengkap
+                break
+            if since is not None and segment.max_ts < since:
+                continue
+            if until is not None and segment.min_ts >= until:
+                continue
+            if by_time:
+                if after is not None and (segment.max_ts, segment.max_rowid) <= after:
+                    continue
+            elif segment.max_rowid <= after:
+                continue
+            for i in segment.select(filters, by_time, after, limit, stats):
+                key = (segment.ts[i], segment.rowids[i]) if by_time else segment.rowids[i]
+                candidates.append((key, i, segment))
+            candidates.sort(key=lambda item: item[0])
+            del candidates[limit:]
+        return [segment.row(i) for _, i, segment in candidates[:limit]]
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "rows": sum(segment.count for segment in segments),
+            "bytes": sum(segment.bytes for segment in segments),
+        }
+
+    def close(self):
+        for segment in self.segments():
+            segment.close()
+        self._segments = {}
+        self._filters = {}
@@ -0,0 +1,96 @@
+import json
+import os
+import zlib
+from collections import OrderedDict
+from typing import Hashable, Iterable, NamedTuple, Optional
+
+
+class CachedBody(NamedTuple):
+    generation: int
+    body: str
+    count: int
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Cek header `If-None-Match` (boleh berisi beberapa tag atau `*`)."""
+    if not header:
+        return False
+    # Perbandingan lemah (RFC 9110): W/"x" cocok dengan "x"
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def stats_etag(stats: dict) -> str:
+    """ETag lemah dari isi body `/stats` (tanpa `uptime`).
+
+    Diturunkan dari isi, bukan counter generasi, karena antrean, subscriber,
+    cache, dan arsip berubah tanpa ada event yang di-ingest.
+    """
+    digest = zlib.crc32(json.dumps(stats, sort_keys=True, default=str).encode())
+    return f'W/"s-{digest:08x}"'
+
+
+class ResponseCache:
+    """Cache body response yang sudah diserialisasi, LRU dan dibatasi total byte.
+
+    Validitas entri ditentukan counter generasi: per topic untuk query
+    dengan `topic`, dan satu counter global untuk query lintas topic.
+    Counter dinaikkan setiap kali event topic tersebut ter-commit atau
+    dihapus, sehingga entri lama tidak perlu dicari untuk dibuang. ETag
+    diturunkan dari generasi (tanpa membaca body), ditambah nonce per
+    proses agar ETag dari sebelum restart tidak pernah cocok.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._bytes = 0
+        self._topic_generations = {}
+        self._generation = 0
+        self._nonce = os.urandom(4).hex()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def invalidate(self, topics: Iterable[str]):
+        for topic in set(topics):
+            self._topic_generations[topic] = self._topic_generations.get(topic, 0) + 1
+        self._generation += 1
+
+    def generation(self, topic: Optional[str]) -> int:
+        return self._topic_generations.get(topic, 0) if topic else self._generation
+
+    def etag(self, key: Hashable, generation: int) -> str:
+        return f'"{self._nonce}-{generation}-{zlib.crc32(repr(key).encode()):08x}"'
+
+    def get(self, key: Hashable, generation: int) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None or entry.generation != generation:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, generation: int, body: str, count: int):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.body)
+        self._entries[key] = CachedBody(generation, body, count)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
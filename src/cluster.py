@@ -0,0 +1,472 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from .config import build_service, build_store, configure_process
+from .fastpath import ColumnBatch
+from .metrics import REGISTRY, Registry, enabled as metrics_enabled, merge_snapshot
+from .models import Event
+from .pubsub import Broker, follow, literal_prefix
+from .service import QueueFullError
+from .store import InvalidCursor, InvalidFilter, encode_cursor
+
+logger = logging.getLogger("event_aggregator.cluster")
+
+# Env yang diwariskan supervisor ke worker HTTP
+WRITER_SOCKET_ENV = "EVENT_WRITER_SOCKET"
+STARTED_AT_ENV = "EVENT_AGGREGATOR_STARTED_AT"
+
+# Frame IPC: panjang body (uint32) diikuti JSON
+_FRAME = struct.Struct("<I")
+_ITER_PAGE_SIZE = 500
+
+
+async def _write_frame(writer: asyncio.StreamWriter, message: dict):
+    body = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode()
+    writer.write(_FRAME.pack(len(body)) + body)
+    await writer.drain()
+
+
+def _push_frame(writer: asyncio.StreamWriter, message: dict):
+    """Tulis frame tanpa menunggu drain (dipanggil dari callback sinkron)."""
+    body = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode()
+    writer.write(_FRAME.pack(len(body)) + body)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    try:
+        header = await reader.readexactly(_FRAME.size)
+        return json.loads(await reader.readexactly(_FRAME.unpack(header)[0]))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def _batch_columns(batch: ColumnBatch) -> list:
+    return [batch.topics, batch.event_ids, batch.timestamps, batch.sources, batch.payloads]
+
+
+class WriterServer:
+    """Proses writer tunggal: satu-satunya pemilik store dan EventService.
+
+    Worker HTTP mengirim request lewat Unix socket dengan id request, jadi
+    banyak request dari satu worker bisa berjalan bersamaan dan tetap
+    digabung oleh group-commit di sisi writer. Writer juga menyimpan snapshot
+    metrics terakhir setiap worker agar `/metrics` dirender dari semua proses.
+    """
+
+    def __init__(self, service, path: str, registry: Registry = REGISTRY):
+        self.service = service
+        self.path = path
+        self.registry = registry
+        self._server = None
+        self._connections = set()
+        # Snapshot kumulatif per koneksi worker; worker yang terputus digabung ke
+        # `_retired_metrics` agar counter yang sudah dilaporkan tidak pernah turun
+        self._worker_metrics: Dict[asyncio.StreamWriter, dict] = {}
+        self._retired_metrics: Dict[str, dict] = {}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info("Writer mendengarkan di %s", self.path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Handler yang masih menunggu frame dari worker dihentikan tanpa traceback
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        tasks = set()
+        feed = None
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+
+        def push(events):
+            # Event ter-commit diteruskan ke worker yang punya subscriber /subscribe
+            if not writer.is_closing():
+                _push_frame(writer, {"push": events})
+
+        async def respond(message: dict):
+            reply = {"id": message.get("id")}
+            try:
+                reply["result"] = await self._dispatch(message, writer)
+            except QueueFullError as e:
+                reply["error"] = {"type": "QueueFullError", "retry_after": e.retry_after}
+            except Exception as e:
+                reply["error"] = {"type": type(e).__name__, "message": str(e)}
+            async with lock:
+                await _write_frame(writer, reply)
+
+        try:
+            while True:
+                message = await _read_frame(reader)
+                if message is None:
+                    break
+                if message.get("op") == "feed":
+                    if feed is None:
+                        feed = push
+                        self.service.store.add_commit_listener(feed)
+                    async with lock:
+                        await _write_frame(writer, {"id": message.get("id"), "result": True})
+                    continue
+                task = asyncio.create_task(respond(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Dibatalkan oleh close(): request yang belum selesai ikut dibatalkan
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._connections.discard(connection)
+            snapshot = self._worker_metrics.pop(writer, None)
+            if snapshot is not None:
+                merge_snapshot(self._retired_metrics, snapshot, histograms_only=True)
+            if feed is not None:
+                self.service.store.remove_commit_listener(feed)
+            writer.close()
+
+    async def _dispatch(self, message: dict, worker: asyncio.StreamWriter):
+        op = message["op"]
+        if op == "process":
+            batch = ColumnBatch(*message["batch"])
+            return await self.service.process_events(batch, ack=message.get("ack", "committed"))
+        if op == "page":
+            events, next_cursor = await self.service.get_events_page(
+                message.get("topic"), limit=message["limit"], after=message.get("after"), raw=True,
+                **message.get("filters", {}),
+            )
+            return {"events": events, "next_cursor": next_cursor}
+        if op == "consume":
+            events, offset = await self.service.consume(message["group"], message["topic"], message["limit"], raw=True)
+            return [events, offset]
+        if op == "commit":
+            return await self.service.commit_offset(message["group"], message["topic"], message["offset"])
+        if op == "events_cached":
+            return list(await self.service.get_events_cached(
+                message.get("topic"), limit=message["limit"], after=message.get("after"),
+                if_none_match=message.get("if_none_match"), **message.get("filters", {}),
+            ))
+        if op in ("metrics", "push_metrics"):
+            if "snapshot" in message:
+                self._worker_metrics[worker] = message["snapshot"]
+            if op == "push_metrics":
+                return True
+            return self.registry.render(self._retired_metrics, *self._worker_metrics.values())
+        if op == "timeseries":
+            return await self.service.get_timeseries(**message["query"])
+        if op == "positions":
+            items = []
+            async for shard, rowid, event in self.service.store.iter_positions(
+                message.get("topic"), after=message.get("after"),
+                topic_prefix=message.get("topic_prefix"), chunk_size=message["limit"],
+            ):
+                items.append([shard, rowid, event])
+                if len(items) >= message["limit"]:
+                    break
+            return items
+        if op == "stats":
+            return await self.service.get_stats()
+        raise ValueError(f"Unknown op: {op}")
+
+
+class RemoteEventService:
+    """Pengganti `EventService` di worker HTTP: meneruskan semua operasi ke
+    proses writer, sehingga hanya satu proses yang menulis ke SQLite dan
+    `/stats` selalu berasal dari counter yang sama."""
+
+    def __init__(
+        self, path: str, connect_timeout: float = 10.0, registry: Registry = REGISTRY, metrics_interval: float = 5.0
+    ):
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self.registry = registry
+        self.metrics_interval = metrics_interval
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._metrics_task = None
+        self._pending = {}
+        self._next_id = 0
+        self._lock = asyncio.Lock()
+        # Broker lokal per worker, diisi event yang di-push proses writer
+        self.broker = Broker()
+        self._feeding = False
+
+    async def start(self):
+        if self._writer is not None:
+            return
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Writer mungkin belum selesai startup
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(0.05)
+        self._reader_task = asyncio.create_task(self._read_replies())
+        if self.metrics_interval > 0:
+            self._metrics_task = asyncio.create_task(self._push_metrics())
+
+    async def stop(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        for task in (self._reader_task, self._metrics_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+        self._reader_task = None
+        self._metrics_task = None
+        self._feeding = False
+        self.broker.close()
+        self._fail_pending(ConnectionError("Writer connection closed"))
+
+    async def replay_spool(self) -> int:
+        # Replay spool dijalankan oleh proses writer
+        return 0
+
+    async def _push_metrics(self):
+        # Histogram HTTP (publish, validasi) hanya ada di worker; writer menyimpan
+        # snapshot terakhir setiap worker untuk scrape /metrics di worker mana pun
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            if not metrics_enabled():
+                continue
+            try:
+                await self._call("push_metrics", snapshot=self.registry.snapshot())
+            except Exception as e:
+                logger.warning("Gagal mengirim metrics ke writer: %s", e)
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _read_replies(self):
+        while True:
+            reply = await _read_frame(self._reader)
+            if reply is None:
+                self._fail_pending(ConnectionError("Writer process disconnected"))
+                self.broker.close()
+                return
+            if "push" in reply:
+                self.broker.publish(tuple(event) for event in reply["push"])
+                continue
+            future = self._pending.pop(reply["id"], None)
+            if future is None or future.done():
+                continue
+            error = reply.get("error")
+            if error is None:
+                future.set_result(reply["result"])
+            elif error["type"] == "QueueFullError":
+                future.set_exception(QueueFullError(error["retry_after"]))
+            elif error["type"] == "InvalidCursor":
+                future.set_exception(InvalidCursor(error["message"]))
+            elif error["type"] == "InvalidFilter":
+                future.set_exception(InvalidFilter(error["message"]))
+            elif error["type"] == "ValueError":
+                future.set_exception(ValueError(error["message"]))
+            else:
+                future.set_exception(RuntimeError(f"{error['type']}: {error['message']}"))
+
+    async def _call(self, op: str, **params):
+        if self._writer is None:
+            await self.start()
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        async with self._lock:
+            await _write_frame(self._writer, {"id": self._next_id, "op": op, **params})
+        return await future
+
+    async def process_events(self, events: Union[List[Event], ColumnBatch], ack: str = "committed"):
+        batch = ColumnBatch.coerce(events)
+        return await self._call("process", batch=_batch_columns(batch), ack=ack)
+
+    async def get_events_page(
+        self, topic: str = None, limit: int = 1000, after: str = None, raw: bool = False, **filters
+    ):
+        # datetime tidak bisa dikirim sebagai JSON
+        filters = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in filters.items() if value is not None
+        }
+        page = await self._call("page", topic=topic, limit=limit, after=after, filters=filters)
+        events = page["events"]
+        if not raw:
+            events = [{**ev, "payload": json.loads(ev["payload"])} for ev in events]
+        return events, page["next_cursor"]
+
+    async def iter_events(
+        self, topic: str = None, after: str = None, raw: bool = False, **filters
+    ) -> AsyncIterator[dict]:
+        while True:
+            events, after = await self.get_events_page(
+                topic, limit=_ITER_PAGE_SIZE, after=after, raw=raw, **filters
+            )
+            for ev in events:
+                yield ev
+            if after is None:
+                return
+
+    async def get_events(self, topic: str = None, **filters):
+        return [ev async for ev in self.iter_events(topic, **filters)]
+
+    async def consume(self, group: str, topic: str, limit: int = 1000, raw: bool = False):
+        events, offset = await self._call("consume", group=group, topic=topic, limit=limit)
+        if not raw:
+            events = [{**ev, "payload": json.loads(ev["payload"])} for ev in events]
+        return events, offset
+
+    async def commit_offset(self, group: str, topic: str, offset: int) -> int:
+        return await self._call("commit", group=group, topic=topic, offset=offset)
+
+    async def _positions(self, topic, after, topic_prefix):
+        while True:
+            items = await self._call(
+                "positions", topic=topic, after=after, topic_prefix=topic_prefix, limit=_ITER_PAGE_SIZE
+            )
+            for shard, rowid, event in items:
+                yield shard, rowid, event
+            if len(items) < _ITER_PAGE_SIZE:
+                return
+            shard, rowid, _ = items[-1]
+            after = encode_cursor(rowid, shard)
+
+    async def subscribe(
+        self, pattern: str, after: str = None, buffer_size: int = 1000, policy: str = "drop", heartbeat: float = 15.0
+    ):
+        """Sama seperti `EventService.subscribe`, memakai broker lokal worker."""
+        if not self._feeding:
+            await self._call("feed")
+            self._feeding = True
+        subscription = self.broker.subscribe(pattern, buffer_size, policy)
+        backfill = None
+        if after is not None:
+            prefix = literal_prefix(pattern)
+            if prefix is None:
+                backfill = self._positions(pattern, after, None)
+            else:
+                backfill = self._positions(None, after, prefix or None)
+        return follow(self.broker, subscription, backfill, heartbeat)
+
+    async def get_timeseries(self, resolution: str = "minute", since=None, until=None, **query):
+        query = {
+            "resolution": resolution,
+            "since": since.isoformat() if isinstance(since, datetime) else since,
+            "until": until.isoformat() if isinstance(until, datetime) else until,
+            **query,
+        }
+        return await self._call("timeseries", query=query)
+
+    async def get_events_cached(
+        self, topic: str = None, limit: int = 1000, after: str = None, if_none_match: str = None, **filters
+    ):
+        filters = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in filters.items() if value is not None
+        }
+        etag, body, count = await self._call(
+            "events_cached", topic=topic, limit=limit, after=after, if_none_match=if_none_match, filters=filters
+        )
+        return etag, body, count
+
+    async def get_metrics(self) -> str:
+        """Teks `/metrics` gabungan writer dan semua worker, dirender oleh writer."""
+        return await self._call("metrics", snapshot=self.registry.snapshot())
+
+    async def get_stats(self):
+        stats = await self._call("stats")
+        # Subscriber terhubung ke worker masing-masing; yang dilaporkan milik worker ini
+        stats["subscriptions"] = self.broker.stats()
+        return stats
+
+
+def started_at() -> datetime:
+    """Waktu start layanan: dari supervisor jika ada, agar sama di semua worker."""
+    value = os.getenv(STARTED_AT_ENV)
+    return datetime.fromisoformat(value) if value else datetime.now(timezone.utc)
+
+
+async def _serve_writer(path: str):
+    # Dibangun langsung dari env; meng-import `main` akan mengulang setup modulnya
+    store = build_store()
+    service = build_service(store)
+    await store.initialize()
+    await service.replay_spool()
+    await service.start()
+    server = WriterServer(service, path)
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Menutup proses writer...")
+        await server.close()
+        await service.stop()
+        await store.close()
+
+
+def run_writer(path: str):
+    """Entry point proses writer (dipanggil lewat multiprocessing)."""
+    configure_process()
+    asyncio.run(_serve_writer(path))
+
+
+def serve(workers: int, host: str = "0.0.0.0", port: int = 8080, socket_path: Optional[str] = None):
+    """Jalankan satu proses writer dan `workers` worker HTTP uvicorn."""
+    import uvicorn
+
+    socket_path = socket_path or os.getenv("WRITER_SOCKET_PATH", "/tmp/event-aggregator-writer.sock")
+    os.environ.setdefault(STARTED_AT_ENV, datetime.now(timezone.utc).isoformat())
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    context = multiprocessing.get_context("spawn")
+    writer = context.Process(target=run_writer, args=(socket_path,), name="event-writer")
+    writer.start()
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        if not writer.is_alive() or time.monotonic() >= deadline:
+            writer.terminate()
+            raise RuntimeError("Proses writer gagal start")
+        time.sleep(0.05)
+
+    # Worker HTTP mewarisi env ini dan memakai RemoteEventService
+    os.environ[WRITER_SOCKET_ENV] = socket_path
+    try:
+        uvicorn.run("src.main:app", host=host, port=port, workers=workers)
+    finally:
+        writer.terminate()
+        writer.join()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+logger = logging.getLogger("event_aggregator.commit")
+
+
+class GroupCommitter:
+    """Gabungkan beberapa batch yang datang bersamaan ke dalam satu transaksi.
+
+    Setiap pemanggil `submit()` menunggu sampai batch-nya ikut ter-commit.
+    Flush dipicu saat jumlah event yang menunggu mencapai `max_batch_size`
+    atau setelah `max_delay` detik sejak event pertama masuk antrean.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List], Awaitable[List]],
+        max_batch_size: int = 5000,
+        max_delay: float = 0.002,
+        merge: Optional[Callable[[List], Any]] = None,
+    ):
+        self._flush = flush
+        self._merge = merge or (lambda groups: [item for items in groups for item in items])
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending = deque()  # (items, future)
+        self._pending_size = 0
+        self._has_work = None
+        self._full = None
+        self._task = None
+        self._closing = False
+        self.commits = 0
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._has_work = asyncio.Event()
+            self._full = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, items: Sequence) -> List:
+        """Masukkan batch ke antrean group-commit dan tunggu hasilnya."""
+        if not items:
+            return []
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((items, future))
+        self._pending_size += len(items)
+        self._has_work.set()
+        if self._pending_size >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    def _take_group(self):
+        group = []
+        size = 0
+        while self._pending and (not group or size + len(self._pending[0][0]) <= self.max_batch_size):
+            items, future = self._pending.popleft()
+            group.append((items, future))
+            size += len(items)
+        self._pending_size -= size
+        if not self._pending:
+            self._has_work.clear()
+        if self._pending_size < self.max_batch_size:
+            self._full.clear()
+        return group
+
+    async def _run(self):
+        while True:
+            await self._has_work.wait()
+            if not self._full.is_set() and not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            group = self._take_group()
+            if group:
+                await self._commit_group(group)
+            if self._closing and not self._pending:
+                return
+
+    async def _commit_group(self, group):
+        merged = self._merge([items for items, _ in group])
+        try:
+            results = await self._flush(merged)
+        except Exception as e:
+            logger.error("Group commit gagal (%d event): %s", len(merged), e)
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.commits += 1
+        offset = 0
+        for items, future in group:
+            if not future.done():
+                future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
+
+    async def close(self):
+        """Commit sisa antrean lalu hentikan loop group-commit."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._has_work.set()
+        self._full.set()
+        await self._task
+        self._task = None
@@ -0,0 +1,163 @@
+import logging
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd opsional; tanpa paket ini dipakai zlib
+    zstandard = None
+
+logger = logging.getLogger("event_aggregator.compression")
+
+# Nilai kolom `events.codec`: id codec di 8 bit bawah, id dictionary di atasnya
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_IDS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+DEFAULT_LEVELS = {CODEC_ZLIB: 6, CODEC_ZSTD: 3}
+# zlib hanya memakai 32 KiB terakhir dari dictionary (ukuran window)
+ZLIB_MAX_DICT = 32 * 1024
+
+
+def pack_tag(codec: int, dict_id: int = 0) -> int:
+    return codec | (dict_id << 8)
+
+
+def unpack_tag(tag: int) -> Tuple[int, int]:
+    return tag & 0xFF, tag >> 8
+
+
+@dataclass(frozen=True)
+class CodecSpec:
+    codec: int = CODEC_NONE
+    dictionary: bool = False
+
+
+def parse_codec(name: str) -> CodecSpec:
+    """`none`, `zlib`, `zstd`, atau `zlib+dict` / `zstd+dict`.
+
+    `zstd` tanpa paket `zstandard` turun ke `zlib`.
+    """
+    base, _, suffix = name.strip().lower().partition("+")
+    if base not in CODEC_IDS or suffix not in ("", "dict"):
+        raise ValueError(f"Unknown payload codec: {name!r}")
+    codec = CODEC_IDS[base]
+    if codec == CODEC_ZSTD and zstandard is None:
+        logger.warning("Paket zstandard tidak tersedia, payload dikompresi dengan zlib")
+        codec = CODEC_ZLIB
+    return CodecSpec(codec, dictionary=bool(suffix) and codec != CODEC_NONE)
+
+
+@dataclass
+class CompressionConfig:
+    """Codec payload default dan per topic (nama seperti di `parse_codec`).
+
+    Payload lebih kecil dari `min_size` byte disimpan apa adanya. Untuk
+    codec `+dict`, `dict_samples` payload pertama sebuah topic dipakai
+    untuk melatih dictionary berukuran `dict_size` byte.
+    """
+
+    default: str = "none"
+    topics: Dict[str, str] = field(default_factory=dict)
+    level: Optional[int] = None
+    min_size: int = 64
+    dict_samples: int = 1000
+    dict_size: int = 16 * 1024
+
+
+def train_dictionary(codec: int, samples: List[bytes], size: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    # zlib: dictionary preset berupa contoh payload; bagian akhir paling berpengaruh
+    return b"".join(samples)[-min(size, ZLIB_MAX_DICT):]
+
+
+class PayloadCodec:
+    """Kompresi/dekompresi payload untuk satu store.
+
+    Payload terkompresi disimpan sebagai BLOB dan kolom `codec` mencatat
+    codec serta dictionary-nya, sehingga baris lama (`codec = 0`, teks JSON)
+    tetap terbaca walau konfigurasi berubah.
+    """
+
+    def __init__(self, config: Optional[CompressionConfig] = None):
+        self.config = config or CompressionConfig()
+        self._default = parse_codec(self.config.default)
+        self._topics = {topic: parse_codec(name) for topic, name in self.config.topics.items()}
+        # (shard, dict_id) -> bytes; topic -> (dict_id, bytes) yang aktif untuk kompresi
+        self._dictionaries: Dict[Tuple[int, int], bytes] = {}
+        self._active: Dict[str, Tuple[int, bytes]] = {}
+        self._samples: Dict[str, List[bytes]] = {}
+        self._compressors = {}
+        self._decompressors = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._default.codec != CODEC_NONE or any(s.codec != CODEC_NONE for s in self._topics.values())
+
+    def spec_for(self, topic: str) -> CodecSpec:
+        return self._topics.get(topic, self._default)
+
+    def load_dictionary(self, shard: int, dict_id: int, topic: str, codec: int, data: bytes):
+        self._dictionaries[(shard, dict_id)] = data
+        if self.spec_for(topic) == CodecSpec(codec, True):
+            self._active[topic] = (dict_id, data)
+
+    def needs_dictionary(self, topic: str) -> bool:
+        return self.spec_for(topic).dictionary and topic not in self._active
+
+    def add_sample(self, topic: str, payload: str) -> Optional[List[bytes]]:
+        """Kumpulkan sampel; kembalikan daftar sampel begitu cukup untuk training."""
+        samples = self._samples.setdefault(topic, [])
+        samples.append(payload.encode())
+        if len(samples) >= self.config.dict_samples:
+            return self._samples.pop(topic)
+        return None
+
+    def _level(self, codec: int) -> int:
+        return self.config.level if self.config.level is not None else DEFAULT_LEVELS[codec]
+
+    def encode(self, topic: str, payload: str) -> Tuple[Union[str, bytes], int]:
+        """Kembalikan `(nilai_kolom_payload, tag_codec)`."""
+        spec = self.spec_for(topic)
+        data = payload.encode()
+        if spec.codec == CODEC_NONE or len(data) < self.config.min_size:
+            return payload, CODEC_NONE
+        dict_id, dictionary = self._active.get(topic, (0, None)) if spec.dictionary else (0, None)
+        if spec.codec == CODEC_ZSTD:
+            compressor = self._compressors.get((topic, dict_id))
+            if compressor is None:
+                dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+                compressor = zstandard.ZstdCompressor(level=self._level(CODEC_ZSTD), dict_data=dict_data)
+                self._compressors[(topic, dict_id)] = compressor
+            blob = compressor.compress(data)
+        elif dictionary:
+            c = zlib.compressobj(self._level(CODEC_ZLIB), zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+            blob = c.compress(data) + c.flush()
+        else:
+            blob = zlib.compress(data, self._level(CODEC_ZLIB))
+        if len(blob) >= len(data):
+            return payload, CODEC_NONE
+        return blob, pack_tag(spec.codec, dict_id)
+
+    def decode(self, value: Union[str, bytes], tag: int, shard: int = 0) -> str:
+        """Kembalikan teks JSON payload dari nilai kolom dan tag codec-nya."""
+        if not tag:
+            return value
+        codec, dict_id = unpack_tag(tag)
+        dictionary = self._dictionaries[(shard, dict_id)] if dict_id else None
+        if codec == CODEC_ZLIB:
+            if dictionary:
+                return zlib.decompressobj(zdict=dictionary).decompress(value).decode()
+            return zlib.decompress(value).decode()
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Payload dikompresi dengan zstd tetapi paket zstandard tidak terpasang")
+            decompressor = self._decompressors.get((shard, dict_id))
+            if decompressor is None:
+                dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+                decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+                self._decompressors[(shard, dict_id)] = decompressor
+            return decompressor.decompress(value).decode()
+        raise ValueError(f"Unknown payload codec tag: {tag}")
@@ -0,0 +1,96 @@
+import json
+import os
+
+from . import metrics
+from .archive import ArchiveConfig
+from .compression import CompressionConfig
+from .dedup import DedupIndex
+from .logs import setup_logging
+from .payload_index import parse_topic_indexes
+from .retention import RetentionConfig, RetentionPolicy, parse_topic_policies
+from .service import EventService
+from .spool import Spool
+from .store import SQLiteEventStore
+
+# Konstruksi dari environment, dipakai `main` dan proses writer multi-worker
+# tanpa perlu meng-import app FastAPI
+
+
+def configure_process():
+    """Pasang logging dan saklar metrics untuk proses ini."""
+    # Record masuk antrean di event loop; format dan tulis di thread listener
+    setup_logging(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        fmt=os.getenv("LOG_FORMAT", "text"),
+        sample_burst=int(os.getenv("LOG_SAMPLE_BURST", 10)),
+        sample_interval=float(os.getenv("LOG_SAMPLE_INTERVAL", 1.0)),
+    )
+    metrics.set_enabled(os.getenv("METRICS_ENABLED", "1") != "0")
+
+
+def build_store() -> SQLiteEventStore:
+    return SQLiteEventStore(
+        "events.db",
+        dedup_index=DedupIndex(
+            bloom_bytes_per_topic=int(os.getenv("DEDUP_BLOOM_BYTES", 128 * 1024)),
+            lru_size=int(os.getenv("DEDUP_LRU_SIZE", 100_000)),
+        ),
+        read_pool_size=int(os.getenv("SQLITE_READERS", 4)),
+        shards=int(os.getenv("SQLITE_SHARDS", 1)),
+        compression=CompressionConfig(
+            default=os.getenv("PAYLOAD_CODEC", "none"),
+            topics=json.loads(os.getenv("PAYLOAD_CODEC_TOPICS", "{}")),
+            min_size=int(os.getenv("PAYLOAD_COMPRESS_MIN_SIZE", 64)),
+            dict_samples=int(os.getenv("PAYLOAD_DICT_SAMPLES", 1000)),
+        ),
+        pragmas={
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -65536)),
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 268435456)),
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+        },
+        archive=ArchiveConfig(
+            directory=os.environ["ARCHIVE_DIR"],
+            max_age=float(os.environ["ARCHIVE_MAX_AGE"]) if os.getenv("ARCHIVE_MAX_AGE") else None,
+            partition=float(os.getenv("ARCHIVE_PARTITION", 24 * 3600)),
+            segment_rows=int(os.getenv("ARCHIVE_SEGMENT_ROWS", 100_000)),
+            interval=float(os.getenv("ARCHIVE_INTERVAL", 300.0)),
+        ) if os.getenv("ARCHIVE_DIR") else None,
+        payload_indexes=parse_topic_indexes(os.getenv("PAYLOAD_INDEXES", "")),
+    )
+
+
+def build_service(store: SQLiteEventStore) -> EventService:
+    service = EventService(
+        store,
+        stats_flush_interval=float(os.getenv("STATS_FLUSH_INTERVAL", 5.0)),
+        queue_maxsize=int(os.getenv("INGEST_QUEUE_SIZE", 64)),
+        workers=int(os.getenv("INGEST_WORKERS", 2)),
+        micro_batch_size=int(os.getenv("INGEST_MICRO_BATCH", 5000)),
+        overflow=os.getenv("INGEST_OVERFLOW", "wait"),
+        put_timeout=float(os.getenv("INGEST_PUT_TIMEOUT", 1.0)),
+        retry_after=float(os.getenv("INGEST_RETRY_AFTER", 1.0)),
+        spool=(
+            Spool(os.environ["SPOOL_DIR"], segment_bytes=int(os.getenv("SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024)))
+            if os.getenv("SPOOL_DIR") else None
+        ),
+        retention=RetentionConfig(
+            default=RetentionPolicy(
+                max_age=float(os.environ["RETENTION_MAX_AGE"]) if os.getenv("RETENTION_MAX_AGE") else None,
+                max_rows=int(os.environ["RETENTION_MAX_ROWS"]) if os.getenv("RETENTION_MAX_ROWS") else None,
+            ),
+            topics=parse_topic_policies(os.getenv("RETENTION_TOPICS", "")),
+            dedup_window=float(os.getenv("DEDUP_RETENTION", 7 * 24 * 3600)),
+            interval=float(os.getenv("RETENTION_INTERVAL", 60.0)),
+            chunk_rows=int(os.getenv("RETENTION_CHUNK_ROWS", 1000)),
+            pause=float(os.getenv("RETENTION_PAUSE", 0.01)),
+            vacuum_pages=int(os.getenv("RETENTION_VACUUM_PAGES", 1000)),
+        ),
+        cache_bytes=int(os.getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024)),
+    )
+    # Gauge mengikuti service yang dibangun terakhir: di proses writer milik writer,
+    # di worker HTTP multi-worker service lokal yang antreannya selalu kosong
+    metrics.REGISTRY.gauge(
+        "event_queue_depth", "Jumlah batch di antrean ingest EventService", lambda: service.queue_stats()["depth"]
+    )
+    return service
@@ -0,0 +1,107 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class BloomFilter:
+    """Bloom filter sederhana berbasis bytearray dengan double hashing."""
+
+    def __init__(self, num_bytes: int, num_hashes: int = 7):
+        self.num_bits = num_bytes * 8
+        self.num_hashes = num_hashes
+        self.bits = bytearray(num_bytes)
+
+    @classmethod
+    def from_bytes(cls, bits, num_hashes: int = 7) -> "BloomFilter":
+        """Bungkus bit yang sudah ada (mis. view mmap) tanpa menyalin."""
+        bloom = cls(0, num_hashes)
+        bloom.bits = bits
+        bloom.num_bits = len(bits) * 8
+        return bloom
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DedupIndex:
+    """Indeks dedup in-memory di depan tabel `events`.
+
+    Setiap topic punya Bloom filter berukuran tetap, ditambah LRU berisi
+    key `(topic, event_id)` yang baru saja terlihat. `check()` menjawab
+    False (pasti baru), True (pasti duplikat), atau None (mungkin duplikat,
+    harus dikonfirmasi ke database).
+    """
+
+    def __init__(self, bloom_bytes_per_topic: int = 128 * 1024, bloom_hashes: int = 7, lru_size: int = 100_000):
+        self.bloom_bytes_per_topic = bloom_bytes_per_topic
+        self.bloom_hashes = bloom_hashes
+        self.lru_size = lru_size
+        self._blooms: Dict[str, BloomFilter] = {}
+        self._recent: OrderedDict = OrderedDict()
+        self.definite_new = 0
+        self.false_positives = 0
+        self.true_positives = 0
+
+    def _remember(self, key):
+        if self.lru_size <= 0:
+            return
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+    def check(self, topic: str, event_id: str) -> Optional[bool]:
+        key = (topic, event_id)
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            return True
+        bloom = self._blooms.get(topic)
+        if bloom is None or event_id not in bloom:
+            self.definite_new += 1
+            return False
+        return None
+
+    def record(self, topic: str, event_id: str, duplicate: bool):
+        """Catat hasil konfirmasi database untuk key yang `check()`-nya None."""
+        if duplicate:
+            self.true_positives += 1
+            self._remember((topic, event_id))
+        else:
+            self.false_positives += 1
+
+    def add(self, topic: str, event_id: str, remember: bool = True):
+        bloom = self._blooms.get(topic)
+        if bloom is None:
+            bloom = self._blooms[topic] = BloomFilter(self.bloom_bytes_per_topic, self.bloom_hashes)
+        bloom.add(event_id)
+        if remember:
+            self._remember((topic, event_id))
+
+    @property
+    def false_positive_rate(self) -> float:
+        negatives = self.definite_new + self.false_positives
+        if not negatives:
+            return 0.0
+        return self.false_positives / negatives
+
+    def stats(self) -> dict:
+        return {
+            "false_positive_rate": round(self.false_positive_rate, 6),
+            "false_positives": self.false_positives,
+            "topics": len(self._blooms),
+            "bloom_bytes": len(self._blooms) * self.bloom_bytes_per_topic,
+            "lru_entries": len(self._recent),
+        }
@@ -0,0 +1,48 @@
+import json
+from typing import Any, Iterable, Optional, Sequence
+
+# Payload bersifat opaque bagi aggregator: disimpan dalam satu encoding
+# JSON kanonik yang ringkas dan disisipkan apa adanya ke response.
+_compact = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+_dumps_str = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def encode_payload(payload: Any) -> str:
+    """Encode payload ke JSON kanonik ringkas (bentuk yang disimpan di DB)."""
+    return _compact(payload)
+
+
+def render_event(ev: dict) -> str:
+    """Render event mentah (payload berupa teks JSON) tanpa parse ulang payload."""
+    seq = ev.get("seq")
+    return (
+        ('{"seq":' + str(seq) + ',"topic":' if seq is not None else '{"topic":')
+        + _dumps_str(ev["topic"])
+        + ',"event_id":' + _dumps_str(ev["event_id"])
+        + ',"timestamp":' + _dumps_str(ev["timestamp"])
+        + ',"source":' + _dumps_str(ev["source"])
+        + ',"payload":' + ev["payload"]
+        + "}"
+    )
+
+
+def render_consume_page(group: str, topic: str, offset: int, events: Sequence[dict]) -> str:
+    """Render body response `/consume` dari event mentah (masing-masing membawa `seq`)."""
+    return (
+        '{"status":"success","group":' + _dumps_str(group)
+        + ',"topic":' + _dumps_str(topic)
+        + ',"offset":' + str(offset)
+        + ',"count":' + str(len(events))
+        + ',"data":[' + ",".join(render_event(ev) for ev in events)
+        + "]}"
+    )
+
+
+def render_events_page(events: Iterable[dict], count: int, next_cursor: Optional[str]) -> str:
+    """Render body response `/events` dari event mentah."""
+    return (
+        '{"status":"success","count":' + str(count)
+        + ',"data":[' + ",".join(render_event(ev) for ev in events)
+        + '],"next_cursor":' + _dumps_str(next_cursor)
+        + "}"
+    )
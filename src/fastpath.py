@@ -0,0 +1,190 @@
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .encoding import encode_payload
+from .metrics import VALIDATION_SECONDS
+from .models import Event
+
+
+@dataclass
+class ColumnBatch:
+    """Batch event dalam bentuk kolom paralel, siap ditulis ke store.
+
+    `timestamps` berisi string ISO8601 UTC (format yang sama dengan
+    `Event.timestamp.isoformat()`) dan `payloads` berisi JSON kanonik
+    dari `encode_payload`.
+    """
+
+    topics: List[str] = field(default_factory=list)
+    event_ids: List[str] = field(default_factory=list)
+    timestamps: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    payloads: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def append(self, topic: str, event_id: str, timestamp: str, source: str, payload: str):
+        self.topics.append(topic)
+        self.event_ids.append(event_id)
+        self.timestamps.append(timestamp)
+        self.sources.append(source)
+        self.payloads.append(payload)
+
+    def extend(self, other: "ColumnBatch"):
+        self.topics.extend(other.topics)
+        self.event_ids.extend(other.event_ids)
+        self.timestamps.extend(other.timestamps)
+        self.sources.extend(other.sources)
+        self.payloads.extend(other.payloads)
+
+    def select(self, indices: Sequence[int]) -> "ColumnBatch":
+        return ColumnBatch(
+            [self.topics[i] for i in indices],
+            [self.event_ids[i] for i in indices],
+            [self.timestamps[i] for i in indices],
+            [self.sources[i] for i in indices],
+            [self.payloads[i] for i in indices],
+        )
+
+    def rows(self):
+        """Iterasi `(topic, event_id, timestamp, source, payload)` per event."""
+        return zip(self.topics, self.event_ids, self.timestamps, self.sources, self.payloads)
+
+    @classmethod
+    def from_events(cls, events: Sequence[Event]) -> "ColumnBatch":
+        batch = cls()
+        for ev in events:
+            batch.append(ev.topic, ev.event_id, ev.timestamp.isoformat(), ev.source, encode_payload(ev.payload))
+        return batch
+
+    @classmethod
+    def coerce(cls, events) -> "ColumnBatch":
+        return events if isinstance(events, cls) else cls.from_events(events)
+
+    @classmethod
+    def concat(cls, batches: Sequence["ColumnBatch"]) -> "ColumnBatch":
+        merged = cls()
+        for batch in batches:
+            merged.extend(batch)
+        return merged
+
+
+class BatchValidationError(ValueError):
+    """Batch tidak valid; `errors` memakai bentuk error Pydantic (type, loc, msg)."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} validation error(s)")
+
+
+def _error(kind: str, loc: Tuple, msg: str) -> Dict[str, Any]:
+    return {"type": kind, "loc": loc, "msg": msg}
+
+
+def _normalize_timestamp(value, cache: Dict[str, str]) -> str:
+    """Sama dengan `Event.ensure_utc_timestamp` lalu `.isoformat()`."""
+    if isinstance(value, str):
+        normalized = cache.get(value)
+        if normalized is None:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            normalized = cache[value] = dt.astimezone(timezone.utc).isoformat()
+        return normalized
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat()
+    raise ValueError("Invalid timestamp format")
+
+
+def _validate_into(batch: ColumnBatch, item, loc: Tuple, errors: List, cache: Dict[str, str]):
+    if not isinstance(item, dict):
+        errors.append(_error("model_type", loc, "Input should be a valid dictionary or instance of Event"))
+        return
+    item_errors = []
+
+    topic = item.get("topic")
+    if "topic" not in item:
+        item_errors.append(_error("missing", loc + ("topic",), "Field required"))
+    elif not isinstance(topic, str):
+        item_errors.append(_error("string_type", loc + ("topic",), "Input should be a valid string"))
+    elif not topic.strip():
+        item_errors.append(_error("value_error", loc + ("topic",), "Value error, topic cannot be empty"))
+
+    if "event_id" in item:
+        event_id = item["event_id"]
+        if not isinstance(event_id, str):
+            item_errors.append(_error("string_type", loc + ("event_id",), "Input should be a valid string"))
+    else:
+        event_id = str(uuid.uuid4())
+
+    timestamp = None
+    if "timestamp" in item:
+        try:
+            timestamp = _normalize_timestamp(item["timestamp"], cache)
+        except ValueError as e:
+            item_errors.append(_error("value_error", loc + ("timestamp",), f"Value error, {e}"))
+    else:
+        timestamp = datetime.now(timezone.utc).isoformat()
+
+    source = item.get("source")
+    if "source" not in item:
+        item_errors.append(_error("missing", loc + ("source",), "Field required"))
+    elif not isinstance(source, str):
+        item_errors.append(_error("string_type", loc + ("source",), "Input should be a valid string"))
+    elif not source.strip():
+        item_errors.append(_error("value_error", loc + ("source",), "Value error, source cannot be empty"))
+
+    payload = item.get("payload")
+    if "payload" not in item:
+        item_errors.append(_error("missing", loc + ("payload",), "Field required"))
+    elif not isinstance(payload, dict):
+        item_errors.append(_error("dict_type", loc + ("payload",), "Input should be a valid dictionary"))
+
+    if item_errors:
+        errors.extend(item_errors)
+        return
+    batch.append(topic, event_id, timestamp, source, encode_payload(payload))
+
+
+def validate_event(item, loc: Tuple = (), cache: Dict[str, str] = None) -> ColumnBatch:
+    """Validasi satu event (dict hasil JSON) menjadi ColumnBatch satu baris."""
+    batch = ColumnBatch()
+    errors = []
+    _validate_into(batch, item, loc, errors, cache if cache is not None else {})
+    if errors:
+        raise BatchValidationError(errors)
+    return batch
+
+
+def validate_batch(data) -> ColumnBatch:
+    """Validasi body `EventBatch` (hasil `json.loads`) tanpa membuat objek `Event`.
+
+    Semantik error mengikuti `models.EventBatch`: semua error dikumpulkan
+    dan dilempar sekaligus sebagai `BatchValidationError`.
+    """
+    started = time.perf_counter()
+    try:
+        return _validate_batch(data)
+    finally:
+        VALIDATION_SECONDS.since(started)
+
+
+def _validate_batch(data) -> ColumnBatch:
+    if not isinstance(data, dict):
+        raise BatchValidationError([_error("model_type", (), "Input should be a valid dictionary or instance of EventBatch")])
+    if "events" not in data:
+        raise BatchValidationError([_error("missing", ("events",), "Field required")])
+    items = data["events"]
+    if not isinstance(items, list):
+        raise BatchValidationError([_error("list_type", ("events",), "Input should be a valid list")])
+
+    batch = ColumnBatch()
+    errors = []
+    cache = {}
+    for index, item in enumerate(items):
+        _validate_into(batch, item, ("events", index), errors, cache)
+    if errors:
+        raise BatchValidationError(errors)
+    return batch
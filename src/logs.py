@@ -0,0 +1,132 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+# Batas jumlah template yang dilacak sampler (template lazy jumlahnya tetap)
+MAX_SAMPLED_TEMPLATES = 1024
+
+
+class SamplingFilter(logging.Filter):
+    """Rate limit record WARNING ke atas per template pesan.
+
+    Paling banyak `burst` record dengan `(logger, template)` yang sama
+    diteruskan per `interval` detik; sisanya dibuang dan jumlahnya
+    dilaporkan di record berikutnya yang lolos (atribut `suppressed`).
+    Dengan format lazy (`logger.warning("... %s", x)`) template tidak
+    bergantung pada argumen, sehingga duplikat yang berbeda key tetap satu
+    template.
+    """
+
+    def __init__(self, burst: int = 10, interval: float = 1.0, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._clock = clock
+        # (logger, template) -> [awal window, diteruskan, dibuang]
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = self._clock()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is None and len(self._windows) >= MAX_SAMPLED_TEMPLATES:
+                self._windows.clear()
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler yang tidak memformat record di thread pemanggil.
+
+    `QueueHandler.prepare` bawaan menggabungkan `msg % args` sebelum masuk
+    antrean; di sini record dikirim apa adanya (antrean in-process, tanpa
+    pickle) dan baru diformat oleh thread `QueueListener`.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} pesan serupa dilewati)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu objek JSON per baris untuk log terstruktur."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    sample_burst: int = 10,
+    sample_interval: float = 1.0,
+) -> QueueListener:
+    """Pasang pipeline `QueueHandler` -> `QueueListener` -> stderr di root logger.
+
+    Thread pemanggil (event loop) hanya memasukkan record ke antrean;
+    format dan tulis ke stderr terjadi di thread listener.
+    """
+    global _listener
+    _flush_logs()
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_burst, sample_interval))
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, DeferredQueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _flush_logs():
+    # Tulis sisa record di antrean sebelum proses keluar (stop() tidak idempoten)
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,27 +1,46 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from datetime import datetime, timezone
 import asyncio
+import json
 import logging
+import os
+import zlib
 from contextlib import asynccontextmanager
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from .models import Event, EventBatch
-from .service import EventService
-from .store import SQLiteEventStore
+from .cache import etag_matches, stats_etag
+from .cluster import WRITER_SOCKET_ENV, RemoteEventService, started_at
+from .config import build_service, build_store, configure_process
+from . import metrics
+from .encoding import render_consume_page, render_event
+from .fastpath import BatchValidationError, ColumnBatch, validate_batch, validate_event
+from .ndjson import LineTooLong, iter_ndjson_lines
+from .models import Event, EventBatch, OffsetCommit
+from .service import QueueFullError
+from .store import InvalidCursor, InvalidFilter, decode_cursor
 
 # Setup Logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
+configure_process()
 logger = logging.getLogger("event_aggregator.main")
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10_000
+STREAM_FLUSH_LINES = 500
+INGEST_CHUNK_EVENTS = 1000
+MAX_REPORTED_ERRORS = 100
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
 # Initialize Services
 
-event_store = SQLiteEventStore("events.db")
-event_service = EventService(event_store)
+event_store = build_store()
+event_service = build_service(event_store)
+# Mode multi-worker: worker HTTP meneruskan semua operasi ke proses writer
+if os.getenv(WRITER_SOCKET_ENV):
+    event_service = RemoteEventService(
+        os.environ[WRITER_SOCKET_ENV], metrics_interval=float(os.getenv("METRICS_PUSH_INTERVAL", 5.0))
+    )
 
 
 # Lifespan Event (startup/shutdown)
@@ -30,16 +49,21 @@ event_service = EventService(event_store)
 async def lifespan(app: FastAPI):
     try:
         logger.info("Memulai layanan dan inisialisasi database...")
-        await event_store.initialize()
+        if not isinstance(event_service, RemoteEventService):
+            await event_store.initialize()
+            # Event yang sudah di-ack (ack=queued) tapi belum ter-commit
+            await event_service.replay_spool()
         await event_service.start()
         logger.info("Layanan siap dan berjalan ✅")
         yield
     except Exception as e:
-        logger.error(f"Galat saat startup: {e}")
+        logger.error("Galat saat startup: %s", e)
         raise
     finally:
         logger.info("Menutup layanan...")
         await event_service.stop()
+        if not isinstance(event_service, RemoteEventService):
+            await event_store.close()
         logger.info("Layanan berhasil dimatikan")
 
 
@@ -51,13 +75,25 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
-start_time = datetime.now(timezone.utc)
+app.add_middleware(metrics.PublishLatencyMiddleware)
+# Sama untuk semua worker jika dijalankan oleh supervisor multi-worker
+start_time = started_at()
 
 # Global Error Handler
 
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    # Load shedding: antrean ingest penuh, minta klien mengulang nanti
+    return JSONResponse(
+        status_code=429,
+        content={"status": "error", "message": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled error: {exc}")
+    logger.error("Unhandled error: %s", exc)
     return JSONResponse(
         status_code=500,
         content={"status": "error", "message": str(exc)},
@@ -71,14 +107,30 @@ async def root():
     return {"status": "ok", "message": "Event Aggregator berjalan"}
 
 
+def queued_response(result):
+    return {
+        "status": "queued",
+        "queued_count": result["queued"],
+        "message": f"Queued {result['queued']} events"
+    }
+
+
 @app.post("/publish")
-async def publish_events(events: EventBatch):
-    """Terima satu atau beberapa event dalam batch dan proses."""
+async def publish_events(
+    events: EventBatch,
+    ack: str = Query("committed", pattern="^(committed|queued)$"),
+):
+    """Terima satu atau beberapa event dalam batch dan proses.
+
+    `ack=queued` mengembalikan respons segera setelah batch ter-fsync ke spool.
+    """
     try:
         if not events.events:
             raise HTTPException(status_code=400, detail="No events provided")
 
-        result = await event_service.process_events(events.events)
+        result = await event_service.process_events(events.events, ack=ack)
+        if ack == "queued":
+            return queued_response(result)
         # Tetap gunakan field yang sama agar kompatibel dengan test/klien
         return {
             "status": "success",
@@ -86,26 +138,286 @@ async def publish_events(events: EventBatch):
             "duplicate_dropped": result["duplicates"],
             "message": f"Processed {result['processed']} events, dropped {result['duplicates']} duplicates"
         }
+    except QueueFullError:
+        raise
     except Exception as e:
-        logger.error(f"Galat di /publish: {e}")
+        logger.error("Galat di /publish: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/publish/fast")
+async def publish_events_fast(
+    request: Request,
+    ack: str = Query("committed", pattern="^(committed|queued)$"),
+):
+    """Mode ingest cepat: body `EventBatch` divalidasi massal ke bentuk kolom
+    tanpa membuat objek `Event` per event."""
+    try:
+        batch = validate_batch(json.loads(await request.body()))
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    except BatchValidationError as e:
+        # Bentuk sama dengan RequestValidationError FastAPI untuk /publish
+        detail = [{**err, "loc": ["body", *err["loc"]]} for err in e.errors]
+        return JSONResponse(status_code=422, content={"detail": detail})
+    if not batch:
+        raise HTTPException(status_code=400, detail="No events provided")
+
+    try:
+        result = await event_service.process_events(batch, ack=ack)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        logger.error("Galat di /publish/fast: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    if ack == "queued":
+        return queued_response(result)
+    return {
+        "status": "success",
+        "processed_count": result["processed"],
+        "duplicate_dropped": result["duplicates"],
+        "message": f"Processed {result['processed']} events, dropped {result['duplicates']} duplicates"
+    }
+
+
+@app.post("/publish/stream")
+async def publish_events_stream(request: Request):
+    """Terima event NDJSON (satu event per baris, opsional gzip) secara bertahap.
+
+    Baris diproses saat body masih diterima dan disimpan per chunk, sehingga
+    file besar tidak perlu ditampung seluruhnya di memori.
+    """
+    gzip = request.headers.get("content-encoding", "").lower() == "gzip"
+    counts = {"lines": 0, "accepted": 0, "duplicates": 0, "rejected": 0}
+    errors = []
+    batch = ColumnBatch()
+    cache = {}
+
+    async def flush():
+        nonlocal batch
+        if batch:
+            result = await event_service.process_events(batch)
+            counts["accepted"] += result["processed"]
+            counts["duplicates"] += result["duplicates"]
+            batch = ColumnBatch()
+        # Cache parse timestamp hanya untuk satu chunk agar memori tetap terbatas
+        cache.clear()
+
+    try:
+        async for line_no, line in iter_ndjson_lines(request.stream(), gzip=gzip):
+            counts["lines"] += 1
+            try:
+                batch.extend(validate_event(json.loads(line), (line_no,), cache))
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                counts["rejected"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_no, "msg": f"Invalid JSON: {e}"})
+            except BatchValidationError as e:
+                counts["rejected"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.extend({"line": line_no, **err} for err in e.errors)
+            if len(batch) >= INGEST_CHUNK_EVENTS or len(cache) >= INGEST_CHUNK_EVENTS:
+                await flush()
+        await flush()
+    except (LineTooLong, zlib.error) as e:
+        # Chunk yang sudah di-flush tetap tersimpan; laporkan posisi terakhir
+        raise HTTPException(status_code=400, detail={"error": str(e), **counts})
+    except QueueFullError as e:
+        return JSONResponse(
+            status_code=429,
+            content={"status": "error", "message": str(e), **counts},
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+
+    return {"status": "success", **counts, "errors": errors}
+
+
 @app.get("/events")
-async def get_events(topic: str | None = None):
-    events = await event_service.get_events(topic)
-    if topic and not events:
+async def get_events(
+    request: Request,
+    topic: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    source: str | None = None,
+    topic_prefix: str | None = None,
+    where: list[str] | None = Query(None),
+):
+    """Ambil event per halaman (`limit` + cursor `after`) atau stream NDJSON.
+
+    `since` (inklusif) / `until` (eksklusif) / `source` mengurutkan hasil
+    berdasarkan timestamp event; `topic_prefix` mencocokkan awalan topic.
+    `where=path:nilai` (boleh diulang) mencari lewat indeks payload
+    `PAYLOAD_INDEXES` milik `topic`; path yang tidak diindeks dijawab 400.
+    Halaman JSON memakai ETag: `If-None-Match` yang masih cocok dijawab 304.
+    """
+    filters = {"since": since, "until": until, "source": source, "topic_prefix": topic_prefix, "where": where}
+    if format == "ndjson":
+        return await stream_events(topic, limit, after, filters)
+    try:
+        # Body disimpan di cache dalam bentuk jadi (payload disisipkan tanpa json.loads/dumps)
+        etag, body, count = await event_service.get_events_cached(
+            topic, limit=limit or DEFAULT_PAGE_SIZE, after=after,
+            if_none_match=request.headers.get("if-none-match"), **filters
+        )
+    except (InvalidCursor, InvalidFilter) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if body is None:
+        return Response(status_code=304, headers={"ETag": etag})
+    # Rentang waktu/source yang kosong bukan berarti topic tidak dikenal
+    if topic and not count and not after and not any(filters.values()):
         raise HTTPException(status_code=404, detail=f"No events found for topic '{topic}'")
-    return {"status": "success", "count": len(events), "data": events}
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+async def stream_events(topic: str | None, limit: int | None, after: str | None, filters: dict):
+    events = event_service.iter_events(topic, after=after, raw=True, **filters)
+    try:
+        # Ambil elemen pertama lebih dulu agar cursor yang salah menjadi 400
+        first = await anext(events, None)
+    except (InvalidCursor, InvalidFilter) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body():
+        if first is None:
+            return
+        lines = [render_event(first)]
+        sent = 1
+        async for ev in events:
+            if limit is not None and sent >= limit:
+                break
+            lines.append(render_event(ev))
+            sent += 1
+            if len(lines) >= STREAM_FLUSH_LINES:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        await events.aclose()
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@app.get("/consume")
+async def consume(
+    group: str = Query(..., min_length=1),
+    topic: str = Query(..., min_length=1),
+    max: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Event `topic` setelah offset yang di-commit `group` (paling banyak `max`).
+
+    Offset tidak bergeser sampai klien memanggil `POST /commit` dengan `seq`
+    event terakhir yang sudah diproses (at-least-once).
+    """
+    events, offset = await event_service.consume(group, topic, limit=max, raw=True)
+    return Response(content=render_consume_page(group, topic, offset, events), media_type="application/json")
+
+
+@app.post("/commit")
+async def commit_offset(commit: OffsetCommit):
+    """Majukan offset consumer group; offset yang lebih kecil dari saat ini diabaikan."""
+    try:
+        offset = await event_service.commit_offset(commit.group, commit.topic, commit.offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "group": commit.group, "topic": commit.topic, "offset": offset}
+
+
+@app.get("/subscribe")
+async def subscribe(
+    request: Request,
+    topic: str,
+    after: str | None = None,
+    buffer: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    policy: str = Query("drop", pattern="^(drop|disconnect)$"),
+):
+    """Server-Sent Events untuk event baru yang cocok dengan `topic`.
+
+    `topic` boleh memakai wildcard `*` (satu segmen) dan `#` (sisa segmen).
+    Dengan `after` (atau header `Last-Event-ID`) event setelah cursor
+    tersebut dikirim lebih dulu dari database.
+    """
+    after = after or request.headers.get("last-event-id")
+    try:
+        decode_cursor(after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    frames = await event_service.subscribe(topic, after, buffer, policy, SSE_HEARTBEAT)
+
+    async def body():
+        try:
+            async for frame in frames:
+                kind = frame[0]
+                if kind == "events":
+                    yield "".join(f"id: {cursor}\ndata: {data}\n\n" for cursor, data in frame[1])
+                elif kind == "dropped":
+                    yield f"event: dropped\ndata: {frame[1]}\n\n"
+                elif kind == "keepalive":
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: closed\ndata: {frame[1]}\n\n"
+        finally:
+            await frames.aclose()
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request):
+    # Stats dibaca dari counter in-memory; ETag dihitung dari body yang sama
     stats = await event_service.get_stats()
+    etag = stats_etag(stats)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
     uptime = (datetime.now(timezone.utc) - start_time).total_seconds()
     stats["uptime"] = round(uptime, 2)
-    return {"status": "success", "stats": stats}
+    return JSONResponse(content={"status": "success", "stats": stats}, headers={"ETag": etag})
+
+
+@app.get("/stats/timeseries")
+async def get_stats_timeseries(
+    resolution: str = Query("minute", pattern="^(minute|hour|day)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    topic: str | None = None,
+    source: str | None = None,
+    group_by: str = "topic,source",
+):
+    """Event diterima/duplikat per menit, jam, atau hari dari rollup.
+
+    `group_by` berisi `topic`, `source`, keduanya (dipisah koma), atau
+    kosong untuk total per bucket.
+    """
+    dims = tuple(dim for dim in group_by.split(",") if dim)
+    if not set(dims) <= {"topic", "source"}:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by: {group_by!r}")
+    series = await event_service.get_timeseries(
+        resolution, since=since, until=until, topic=topic, source=source, group_by=dims
+    )
+    return {"status": "success", "resolution": resolution, "data": series}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Histogram latensi dan gauge antrean dalam format teks Prometheus."""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if isinstance(event_service, RemoteEventService):
+        # Multi-worker: writer menggabungkan snapshot miliknya dan semua worker
+        content = await event_service.get_metrics()
+    else:
+        content = metrics.REGISTRY.render()
+    return Response(content=content, media_type=METRICS_CONTENT_TYPE)
 
 
 # Entry Point
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8080, reload=True)
+    workers = int(os.getenv("WEB_WORKERS", 1))
+    if workers > 1:
+        from .cluster import serve
+        serve(workers, port=int(os.getenv("PORT", 8080)))
+    else:
+        import uvicorn
+        uvicorn.run("src.main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8080)), reload=True)
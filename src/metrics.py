@@ -0,0 +1,187 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Instrumentasi dimatikan lewat `set_enabled(False)` (env METRICS_ENABLED=0):
+# observe() langsung kembali tanpa menyentuh counter
+_enabled = True
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000)
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = flag
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def merge_snapshot(target: Dict[str, dict], snapshot: Dict[str, dict], histograms_only: bool = False):
+    """Jumlahkan `snapshot` (hasil `Registry.snapshot()`) ke `target` di tempat.
+
+    `histograms_only` membuang nilai gauge, mis. untuk snapshot worker yang
+    sudah berhenti: counter-nya tetap dihitung, gauge-nya tidak lagi berlaku.
+    """
+    for name, values in snapshot.items():
+        merged = target.setdefault(name, {})
+        for key, value in values.items():
+            if isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)] if key in merged else list(value)
+            elif not histograms_only:
+                merged[key] = merged.get(key, 0) + value
+
+
+class Histogram:
+    """Histogram kumulatif gaya Prometheus.
+
+    Tidak memakai lock: setiap proses hanya mengubah counter-nya sendiri
+    dari event loop, dan snapshot antar proses (worker HTTP dan writer)
+    digabung saat scrape di `Registry.render()`.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # label -> [count per bucket (+Inf di akhir)..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not _enabled:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def since(self, started: float, *labels: str):
+        """Catat durasi sejak `started` (`time.perf_counter()`)."""
+        self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> dict:
+        return {"|".join(labels): list(series) for labels, series in self._series.items()}
+
+    def render(self, snapshot: dict) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(snapshot.items()):
+            labels = tuple(key.split("|")) if key else ()
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else _format_value(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge yang nilainya dibaca dari callback saat scrape."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def snapshot(self) -> dict:
+        return {"": self.read()}
+
+    def render(self, snapshot: dict) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(sum(snapshot.values()))}",
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # Nama yang sama menggantikan metric lama (mis. gauge dari service baru)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS, labelnames=()):
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]):
+        return self.register(Gauge(name, documentation, read))
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def render(self, *remote: Dict[str, dict]) -> str:
+        """Teks exposition Prometheus; `remote` = snapshot proses lain yang digabung."""
+        merged = self.snapshot()
+        for snapshot in remote:
+            merge_snapshot(merged, snapshot)
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "event_publish_seconds", "Latensi end-to-end request publish", labelnames=("path",)
+)
+VALIDATION_SECONDS = REGISTRY.histogram(
+    "event_batch_validation_seconds", "Waktu validasi satu batch di jalur cepat"
+)
+IS_DUPLICATE_SECONDS = REGISTRY.histogram(
+    "event_is_duplicate_seconds", "Waktu SQLiteEventStore.is_duplicate"
+)
+STORE_SECONDS = REGISTRY.histogram(
+    "event_store_seconds", "Waktu menyimpan event (op=event) atau batch per shard (op=batch)", labelnames=("op",)
+)
+COMMIT_SECONDS = REGISTRY.histogram(
+    "event_commit_seconds", "Latensi COMMIT SQLite saat menyimpan event"
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "event_queue_wait_seconds", "Waktu tunggu batch di antrean ingest EventService"
+)
+READ_ROWS_SCANNED = REGISTRY.histogram(
+    "event_read_rows_scanned", "Baris yang dibaca dari SQLite dan segment arsip per query event, sebelum merge dan limit", ROW_BUCKETS
+)
+READ_ROWS_RETURNED = REGISTRY.histogram(
+    "event_read_rows_returned", "Baris yang dikembalikan per query event", ROW_BUCKETS
+)
+
+
+class PublishLatencyMiddleware:
+    """Middleware ASGI murni yang mencatat latensi request endpoint publish."""
+
+    def __init__(self, app, paths: Sequence[str] = ("/publish", "/publish/fast", "/publish/stream")):
+        self.app = app
+        # Path tetap agar jumlah label tidak tumbuh dari request ke path acak
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if not _enabled or scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            PUBLISH_SECONDS.since(started, scope["path"])
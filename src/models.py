@@ -35,7 +35,7 @@ class Event(BaseModel):
     def non_empty_string(cls, v, field):
         """Validasi agar topic dan source tidak kosong"""
         if not v.strip():
-            raise ValueError(f"{field.name} cannot be empty")
+            raise ValueError(f"{field.field_name} cannot be empty")
         return v
 
     model_config = ConfigDict(
@@ -77,3 +77,10 @@ class EventBatch(BaseModel):
             }
         }
     )
+
+# Model: OffsetCommit
+
+class OffsetCommit(BaseModel):
+    group: str = Field(..., min_length=1, description="Nama consumer group")
+    topic: str = Field(..., min_length=1, description="Topic yang dikonsumsi")
+    offset: int = Field(..., ge=0, description="`seq` event terakhir yang sudah diproses")
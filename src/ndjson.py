@@ -0,0 +1,58 @@
+import zlib
+from typing import AsyncIterable, AsyncIterator, Tuple
+
+# Batas panjang satu baris agar klien tidak bisa memaksa buffer tak terbatas
+MAX_LINE_BYTES = 1024 * 1024
+# Output maksimum per langkah dekompresi gzip
+DECOMPRESS_STEP = 256 * 1024
+
+
+class LineTooLong(ValueError):
+    """Satu baris NDJSON melebihi MAX_LINE_BYTES."""
+
+
+async def _gunzip(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk, DECOMPRESS_STEP)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_STEP)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise zlib.error("Truncated gzip stream")
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterable[bytes], gzip: bool = False, max_line_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """Pecah body yang datang bertahap menjadi `(nomor_baris, isi)`.
+
+    Hanya sisa baris yang belum lengkap yang ditahan di memori; baris
+    kosong dilewati tetapi tetap dihitung nomornya. Setiap baris, lengkap
+    maupun sisa di akhir stream, dibatasi `max_line_bytes`.
+    """
+    if gzip:
+        chunks = _gunzip(chunks)
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(f"Line {line_no + len(lines) + 1} exceeds {max_line_bytes} bytes")
+        for line in lines:
+            line_no += 1
+            if len(line) > max_line_bytes:
+                raise LineTooLong(f"Line {line_no} exceeds {max_line_bytes} bytes")
+            if line.strip():
+                yield line_no, line
+    if len(buffer) > max_line_bytes:
+        raise LineTooLong(f"Line {line_no + 1} exceeds {max_line_bytes} bytes")
+    if buffer.strip():
+        yield line_no + 1, buffer
@@ -0,0 +1,120 @@
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+PathStep = Union[str, int]
+_STEP = re.compile(r"\.([^.\[\]]+)|\[(\d+)\]")
+
+
+def parse_path(path: str) -> Tuple[PathStep, ...]:
+    """Parse JSON path sederhana: `$.order.id`, `$.items[0].sku` (awalan `$` opsional)."""
+    text = path.strip()
+    if text.startswith("$"):
+        text = text[1:]
+    if text and not text.startswith((".", "[")):
+        text = "." + text
+    steps, position = [], 0
+    for match in _STEP.finditer(text):
+        if match.start() != position:
+            break
+        steps.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        position = match.end()
+    if not steps or position != len(text):
+        raise ValueError(f"Invalid JSON path: {path!r}")
+    return tuple(steps)
+
+
+def format_path(steps: Sequence[PathStep]) -> str:
+    return "$" + "".join(f"[{step}]" if isinstance(step, int) else f".{step}" for step in steps)
+
+
+def index_value(value) -> Optional[str]:
+    """Bentuk teks nilai skalar yang diindeks; objek, array, dan null tidak diindeks.
+
+    Angka dan boolean disimpan sebagai teks JSON-nya sehingga `where=qty:3`
+    cocok dengan `{"qty": 3}` maupun `{"qty": "3"}`.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None
+
+
+def _extract(payload, steps: Sequence[PathStep]):
+    value = payload
+    for step in steps:
+        if isinstance(step, int):
+            if not isinstance(value, list) or step >= len(value):
+                return None
+        elif not isinstance(value, dict) or step not in value:
+            return None
+        value = value[step]
+    return value
+
+
+def parse_topic_indexes(text: str) -> Dict[str, List[str]]:
+    """Parse JSON `{"topic": ["$.path", ...], ...}` (satu path boleh berupa string)."""
+    if not text:
+        return {}
+    return {
+        topic: [paths] if isinstance(paths, str) else list(paths)
+        for topic, paths in json.loads(text).items()
+    }
+
+
+class PayloadIndexes:
+    """JSON path payload yang dideklarasikan per topic untuk diindeks.
+
+    Nilai diekstrak dari teks JSON payload saat insert (sebelum kompresi),
+    sehingga pencarian tidak bergantung pada codec payload.
+    """
+
+    def __init__(self, topics: Optional[Dict[str, Sequence[str]]] = None):
+        self._paths: Dict[str, List[Tuple[str, Tuple[PathStep, ...]]]] = {}
+        for topic, paths in (topics or {}).items():
+            parsed = {format_path(parse_path(path)): parse_path(path) for path in paths}
+            self._paths[topic] = sorted(parsed.items())
+
+    def __bool__(self) -> bool:
+        return bool(self._paths)
+
+    def declared(self) -> Dict[str, List[str]]:
+        return {topic: [path for path, _ in paths] for topic, paths in self._paths.items()}
+
+    def indexed(self, topic: str) -> bool:
+        return topic in self._paths
+
+    def extract(self, topic: str, payload: str, paths: Optional[Sequence[str]] = None) -> List[Tuple[str, str]]:
+        """`(path, nilai)` dari payload JSON untuk path topic ini (atau `paths` saja)."""
+        declared = self._paths.get(topic)
+        if not declared:
+            return []
+        document = json.loads(payload)
+        values = []
+        for path, steps in declared:
+            if paths is not None and path not in paths:
+                continue
+            value = index_value(_extract(document, steps))
+            if value is not None:
+                values.append((path, value))
+        return values
+
+    def parse_where(self, topic: Optional[str], where: Sequence[str]) -> List[Tuple[str, str]]:
+        """Ubah `["order_id:A124", ...]` menjadi `[("$.order_id", "A124"), ...]`.
+
+        Hanya path yang dideklarasikan untuk `topic` yang diterima, agar
+        query payload selalu berupa index seek, bukan scan tabel.
+        """
+        conditions = []
+        for item in where:
+            path, sep, value = item.partition(":")
+            if not sep:
+                raise ValueError(f"Invalid where filter {item!r}, expected 'path:value'")
+            if not topic:
+                raise ValueError("where filter requires topic")
+            canonical = format_path(parse_path(path))
+            if canonical not in dict(self._paths.get(topic, ())):
+                raise ValueError(f"Path {canonical} is not indexed for topic '{topic}'")
+            conditions.append((canonical, value))
+        return conditions
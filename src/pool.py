@@ -0,0 +1,100 @@
+import aiosqlite
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger("event_aggregator.pool")
+
+# Pragma yang diterapkan ke setiap koneksi; bisa di-override per store
+DEFAULT_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -65536,      # KiB (negatif) -> 64 MiB per koneksi
+    "mmap_size": 268435456,    # 256 MiB
+    "busy_timeout": 5000,      # ms
+}
+
+
+class ConnectionManager:
+    """Satu koneksi writer dan pool koneksi reader untuk satu file SQLite.
+
+    Database berbasis file dibuka dalam mode WAL sehingga reader tidak
+    memblokir writer. Untuk `:memory:` semua operasi memakai koneksi
+    writer (bergantian lewat write lock) karena database in-memory tidak
+    bisa dibagi antar koneksi.
+    """
+
+    def __init__(self, db_path: str, readers: int = 4, pragmas: Optional[Dict] = None):
+        self.db_path = db_path
+        self.reader_count = readers
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = None
+        self._all_readers = []
+
+    @property
+    def in_memory(self) -> bool:
+        return self.db_path == ":memory:"
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool = False):
+        conn = await aiosqlite.connect(self.db_path)
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        self._writer = await self._connect()
+        if not self.in_memory:
+            cursor = await self._writer.execute("PRAGMA journal_mode = WAL")
+            mode = (await cursor.fetchone())[0]
+            await cursor.close()
+            if mode.lower() != "wal":
+                logger.warning("journal_mode WAL tidak aktif untuk %s (mode: %s)", self.db_path, mode)
+        self._readers = asyncio.Queue()
+        if not self.in_memory:
+            for _ in range(self.reader_count):
+                conn = await self._connect(read_only=True)
+                self._all_readers.append(conn)
+                self._readers.put_nowait(conn)
+        logger.info("Pool koneksi dibuka: %s (reader: %d)", self.db_path, len(self._all_readers))
+
+    @asynccontextmanager
+    async def write(self):
+        """Pinjam koneksi writer secara eksklusif (satu transaksi pada satu waktu)."""
+        async with self._write_lock:
+            yield self._writer
+
+    @asynccontextmanager
+    async def read(self):
+        """Pinjam salah satu koneksi reader dari pool.
+
+        Tanpa reader (`:memory:`) koneksi writer dipinjam di bawah write lock,
+        agar pembacaan tidak melihat transaksi group-commit yang belum selesai.
+        """
+        if not self._all_readers:
+            async with self._write_lock:
+                yield self._writer
+            return
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .encoding import render_event
+from .store import encode_cursor
+
+logger = logging.getLogger("event_aggregator.pubsub")
+
+# Wildcard topic: `*` tepat satu segmen, `#` nol atau lebih segmen di akhir
+SEGMENT_WILDCARD = "*"
+TAIL_WILDCARD = "#"
+SLOW_CONSUMER_POLICIES = ("drop", "disconnect")
+
+# Event yang sudah ter-commit: (shard, rowid, topic, event_id, timestamp, source, payload_json)
+CommittedEvent = Tuple[int, int, str, str, str, str, str]
+
+
+def literal_prefix(pattern: str) -> Optional[str]:
+    """Bagian pattern sebelum wildcard pertama (untuk backfill dari store).
+
+    Mengembalikan None jika pattern tidak memakai wildcard.
+    """
+    segments = pattern.split(".")
+    for i, segment in enumerate(segments):
+        if segment in (SEGMENT_WILDCARD, TAIL_WILDCARD):
+            return ".".join(segments[:i]) + ("." if i else "")
+    return None
+
+
+class TopicMatcher:
+    """Trie pattern topic per segmen; hasil `match()` di-cache per topic."""
+
+    def __init__(self):
+        self._root = {}
+        self._cache: Dict[str, Set] = {}
+
+    def add(self, pattern: str, value):
+        node = self._root
+        for segment in pattern.split("."):
+            node = node.setdefault(segment, {})
+        node.setdefault(None, set()).add(value)
+        self._cache.clear()
+
+    def remove(self, pattern: str, value):
+        path = [self._root]
+        for segment in pattern.split("."):
+            node = path[-1].get(segment)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].get(None, set()).discard(value)
+        self._cache.clear()
+
+    def match(self, topic: str) -> Set:
+        cached = self._cache.get(topic)
+        if cached is None:
+            cached = self._cache[topic] = set()
+            self._walk(self._root, topic.split("."), 0, cached)
+        return cached
+
+    def _walk(self, node, segments, i, out):
+        tail = node.get(TAIL_WILDCARD)
+        if tail is not None:
+            out.update(tail.get(None, ()))
+        if i == len(segments):
+            out.update(node.get(None, ()))
+            return
+        for key in (segments[i], SEGMENT_WILDCARD):
+            child = node.get(key)
+            if child is not None:
+                self._walk(child, segments, i + 1, out)
+
+
+class Subscription:
+    """Ring buffer terbatas untuk satu subscriber.
+
+    Saat buffer penuh, policy `drop` membuang frame tertua (dihitung di
+    `dropped`), sedangkan `disconnect` menutup subscription.
+    """
+
+    def __init__(self, pattern: str, buffer_size: int = 1000, policy: str = "drop"):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        self.pattern = pattern
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.dropped = 0
+        self.closed_reason = None
+        self._buffer = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_reason is not None
+
+    def push(self, item):
+        if self.closed:
+            return
+        if len(self._buffer) >= self.buffer_size:
+            if self.policy == "disconnect":
+                self.close("slow consumer")
+                return
+            self.dropped += 1
+        self._buffer.append(item)
+        self._ready.set()
+
+    def close(self, reason: str = "closed"):
+        if self.closed_reason is None:
+            self.closed_reason = reason
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List:
+        """Ambil semua item yang menunggu; list kosong jika timeout."""
+        if not self._buffer and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        items = list(self._buffer)
+        self._buffer.clear()
+        return items
+
+
+class Broker:
+    """Fan-out in-memory event yang sudah ter-commit ke subscriber.
+
+    Setiap event dirender sekali menjadi `(shard, rowid, cursor, json)` dan
+    objek yang sama dimasukkan ke ring buffer semua subscriber yang cocok,
+    tanpa membaca database.
+    """
+
+    def __init__(self):
+        self._matcher = TopicMatcher()
+        self._subscriptions: Set[Subscription] = set()
+        self.published = 0
+
+    def subscribe(self, pattern: str, buffer_size: int = 1000, policy: str = "drop") -> Subscription:
+        subscription = Subscription(pattern, buffer_size, policy)
+        self._matcher.add(pattern, subscription)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.discard(subscription)
+            self._matcher.remove(subscription.pattern, subscription)
+            subscription.close()
+
+    def publish(self, events: Iterable[CommittedEvent]):
+        if not self._subscriptions:
+            return
+        for shard, rowid, topic, event_id, timestamp, source, payload in events:
+            targets = self._matcher.match(topic)
+            if not targets:
+                continue
+            frame = (shard, rowid, encode_cursor(rowid, shard), render_event({
+                "topic": topic, "event_id": event_id, "timestamp": timestamp,
+                "source": source, "payload": payload,
+            }))
+            self.published += 1
+            for subscription in list(targets):
+                subscription.push(frame)
+                if subscription.closed:
+                    self.unsubscribe(subscription)
+
+    def close(self):
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in self._subscriptions),
+        }
+
+
+async def follow(
+    broker: Broker,
+    subscription: Subscription,
+    backfill=None,
+    heartbeat: float = 15.0,
+):
+    """Iterasi frame untuk satu subscriber: backfill dulu, lalu event live.
+
+    `subscription` harus sudah terdaftar sebelum backfill dimulai sehingga
+    event yang ter-commit selama backfill tertahan di ring buffer; event
+    live yang rowid-nya sudah terkirim lewat backfill dilewati. Menghasilkan
+    `("events", [(cursor, json), ...])`, `("dropped", n)`, `("keepalive",)`,
+    atau terakhir `("closed", alasan)`.
+    """
+    try:
+        delivered = {}
+        if backfill is not None:
+            matcher = TopicMatcher()
+            matcher.add(subscription.pattern, True)
+            frames = []
+            async for shard, rowid, event in backfill:
+                delivered[shard] = rowid
+                if matcher.match(event["topic"]):
+                    frames.append((encode_cursor(rowid, shard), render_event(event)))
+                if len(frames) >= subscription.buffer_size:
+                    yield ("events", frames)
+                    frames = []
+            if frames:
+                yield ("events", frames)
+
+        reported = 0
+        while True:
+            items = await subscription.get(heartbeat)
+            if subscription.dropped > reported:
+                yield ("dropped", subscription.dropped - reported)
+                reported = subscription.dropped
+            frames = [
+                (cursor, data) for shard, rowid, cursor, data in items
+                if rowid > delivered.get(shard, 0)
+            ]
+            if frames:
+                yield ("events", frames)
+            if subscription.closed:
+                yield ("closed", subscription.closed_reason)
+                return
+            if not items:
+                yield ("keepalive",)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,50 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Batas umur (detik) dan/atau jumlah baris event untuk satu topic."""
+
+    max_age: Optional[float] = None
+    max_rows: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age is not None or self.max_rows is not None
+
+
+@dataclass
+class RetentionConfig:
+    """Pengaturan task retensi di `EventService`.
+
+    `dedup_window` (detik, dihitung dari timestamp event) menentukan berapa
+    lama key event yang sudah dihapus tetap ditolak sebagai duplikat; None
+    berarti selamanya, 0 berarti tanpa tombstone.
+    """
+
+    default: RetentionPolicy = field(default_factory=RetentionPolicy)
+    topics: Dict[str, RetentionPolicy] = field(default_factory=dict)
+    dedup_window: Optional[float] = 7 * 24 * 3600
+    interval: float = 60.0
+    chunk_rows: int = 1000
+    pause: float = 0.01
+    vacuum_pages: int = 1000
+
+    def policy_for(self, topic: str) -> RetentionPolicy:
+        return self.topics.get(topic, self.default)
+
+    @property
+    def enabled(self) -> bool:
+        return self.default.enabled or any(p.enabled for p in self.topics.values())
+
+
+def parse_topic_policies(text: str) -> Dict[str, RetentionPolicy]:
+    """Parse JSON `{"topic": {"max_age": detik, "max_rows": n}, ...}`."""
+    if not text:
+        return {}
+    return {
+        topic: RetentionPolicy(max_age=spec.get("max_age"), max_rows=spec.get("max_rows"))
+        for topic, spec in json.loads(text).items()
+    }
@@ -0,0 +1,86 @@
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Resolusi /stats/timeseries dalam menit; bucket disimpan per menit (epoch UTC)
+RESOLUTIONS = {"minute": 1, "hour": 60, "day": 1440}
+GROUP_BY = ("topic", "source")
+
+# (bucket_menit, topic, source, received, duplicates)
+RollupRow = Tuple[int, str, str, int, int]
+
+
+class RollupBuffer:
+    """Counter `(menit, topic, source)` in-memory sebelum di-flush ke tabel `rollups`.
+
+    Bucket dihitung dari waktu commit (bukan timestamp event) sehingga satu
+    batch cukup memakai satu bucket tanpa parsing timestamp per event.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._pending: Dict[Tuple[int, str, str], List[int]] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, topics: Sequence[str], sources: Sequence[str], results: Sequence[bool]):
+        bucket = int(self._clock()) // 60
+        pending = self._pending
+        for topic, source, ok in zip(topics, sources, results):
+            counts = pending.get((bucket, topic, source))
+            if counts is None:
+                counts = pending[(bucket, topic, source)] = [0, 0]
+            counts[0] += 1
+            if not ok:
+                counts[1] += 1
+
+    def rows(self) -> List[RollupRow]:
+        return [(*key, received, duplicates) for key, (received, duplicates) in self._pending.items()]
+
+    def drain(self) -> List[RollupRow]:
+        rows = self.rows()
+        self._pending = {}
+        return rows
+
+    def subtract(self, rows: Iterable[RollupRow]):
+        """Kurangi counter yang sudah ditulis ke tabel; bucket yang habis dibuang.
+
+        Counter yang bertambah selama penulisan tetap tertahan untuk flush berikutnya.
+        """
+        pending = self._pending
+        for bucket, topic, source, received, duplicates in rows:
+            key = (bucket, topic, source)
+            counts = pending.get(key)
+            if counts is None:
+                continue
+            counts[0] -= received
+            counts[1] -= duplicates
+            if counts[0] <= 0:
+                del pending[key]
+
+
+def downsample(
+    rows: Iterable[RollupRow],
+    resolution: int,
+    start: int,
+    end: int,
+    topic: Optional[str] = None,
+    source: Optional[str] = None,
+    group_by: Sequence[str] = GROUP_BY,
+) -> Dict[Tuple[int, Optional[str], Optional[str]], List[int]]:
+    """Agregasi baris per menit ke bucket `resolution` menit (sama seperti query SQL-nya)."""
+    out = {}
+    for bucket, row_topic, row_source, received, duplicates in rows:
+        if not start <= bucket < end:
+            continue
+        if (topic is not None and row_topic != topic) or (source is not None and row_source != source):
+            continue
+        key = (
+            bucket // resolution * resolution,
+            row_topic if "topic" in group_by else None,
+            row_source if "source" in group_by else None,
+        )
+        counts = out.setdefault(key, [0, 0])
+        counts[0] += received
+        counts[1] += duplicates
+    return out
@@ -1,73 +1,562 @@
+from .cache import ResponseCache, etag_matches
+from .encoding import render_events_page
+from .fastpath import ColumnBatch
+from .metrics import QUEUE_WAIT_SECONDS
 from .models import Event
-from .store import SQLiteEventStore
-from typing import List
+from .pubsub import Broker, follow, literal_prefix
+from .retention import RetentionConfig
+from .rollup import GROUP_BY, RESOLUTIONS, RollupBuffer, downsample
+from .spool import Spool
+from .store import SQLiteEventStore, timestamp_ms
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple, Union
 import asyncio
 import logging
+import time
 
 logger = logging.getLogger("event_aggregator.service")
 
+# Halaman yang dikembalikan per langkah vacuum setelah pemindahan ke arsip
+ARCHIVE_VACUUM_PAGES = 1000
+
+
+class QueueFullError(Exception):
+    """Antrean ingest penuh; klien sebaiknya mencoba lagi setelah `retry_after` detik."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Ingest queue full, retry after {retry_after}s")
+
+
+def _cache_key_value(value):
+    # datetime dan list (`where`, juga yang datang lewat IPC) harus hashable dan stabil
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return value
+
+
 class EventService:
-    def __init__(self, store: SQLiteEventStore):
+    """Pipeline ingest: antrean terbatas dengan backpressure dan N worker.
+
+    Producer (`process_events`) memasukkan batch ke antrean. Jika antrean
+    penuh, producer menunggu maksimal `put_timeout` detik (`overflow="wait"`)
+    atau langsung ditolak (`overflow="reject"`) dengan `QueueFullError`.
+    Setiap worker menggabungkan beberapa batch menjadi micro-batch sebelum
+    menulis ke store.
+
+    Dengan `spool`, `process_events(..., ack="queued")` hanya menunggu batch
+    ter-fsync ke spool; writer di belakang layar menerapkan segment spool ke
+    store dalam transaksi besar.
+
+    Dengan `retention`, task di belakang layar menghapus event yang melewati
+    kebijakan retensi per topic dalam chunk kecil (satu transaksi pendek per
+    chunk, dengan jeda di antaranya), lalu menjalankan incremental vacuum.
+
+    Jika store punya tier arsip dengan `max_age`, task lain memindahkan
+    partisi waktu yang sudah tua ke segment arsip secara berkala.
+    """
+
+    def __init__(
+        self,
+        store: SQLiteEventStore,
+        stats_flush_interval: float = 5.0,
+        queue_maxsize: int = 64,
+        workers: int = 2,
+        micro_batch_size: int = 5000,
+        overflow: str = "wait",
+        put_timeout: float = 1.0,
+        retry_after: float = 1.0,
+        spool: Optional[Spool] = None,
+        spool_apply_interval: float = 0.5,
+        spool_apply_batch: int = 20_000,
+        retention: Optional[RetentionConfig] = None,
+        cache_bytes: int = 32 * 1024 * 1024,
+    ):
+        if overflow not in ("wait", "reject"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
         self.store = store
-        self._queue = asyncio.Queue()
-        self._consumer_task = None
+        self.stats_flush_interval = stats_flush_interval
+        self.worker_count = workers
+        self.micro_batch_size = micro_batch_size
+        self.overflow = overflow
+        self.put_timeout = put_timeout
+        self.retry_after = retry_after
+        self.spool = spool
+        self.spool_apply_interval = spool_apply_interval
+        self.spool_apply_batch = spool_apply_batch
+        self.retention = retention
+        # Fan-out ke subscriber /subscribe, diisi langsung setelah commit
+        self.broker = Broker()
+        store.add_commit_listener(self.broker.publish)
+        # Rollup (topic, source, menit) untuk /stats/timeseries, di-flush bersama checkpoint stats
+        self.rollups = RollupBuffer()
+        store.add_ingest_listener(self.rollups.record)
+        # Cache body /events; generasi topic naik setiap commit
+        self.cache = ResponseCache(cache_bytes)
+        store.add_commit_listener(lambda events: self.cache.invalidate(event[2] for event in events))
+        self._queue = asyncio.Queue(maxsize=queue_maxsize)
+        self._worker_tasks = []
+        self._checkpoint_task = None
+        self._spool_task = None
+        self._spool_pending = asyncio.Event()
+        self._retention_task = None
+        self._retention_wake = asyncio.Event()
+        self._archive_task = None
         self._processing = False
+        self._queue_stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "micro_batches": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
 
     async def start(self):
         if not self._processing:
             self._processing = True
-            self._consumer_task = asyncio.create_task(self._process_queue())
-            logger.info("Layanan EventService dimulai.")
+            self._worker_tasks = [
+                asyncio.create_task(self._worker(n)) for n in range(self.worker_count)
+            ]
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_stats())
+            if self.spool is not None:
+                self._spool_task = asyncio.create_task(self._spool_writer())
+            if self.retention is not None and self.retention.enabled:
+                self._retention_wake.clear()
+                self._retention_task = asyncio.create_task(self._retention_loop())
+            archive = self.store.archive_config
+            if archive is not None and archive.max_age is not None:
+                self._retention_wake.clear()
+                self._archive_task = asyncio.create_task(self._archive_loop())
+            logger.info("Layanan EventService dimulai (%d worker).", self.worker_count)
 
     async def stop(self):
         if self._processing:
             self._processing = False
+            # Kosongkan antrean dulu agar batch yang sudah diterima tetap tersimpan
             await self._queue.join()
-            if self._consumer_task:
-                self._consumer_task.cancel()
+            if self._spool_task is not None:
+                # Biarkan apply yang sedang berjalan selesai, jangan dibatalkan
+                self._spool_pending.set()
+                await self._spool_task
+            if self._retention_task is not None:
+                # Sama seperti spool: chunk yang sedang berjalan dibiarkan selesai
+                self._retention_wake.set()
+                await self._retention_task
+                self._retention_task = None
+            if self._archive_task is not None:
+                self._retention_wake.set()
+                await self._archive_task
+                self._archive_task = None
+            tasks = [*self._worker_tasks, self._checkpoint_task]
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
                 try:
-                    await self._consumer_task
+                    await task
                 except asyncio.CancelledError:
-                    logger.info("Consumer task dibatalkan")
+                    pass
+            self._worker_tasks = []
+            self._spool_task = None
+            if self.spool is not None:
+                await self.apply_spool()
+                await self.spool.close()
+            await self.store.flush_stats()
+            await self.flush_rollups()
+            self.broker.close()
             logger.info("EventService berhenti")
 
-    async def process_events(self, events: List[Event]):
-        """Add events to queue and process"""
+    async def process_events(self, events: Union[List[Event], ColumnBatch], ack: str = "committed"):
+        """Masukkan batch ke antrean ingest dan tunggu hasil commit-nya.
+
+        Dengan `ack="queued"` batch cukup ditulis ke spool; hasilnya
+        `{"queued": n}` karena status duplikat baru diketahui saat apply.
+        """
         if not self._processing:
             await self.start()
-        results = {"processed": 0, "duplicates": 0}
-
-        for ev in events:
-            await self._queue.put(ev)
-
-        # Proses segera di-thread event ini
-        while not self._queue.empty():
-            ev = await self._queue.get()
-            is_duplicate = await self.store.is_duplicate(ev)
-            if not is_duplicate:
-                await self.store.store_event(ev)
-                results["processed"] += 1
+        batch = ColumnBatch.coerce(events)
+        if ack == "queued":
+            if self.spool is None:
+                raise ValueError("ack=queued requires a spool directory")
+            if batch:
+                await self.spool.append(batch)
+                self._spool_pending.set()
+            return {"queued": len(batch)}
+        if ack != "committed":
+            raise ValueError(f"Unknown ack mode: {ack}")
+        if not batch:
+            return {"processed": 0, "duplicates": 0}
+
+        future = asyncio.get_running_loop().create_future()
+        item = (batch, future, time.monotonic())
+        try:
+            if self.overflow == "reject":
+                self._queue.put_nowait(item)
             else:
-                # tetap simpan (atau update stats) sehingga metrik ter-update
-                await self.store.store_event(ev)
-                results["duplicates"] += 1
-            self._queue.task_done()
+                await asyncio.wait_for(self._queue.put(item), self.put_timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self._queue_stats["rejected"] += 1
+            raise QueueFullError(self.retry_after)
+        self._queue_stats["enqueued"] += 1
+
+        stored = await future
+        processed = sum(stored)
+        return {"processed": processed, "duplicates": len(stored) - processed}
+
+    async def _worker(self, n: int):
+        while True:
+            items = [await self._queue.get()]
+            size = len(items[0][0])
+            # Ambil batch lain yang sudah menunggu sampai micro-batch penuh
+            while size < self.micro_batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                items.append(item)
+                size += len(item[0])
 
-        return results
+            now = time.monotonic()
+            for _, _, enqueued_at in items:
+                wait = now - enqueued_at
+                self._queue_stats["wait_total"] += wait
+                self._queue_stats["wait_max"] = max(self._queue_stats["wait_max"], wait)
+                QUEUE_WAIT_SECONDS.observe(wait)
+            self._queue_stats["micro_batches"] += 1
 
-    async def _process_queue(self):
+            try:
+                results = await self.store.submit_events(ColumnBatch.concat([b for b, _, _ in items]))
+                offset = 0
+                for batch, future, _ in items:
+                    if not future.done():
+                        future.set_result(results[offset:offset + len(batch)])
+                    offset += len(batch)
+            except Exception as e:
+                logger.error("Kesalahan saat memproses queue (worker %d): %s", n, e)
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def replay_spool(self) -> int:
+        """Buka spool dan terapkan segment sisa proses sebelumnya (startup)."""
+        if self.spool is None:
+            return 0
+        self.spool.open()
+        replayed = await self.apply_spool()
+        if replayed:
+            logger.warning("Replay spool setelah restart: %d event", replayed)
+        return replayed
+
+    async def apply_spool(self) -> int:
+        """Terapkan semua segment spool ke store lalu hapus segment-nya.
+
+        Dipanggil saat startup untuk replay segment yang belum diterapkan.
+        Jika proses mati setelah commit tetapi sebelum segment dihapus,
+        replay aman karena dedup; event tersebut hanya terhitung duplikat.
+        """
+        applied = 0
+        for path in await self.spool.seal():
+            pending = ColumnBatch()
+            for batch in self.spool.read_segment(path):
+                pending.extend(batch)
+                if len(pending) >= self.spool_apply_batch:
+                    await self.store.store_events(pending)
+                    applied += len(pending)
+                    pending = ColumnBatch()
+            if pending:
+                await self.store.store_events(pending)
+                applied += len(pending)
+            self.spool.remove(path)
+        if applied:
+            logger.info("Spool diterapkan: %d event", applied)
+        return applied
+
+    async def _spool_writer(self):
         while self._processing:
             try:
-                ev = await self._queue.get()
-                await self.store.store_event(ev)
-                self._queue.task_done()
-            except asyncio.CancelledError:
+                await asyncio.wait_for(self._spool_pending.wait(), self.spool_apply_interval)
+            except asyncio.TimeoutError:
+                continue
+            self._spool_pending.clear()
+            if not self._processing:
+                return
+            try:
+                await self.apply_spool()
+            except Exception as e:
+                logger.error("Gagal menerapkan spool: %s", e)
+
+    async def run_retention(self) -> dict:
+        """Satu putaran retensi: hapus event kedaluwarsa, tombstone lama, lalu vacuum."""
+        config = self.retention
+        now = datetime.now(timezone.utc)
+        tombstone_since = None
+        if config.dedup_window is not None:
+            tombstone_since = now - timedelta(seconds=config.dedup_window)
+        deleted = 0
+        for topic in self.store.list_topics():
+            policy = config.policy_for(topic)
+            if policy.max_age is not None:
+                before = now - timedelta(seconds=policy.max_age)
+                deleted += await self._delete_chunks(topic, None, before, tombstone_since)
+                dropped = await self.store.drop_archived(topic, before, tombstone_since)
+                if dropped:
+                    self.cache.invalidate([topic])
+                    deleted += dropped
+            if policy.max_rows is not None:
+                excess = await self.store.count_events(topic) + self.store.archived_rows(topic) - policy.max_rows
+                if excess > 0:
+                    # Tier arsip berisi event tertua: buang segment utuh lebih dulu
+                    dropped = await self.store.drop_archived(topic, tombstone_since=tombstone_since, limit=excess)
+                    if dropped:
+                        self.cache.invalidate([topic])
+                        deleted += dropped
+                        excess -= dropped
+                    # Selama masih ada segment, cap dipenuhi per segment agar
+                    # event hot yang lebih baru tidak dihapus mendahuluinya
+                    if excess > 0 and not self.store.archived_rows(topic):
+                        deleted += await self._delete_chunks(topic, excess, None, tombstone_since)
+
+        expired = 0
+        if tombstone_since is not None:
+            while self._retention_running():
+                count = await self.store.expire_tombstones(tombstone_since, limit=config.chunk_rows)
+                expired += count
+                if not count:
+                    break
+                await asyncio.sleep(config.pause)
+
+        freed = 0
+        while deleted and self._retention_running():
+            pages = await self.store.incremental_vacuum(config.vacuum_pages)
+            freed += pages
+            if pages < config.vacuum_pages:
+                break
+            await asyncio.sleep(config.pause)
+        if deleted or expired:
+            logger.info(
+                "Retensi: %d event dihapus, %d tombstone kedaluwarsa, %d halaman dikembalikan", deleted, expired, freed
+            )
+        return {"deleted": deleted, "tombstones_expired": expired, "vacuumed_pages": freed}
+
+    def _retention_running(self) -> bool:
+        # Putaran manual (service belum start) tetap dijalankan sampai selesai
+        return self._processing or self._retention_task is None
+
+    async def _delete_chunks(self, topic, remaining, before, tombstone_since) -> int:
+        config = self.retention
+        deleted = 0
+        while self._retention_running():
+            limit = config.chunk_rows if remaining is None else min(config.chunk_rows, remaining - deleted)
+            if limit <= 0:
                 break
+            count = await self.store.delete_oldest(topic, limit, before=before, tombstone_since=tombstone_since)
+            if count:
+                self.cache.invalidate([topic])
+            deleted += count
+            if count < limit:
+                break
+            # Beri kesempatan writer lain mengambil write lock
+            await asyncio.sleep(config.pause)
+        return deleted
+
+    async def _retention_loop(self):
+        while self._processing:
+            try:
+                await asyncio.wait_for(self._retention_wake.wait(), self.retention.interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._processing:
+                return
+            try:
+                await self.run_retention()
+            except Exception as e:
+                logger.error("Gagal menjalankan retensi: %s", e)
+
+    async def run_archive(self) -> dict:
+        """Satu putaran arsip: pindahkan event yang lebih tua dari `max_age` ke tier arsip."""
+        config = self.store.archive_config
+        before = datetime.now(timezone.utc) - timedelta(seconds=config.max_age)
+        archived = 0
+        for topic in self.store.list_topics():
+            while self._archive_running():
+                count = await self.store.archive_events(topic, before, limit=config.segment_rows)
+                archived += count
+                if count < config.segment_rows:
+                    break
+                await asyncio.sleep(config.pause)
+        # Isi halaman /events tidak berubah (hanya pindah tier), cache tetap valid
+        freed = 0
+        while archived and self._archive_running():
+            pages = await self.store.incremental_vacuum(ARCHIVE_VACUUM_PAGES)
+            freed += pages
+            if pages < ARCHIVE_VACUUM_PAGES:
+                break
+            await asyncio.sleep(config.pause)
+        if archived:
+            logger.info("Arsip: %d event dipindah, %d halaman dikembalikan", archived, freed)
+        return {"archived": archived, "vacuumed_pages": freed}
+
+    def _archive_running(self) -> bool:
+        return self._processing or self._archive_task is None
+
+    async def _archive_loop(self):
+        while self._processing:
+            try:
+                await asyncio.wait_for(self._retention_wake.wait(), self.store.archive_config.interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._processing:
+                return
+            try:
+                await self.run_archive()
+            except Exception as e:
+                logger.error("Gagal menjalankan arsip: %s", e)
+
+    async def _checkpoint_stats(self):
+        """Flush counter stats in-memory ke database secara berkala."""
+        while self._processing:
+            await asyncio.sleep(self.stats_flush_interval)
+            try:
+                await self.store.flush_stats()
             except Exception as e:
-                logger.error(f"Kesalahan saat memproses queue: {e}")
+                logger.error("Gagal checkpoint stats: %s", e)
+            try:
+                await self.flush_rollups()
+            except Exception as e:
+                logger.error("Gagal flush rollup: %s", e)
+
+    async def flush_rollups(self):
+        # Counter tetap terlihat oleh /stats/timeseries selama penulisan dan
+        # hanya dikurangi setelah berhasil, sehingga galat tidak menghilangkannya
+        rows = self.rollups.rows()
+        if rows:
+            await self.store.add_rollups(rows)
+            self.rollups.subtract(rows)
+
+    def queue_stats(self) -> dict:
+        q = self._queue_stats
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "workers": self.worker_count,
+            "overflow": self.overflow,
+            "enqueued": q["enqueued"],
+            "rejected": q["rejected"],
+            "micro_batches": q["micro_batches"],
+            "avg_wait_ms": round(q["wait_total"] / q["enqueued"] * 1000, 3) if q["enqueued"] else 0.0,
+            "max_wait_ms": round(q["wait_max"] * 1000, 3),
+        }
+
+    # `filters`: since, until, source, topic_prefix, where (lihat SQLiteEventStore.get_events_page)
+    async def get_events(self, topic: str = None, **filters):
+        return await self.store.get_events(topic, **filters)
+
+    async def get_events_page(self, topic: str = None, limit: int = 1000, after: str = None, raw: bool = False, **filters):
+        return await self.store.get_events_page(topic, limit=limit, after=after, raw=raw, **filters)
+
+    async def get_events_cached(
+        self, topic: str = None, limit: int = 1000, after: str = None, if_none_match: str = None, **filters
+    ) -> Tuple[str, Optional[str], int]:
+        """Body JSON satu halaman `/events` lewat cache.
+
+        Mengembalikan `(etag, body, count)`. Jika `if_none_match` cocok dengan
+        ETag saat ini, body bernilai None (304) tanpa menyentuh store.
+        """
+        key = (topic, limit, after, *(
+            (name, _cache_key_value(value))
+            for name, value in sorted(filters.items()) if value is not None
+        ))
+        # Generasi diambil sebelum query: commit di tengah query membuat entri langsung basi
+        generation = self.cache.generation(topic)
+        etag = self.cache.etag(key, generation)
+        if etag_matches(if_none_match, etag):
+            self.cache.not_modified += 1
+            return etag, None, 0
+        entry = self.cache.get(key, generation)
+        if entry is not None:
+            return etag, entry.body, entry.count
+        events, next_cursor = await self.store.get_events_page(topic, limit=limit, after=after, raw=True, **filters)
+        body = render_events_page(events, len(events), next_cursor)
+        self.cache.put(key, generation, body, len(events))
+        return etag, body, len(events)
+
+    def iter_events(self, topic: str = None, after: str = None, raw: bool = False, **filters):
+        return self.store.iter_events(topic, after=after, raw=raw, **filters)
+
+    async def consume(self, group: str, topic: str, limit: int = 1000, raw: bool = False):
+        return await self.store.consume(group, topic, limit=limit, raw=raw)
+
+    async def commit_offset(self, group: str, topic: str, offset: int) -> int:
+        return await self.store.commit_offset(group, topic, offset)
+
+    async def subscribe(
+        self, pattern: str, after: str = None, buffer_size: int = 1000, policy: str = "drop", heartbeat: float = 15.0
+    ):
+        """Subscribe ke event yang cocok dengan `pattern` (wildcard `*`/`#`).
+
+        Dengan `after`, event setelah cursor tersebut di-backfill dari store
+        lebih dulu. Lihat `pubsub.follow` untuk bentuk frame yang dihasilkan.
+        """
+        subscription = self.broker.subscribe(pattern, buffer_size, policy)
+        backfill = None
+        if after is not None:
+            prefix = literal_prefix(pattern)
+            if prefix is None:
+                backfill = self.store.iter_positions(pattern, after=after)
+            else:
+                backfill = self.store.iter_positions(after=after, topic_prefix=prefix or None)
+        return follow(self.broker, subscription, backfill, heartbeat)
+
+    async def get_timeseries(
+        self,
+        resolution: str = "minute",
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        topic: Optional[str] = None,
+        source: Optional[str] = None,
+        group_by: Sequence[str] = GROUP_BY,
+    ) -> List[dict]:
+        """Jumlah event dan duplikat per bucket `resolution` (minute/hour/day).
+
+        Dibaca dari tabel rollups ditambah counter yang belum di-flush, tanpa
+        menyentuh tabel events. Tanpa `since`, diambil 60 bucket terakhir.
+        """
+        step = RESOLUTIONS[resolution]
+        end = timestamp_ms(until) // 60_000 if until is not None else int(time.time()) // 60 + 1
+        start = timestamp_ms(since) // 60_000 if since is not None else (end - 1) // step * step - 59 * step
+        rows = await self.store.query_rollups(start, end, step, topic, source, group_by)
+        buckets = {(bucket, row_topic, row_source): [received, duplicates]
+                   for bucket, row_topic, row_source, received, duplicates in rows}
+        pending = downsample(self.rollups.rows(), step, start, end, topic, source, group_by)
+        for key, (received, duplicates) in pending.items():
+            counts = buckets.setdefault(key, [0, 0])
+            counts[0] += received
+            counts[1] += duplicates
 
-    async def get_events(self, topic: str = None):
-        return await self.store.get_events(topic)
+        series = []
+        for (bucket, row_topic, row_source), (received, duplicates) in sorted(
+            buckets.items(), key=lambda item: (item[0][0], item[0][1] or "", item[0][2] or "")
+        ):
+            point = {"bucket": datetime.fromtimestamp(bucket * 60, timezone.utc).isoformat()}
+            if "topic" in group_by:
+                point["topic"] = row_topic
+            if "source" in group_by:
+                point["source"] = row_source
+            point.update(
+                received=received,
+                unique=received - duplicates,
+                duplicates=duplicates,
+                duplicate_rate=round(duplicates / received, 4) if received else 0.0,
+            )
+            series.append(point)
+        return series
 
     async def get_stats(self):
-        return await self.store.get_stats()
+        stats = await self.store.get_stats()
+        stats["queue"] = self.queue_stats()
+        stats["subscriptions"] = self.broker.stats()
+        stats["cache"] = self.cache.stats()
+        if self.spool is not None:
+            stats["spool"] = self.spool.stats()
+        return stats
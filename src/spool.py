@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Iterator, List
+
+from .fastpath import ColumnBatch
+
+logger = logging.getLogger("event_aggregator.spool")
+
+# Header record: panjang body dan CRC32 body
+_HEADER = struct.Struct("<II")
+_SEGMENT_PREFIX = "segment-"
+_SEGMENT_SUFFIX = ".log"
+
+
+def _encode(batch: ColumnBatch) -> bytes:
+    body = json.dumps(
+        [batch.topics, batch.event_ids, batch.timestamps, batch.sources, batch.payloads],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode()
+    return _HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+class Spool:
+    """Spool append-only untuk batch yang sudah di-ack tapi belum di-commit.
+
+    Batch ditulis ke segment aktif; beberapa append yang berdekatan berbagi
+    satu fsync. Segment dirotasi setelah `segment_bytes`. Segment yang sudah
+    disegel dibaca ulang oleh writer di belakang layar lalu dihapus setelah
+    isinya ter-commit ke store.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, fsync_delay: float = 0.002):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_delay = fsync_delay
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+        self._next_seq = 0
+        self._waiters = []
+        self._sync_task = None
+        self._lock = asyncio.Lock()
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self._segment_paths()
+        if existing:
+            last = os.path.basename(existing[-1])
+            self._next_seq = int(last[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]) + 1
+
+    def _segment_paths(self) -> List[str]:
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _open_segment(self):
+        name = f"{_SEGMENT_PREFIX}{self._next_seq:012d}{_SEGMENT_SUFFIX}"
+        self._next_seq += 1
+        self._active_path = os.path.join(self.directory, name)
+        self._active = open(self._active_path, "ab")
+        self._active_size = 0
+
+    def _close_active(self):
+        if self._active is None:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+
+    async def append(self, batch: ColumnBatch):
+        """Tulis batch ke spool dan tunggu sampai ter-fsync."""
+        record = _encode(batch)
+        async with self._lock:
+            if self._active is not None and self._active_size >= self.segment_bytes:
+                self._close_active()
+            if self._active is None:
+                self._open_segment()
+            self._active.write(record)
+            self._active_size += len(record)
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync())
+        await future
+
+    async def _sync(self):
+        # Beri kesempatan append lain masuk agar berbagi satu fsync
+        await asyncio.sleep(self.fsync_delay)
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            async with self._lock:
+                waiters, self._waiters = self._waiters, []
+                try:
+                    if self._active is not None:
+                        self._active.flush()
+                        await loop.run_in_executor(None, os.fsync, self._active.fileno())
+                except Exception as e:
+                    for w in waiters:
+                        if not w.done():
+                            w.set_exception(e)
+                    continue
+            for w in waiters:
+                if not w.done():
+                    w.set_result(None)
+
+    async def seal(self) -> List[str]:
+        """Segel segment aktif lalu kembalikan semua segment yang siap di-apply."""
+        async with self._lock:
+            self._close_active()
+            return self._segment_paths()
+
+    @staticmethod
+    def read_segment(path: str) -> Iterator[ColumnBatch]:
+        """Baca batch dari satu segment; record terakhir yang terpotong diabaikan."""
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, crc = _HEADER.unpack(header)
+                body = f.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    logger.warning("Record rusak/terpotong di %s, sisa segment diabaikan", path)
+                    return
+                yield ColumnBatch(*json.loads(body))
+
+    @staticmethod
+    def remove(path: str):
+        os.remove(path)
+
+    def stats(self) -> dict:
+        paths = self._segment_paths() if os.path.isdir(self.directory) else []
+        return {
+            "segments": len(paths),
+            "bytes": sum(os.path.getsize(p) for p in paths),
+        }
+
+    async def close(self):
+        if self._sync_task is not None:
+            await self._sync_task
+        async with self._lock:
+            self._close_active()
@@ -1,23 +1,398 @@
 import aiosqlite
+import asyncio
+import base64
+import hashlib
+import heapq
 import json
 import logging
-from datetime import datetime
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from .archive import ArchiveConfig, ArchiveTier, Segment, write_segment
+from .commit import GroupCommitter
+from .compression import CODEC_NONE, CompressionConfig, PayloadCodec, train_dictionary
+from .dedup import BloomFilter, DedupIndex
+from .encoding import encode_payload
+from .fastpath import ColumnBatch
+from .metrics import COMMIT_SECONDS, IS_DUPLICATE_SECONDS, READ_ROWS_RETURNED, READ_ROWS_SCANNED, STORE_SECONDS
 from .models import Event
+from .payload_index import PayloadIndexes
+from .pool import ConnectionManager
 
 logger = logging.getLogger("event_aggregator.store")
 
+# 8 kolom per baris; jaga jumlah parameter di bawah batas lama SQLite (999)
+INSERT_CHUNK_ROWS = 120
+# Jumlah baris per fetchmany saat mengisi indeks dedup di startup
+WARMUP_FETCH_ROWS = 10_000
+# Jumlah baris per langkah backfill saat migrasi skema
+MIGRATION_CHUNK_ROWS = 10_000
+COUNTER_KEYS = ("received", "unique_processed", "duplicate_dropped")
+EVENT_COLUMNS = "rowid, topic, event_id, timestamp, source, payload, ts_ms, codec"
+# Indeks sekunder tabel events. Boleh di-drop sementara saat import massal;
+# UNIQUE(topic, event_id) tidak termasuk karena dipakai dedup
+SECONDARY_INDEXES = {
+    # Entri indeks (topic, rowid) urut -> keyset pagination per topic
+    "idx_events_topic": "events(topic)",
+    "idx_events_topic_ts": "events(topic, ts_ms)",
+    "idx_events_source_ts": "events(source, ts_ms)",
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MS = timedelta(milliseconds=1)
+# Batas atas rowid SQLite, dipakai sebagai posisi "setelah semua baris"
+_MAX_ROWID = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    """Cursor paginasi tidak bisa didekode."""
+
+
+class InvalidFilter(ValueError):
+    """Filter query tidak valid, mis. `where` pada path payload yang tidak diindeks."""
+
+
+def encode_cursor(rowid: int, shard: int = 0, ts_ms: Optional[int] = None) -> str:
+    position = {"s": shard, "r": rowid} if shard else {"r": rowid}
+    if ts_ms is not None:
+        position["t"] = ts_ms
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[int, int, Optional[int]]:
+    """Dekode cursor menjadi posisi `(shard, rowid, ts_ms)`.
+
+    `ts_ms` hanya ada pada cursor query yang diurutkan berdasarkan waktu.
+    """
+    if not cursor:
+        return 0, 0, None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        shard, rowid, ts_ms = position.get("s", 0), position["r"], position.get("t")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+    if not all(isinstance(v, int) and v >= 0 for v in (shard, rowid)):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if ts_ms is not None and not isinstance(ts_ms, int):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return shard, rowid, ts_ms
+
+
+def timestamp_ms(value: Union[str, datetime]) -> int:
+    """Epoch milidetik UTC dari timestamp ISO8601 (naif dianggap UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MS
+
+
+def _prefix_end(prefix: str) -> str:
+    """Batas atas eksklusif untuk `topic >= prefix AND topic < end`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _filter_clauses(topic, topic_prefix, source, since, until, where=()) -> Tuple[List[str], list]:
+    # Dengan filter payload, rowid dari payload_index menjadi titik masuk query;
+    # `+kolom` mencegah planner memilih range scan indeks topic/source
+    plus = "+" if where else ""
+    clauses, params = [], []
+    if topic:
+        clauses.append(f"{plus}topic = ?")
+        params.append(topic)
+    if topic_prefix:
+        clauses.append(f"{plus}topic >= ? AND {plus}topic < ?")
+        params += [topic_prefix, _prefix_end(topic_prefix)]
+    if source:
+        clauses.append(f"{plus}source = ?")
+        params.append(source)
+    for path, value in where:
+        clauses.append("rowid IN (SELECT seq FROM payload_index WHERE topic = ? AND path = ? AND value = ?)")
+        params += [topic, path, value]
+    if since is not None:
+        clauses.append("ts_ms >= ?")
+        params.append(timestamp_ms(since))
+    if until is not None:
+        clauses.append("ts_ms < ?")
+        params.append(timestamp_ms(until))
+    return clauses, params
+
+
+def _row_to_event(row, raw: bool = False, payload: Optional[str] = None) -> dict:
+    """Ubah baris `(rowid, topic, event_id, timestamp, source, payload, ...)`.
+
+    Dengan `raw=True` payload dibiarkan sebagai teks JSON. `payload` berisi
+    teks hasil dekompresi bila kolom payload tersimpan terkompresi.
+    """
+    text = row[5] if payload is None else payload
+    return {
+        "topic": row[1],
+        "event_id": row[2],
+        "timestamp": row[3],
+        "source": row[4],
+        "payload": text if raw else json.loads(text),
+    }
+
+
+def shard_path(db_path: str, index: int) -> str:
+    """Path file shard ke-`index`; shard 0 memakai `db_path` apa adanya."""
+    if index == 0 or db_path == ":memory:":
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{index}{ext}"
+
+
+def shard_index(topic: str, shards: int) -> int:
+    """Hash stabil topic -> shard (tidak bergantung PYTHONHASHSEED)."""
+    return zlib.crc32(topic.encode()) % shards
+
+
+async def _add_ts_ms(db):
+    """v1: kolom `ts_ms` (epoch ms) dan indeks `(topic, ts_ms)`, `(source, ts_ms)`."""
+    cursor = await db.execute("PRAGMA table_info(events)")
+    columns = {row[1] for row in await cursor.fetchall()}
+    await cursor.close()
+    if "ts_ms" not in columns:
+        await db.execute("ALTER TABLE events ADD COLUMN ts_ms INTEGER")
+    last_rowid = 0
+    while True:
+        cursor = await db.execute(
+            "SELECT rowid, timestamp FROM events WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, MIGRATION_CHUNK_ROWS),
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        if not rows:
+            break
+        await db.executemany(
+            "UPDATE events SET ts_ms = ? WHERE rowid = ?",
+            [(timestamp_ms(ts), rowid) for rowid, ts in rows],
+        )
+        last_rowid = rows[-1][0]
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_events_topic_ts ON events(topic, ts_ms)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_events_source_ts ON events(source, ts_ms)")
+
+
+async def _add_tombstones(db):
+    """v2: tabel tombstone dan auto_vacuum incremental (VACUUM sekali untuk DB lama)."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS tombstones (
+            topic TEXT NOT NULL,
+            id_hash INTEGER NOT NULL,
+            ts_ms INTEGER NOT NULL,
+            PRIMARY KEY (topic, id_hash)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_ts ON tombstones(ts_ms)")
+    await db.commit()
+    cursor = await db.execute("PRAGMA auto_vacuum")
+    mode = (await cursor.fetchone())[0]
+    await cursor.close()
+    if mode != 2:
+        # auto_vacuum baru berlaku setelah VACUUM penuh; tidak bisa di dalam transaksi
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.execute("VACUUM")
+
+
+async def _add_codec(db):
+    """v3: kolom `codec` per baris dan tabel dictionary kompresi per topic."""
+    cursor = await db.execute("PRAGMA table_info(events)")
+    columns = {row[1] for row in await cursor.fetchall()}
+    await cursor.close()
+    if "codec" not in columns:
+        await db.execute("ALTER TABLE events ADD COLUMN codec INTEGER NOT NULL DEFAULT 0")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS dictionaries (
+            id INTEGER PRIMARY KEY,
+            topic TEXT NOT NULL,
+            codec INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+
+
+async def _add_consumer_offsets(db):
+    """v4: offset yang di-commit consumer group per topic."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS consumer_offsets (
+            grp TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (grp, topic)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _add_rollups(db):
+    """v5: counter per `(menit, topic, source)` untuk /stats/timeseries (dipakai di shard 0)."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rollups (
+            bucket INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            source TEXT NOT NULL,
+            received INTEGER NOT NULL,
+            duplicates INTEGER NOT NULL,
+            PRIMARY KEY (bucket, topic, source)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _add_archive_segments(db):
+    """v6: katalog segment tier arsip milik shard ini."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            name TEXT PRIMARY KEY,
+            topic TEXT NOT NULL,
+            min_ts INTEGER NOT NULL,
+            max_ts INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+async def _add_payload_index(db):
+    """v7: nilai JSON path payload yang diindeks, dicari lewat `(topic, path, value)`."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS payload_index (
+            seq INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (seq, path)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_payload_lookup ON payload_index(topic, path, value, seq)")
+    # Path yang sudah di-backfill; path baru di konfigurasi di-backfill saat startup
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS payload_index_paths (
+            topic TEXT NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (topic, path)
+        ) WITHOUT ROWID
+    """)
+
+
+# Migrasi skema berurutan; indeks ke-i menaikkan PRAGMA user_version ke i + 1
+MIGRATIONS = [
+    _add_ts_ms, _add_tombstones, _add_codec, _add_consumer_offsets, _add_rollups, _add_archive_segments,
+    _add_payload_index,
+]
+
+
+def id_hash(event_id: str) -> int:
+    """Hash 64-bit (signed, muat di INTEGER SQLite) untuk key tombstone."""
+    return int.from_bytes(hashlib.blake2b(event_id.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+def _tombstone_key(topic: str, hashed: int) -> str:
+    return f"{topic}\x00{hashed}"
+
+
+class _Shard:
+    """Satu file database beserta pool koneksi, group-commit, dan counter-nya."""
+
+    def __init__(self, index: int, db_path: str, pool: ConnectionManager, archive: Optional[ArchiveTier] = None):
+        self.index = index
+        self.db_path = db_path
+        self.pool = pool
+        self.archive = archive
+        self.committer = None
+        # Counter di-checkpoint per shard karena checkpoint_rowid per file
+        self.counters = dict.fromkeys(COUNTER_KEYS, 0)
+        self.dirty = False
+        # Bloom di depan tabel tombstones; hanya dibangun ulang saat startup
+        self.tombstone_bloom = None
+        self.tombstones = 0
+        # Sequence (rowid) terakhir yang dibagikan; rowid diisi eksplisit agar
+        # tidak pernah dipakai ulang walau baris terbaru dihapus retensi
+        self.seq = 0
+
+
 class SQLiteEventStore:
-    """Asynchronous SQLite store for events and stats."""
+    """Asynchronous SQLite store for events and stats.
+
+    Dengan `shards > 1` event dibagi ke beberapa file SQLite berdasarkan
+    hash stabil `topic`. Setiap shard punya writer dan loop group-commit
+    sendiri; dedup `(topic, event_id)` selalu lokal di satu shard.
+    """
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        commit_max_batch: int = 5000,
+        commit_max_delay: float = 0.002,
+        dedup_index: Optional[DedupIndex] = None,
+        read_pool_size: int = 4,
+        pragmas: Optional[Dict] = None,
+        shards: int = 1,
+        tombstone_bloom_bytes: int = 1024 * 1024,
+        compression: Optional[CompressionConfig] = None,
+        archive: Optional[ArchiveConfig] = None,
+        payload_indexes: Optional[Dict[str, Sequence[str]]] = None,
+    ):
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
         self.db_path = db_path
-        self._conn = None
+        self._dedup = dedup_index if dedup_index is not None else DedupIndex()
+        # Daftar topic dipegang di memori; counter ada di masing-masing shard
+        self._topics = set()
+        self.tombstone_bloom_bytes = tombstone_bloom_bytes
+        self._codec = PayloadCodec(compression)
+        self.archive_config = archive
+        # JSON path payload per topic yang diindeks, mis. {"order.paid": ["$.order_id"]}
+        self._indexes = PayloadIndexes(payload_indexes)
+        self._listeners = []
+        self._ingest_listeners = []
+        self._retention = {"deleted": 0, "tombstones_expired": 0, "vacuumed_pages": 0}
+        self._shards = []
+        for index in range(shards):
+            path = shard_path(db_path, index)
+            tier = (
+                ArchiveTier(os.path.join(archive.directory, f"shard{index}"), archive.bloom_bits_per_key)
+                if archive else None
+            )
+            shard = _Shard(index, path, ConnectionManager(path, readers=read_pool_size, pragmas=pragmas), tier)
+            shard.committer = GroupCommitter(
+                lambda batch, shard=shard: self._store_shard_batch(shard, batch),
+                max_batch_size=commit_max_batch,
+                max_delay=commit_max_delay,
+                merge=ColumnBatch.concat,
+            )
+            self._shards.append(shard)
+
+    def _shard_for(self, topic: str) -> _Shard:
+        return self._shards[shard_index(topic, len(self._shards))]
+
+    def _split(self, batch: ColumnBatch) -> Dict[int, List[int]]:
+        """Kelompokkan posisi event di dalam batch per shard."""
+        if len(self._shards) == 1:
+            return {0: list(range(len(batch)))}
+        groups = {}
+        for i, topic in enumerate(batch.topics):
+            groups.setdefault(shard_index(topic, len(self._shards)), []).append(i)
+        return groups
 
     async def initialize(self):
-        """Siapkan skema database jika belum ada."""
-        if self.db_path == ":memory:":
-            self._conn = await aiosqlite.connect(self.db_path)
-            db = self._conn
+        """Buka pool koneksi dan siapkan skema database jika belum ada."""
+        self._topics = set()
+        for shard in self._shards:
+            await self._initialize_shard(shard)
+        await self._check_shard_count()
+        logger.info("Database siap di: %s (%d shard)", self.db_path, len(self._shards))
+
+    async def _initialize_shard(self, shard: _Shard):
+        await shard.pool.open()
+        async with shard.pool.write() as db:
+            # Hanya berlaku untuk database baru (belum ada tabel)
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # Table events
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS events (
                     topic TEXT NOT NULL,
@@ -25,9 +400,12 @@ class SQLiteEventStore:
                     timestamp TEXT NOT NULL,
                     source TEXT NOT NULL,
                     payload TEXT NOT NULL,
+                    ts_ms INTEGER,
+                    codec INTEGER NOT NULL DEFAULT 0,
                     UNIQUE(topic, event_id)
                 )
             """)
+            # Table stats
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS stats (
                     key TEXT PRIMARY KEY,
@@ -42,194 +420,1178 @@ class SQLiteEventStore:
                 ("duplicate_dropped", 0)
             ])
             await db.commit()
-            logger.info(f"Database siap di: {self.db_path}")
+            await self._migrate(shard, db)
+            # Juga memulihkan indeks yang tertinggal di-drop oleh import yang terputus
+            await self._create_indexes(db)
+            await self._load_archive(shard, db)
+            await self._load_stats(shard, db)
+            await self._warm_dedup(db)
+            await self._load_tombstones(shard, db)
+            await self._load_dictionaries(shard, db)
+            # Setelah dictionary dimuat: backfill perlu mendekompresi payload
+            await self._sync_payload_paths(shard, db)
+
+    async def _migrate(self, shard: _Shard, db):
+        """Jalankan migrasi yang belum diterapkan (dicatat di `user_version`)."""
+        cursor = await db.execute("PRAGMA user_version")
+        version = (await cursor.fetchone())[0]
+        await cursor.close()
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info("Migrasi skema %s ke versi %d", shard.db_path, target)
+            try:
+                await migration(db)
+                await db.execute(f"PRAGMA user_version = {target}")
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    @staticmethod
+    async def _create_indexes(db):
+        for name, columns in SECONDARY_INDEXES.items():
+            await db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+        await db.commit()
+
+    async def drop_secondary_indexes(self):
+        """Drop indeks sekunder di semua shard agar insert massal lebih murah.
+
+        Panggil `rebuild_secondary_indexes` setelah selesai; `initialize`
+        berikutnya juga membuatnya ulang bila proses terputus.
+        """
+        for shard in self._shards:
+            async with shard.pool.write() as db:
+                for name in SECONDARY_INDEXES:
+                    await db.execute(f"DROP INDEX IF EXISTS {name}")
+                await db.commit()
+
+    async def rebuild_secondary_indexes(self):
+        """Buat ulang indeks sekunder; satu kali sort per indeks, jauh lebih murah
+        daripada memelihara indeks baris demi baris selama import."""
+        for shard in self._shards:
+            async with shard.pool.write() as db:
+                await self._create_indexes(db)
+
+    async def _check_shard_count(self):
+        """Tolak start jika jumlah shard berbeda dari saat data pertama ditulis."""
+        async with self._shards[0].pool.write() as db:
+            await db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            await db.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('shard_count', ?)",
+                (str(len(self._shards)),),
+            )
+            await db.commit()
+            cursor = await db.execute("SELECT value FROM meta WHERE key = 'shard_count'")
+            stored = int((await cursor.fetchone())[0])
+            await cursor.close()
+        if stored != len(self._shards):
+            raise RuntimeError(
+                f"Database {self.db_path} dibuat dengan {stored} shard, bukan {len(self._shards)}"
+            )
+
+    async def _load_stats(self, shard: _Shard, db):
+        """Muat counter dari checkpoint terakhir dan hitung ulang sisanya.
+
+        Event yang ter-commit setelah checkpoint (mis. setelah crash) dihitung
+        ulang dari tabel events lewat `checkpoint_rowid`. Duplikat yang
+        ditolak setelah checkpoint terakhir tidak meninggalkan jejak di
+        database sehingga tidak bisa dipulihkan.
+        """
+        cursor = await db.execute("SELECT key, value FROM stats")
+        stored = {row[0]: row[1] for row in await cursor.fetchall()}
+        await cursor.close()
+        cursor = await db.execute("SELECT MAX(rowid) FROM events")
+        max_rowid = (await cursor.fetchone())[0] or 0
+        await cursor.close()
+
+        shard.counters = {key: stored.get(key, 0) for key in COUNTER_KEYS}
+        archived_rowid = shard.archive.max_rowid if shard.archive else 0
+        shard.seq = max(stored.get("seq", 0), max_rowid, archived_rowid)
+        # Database lama (stats di-update per event) belum punya checkpoint
+        checkpoint = stored.get("checkpoint_rowid", max_rowid)
+        if checkpoint < max_rowid:
+            cursor = await db.execute("SELECT COUNT(*) FROM events WHERE rowid > ?", (checkpoint,))
+            missing = (await cursor.fetchone())[0]
+            await cursor.close()
+            shard.counters["unique_processed"] += missing
+            shard.counters["received"] += missing
+            logger.warning("Memulihkan %d event setelah checkpoint stats terakhir (%s)", missing, shard.db_path)
+            shard.dirty = True
+
+        cursor = await db.execute("SELECT DISTINCT topic FROM events")
+        self._topics.update(row[0] for row in await cursor.fetchall())
+        await cursor.close()
+        if shard.archive:
+            self._topics.update(shard.archive.topics())
+
+    async def _load_archive(self, shard: _Shard, db):
+        if shard.archive is None:
             return
-        async with aiosqlite.connect(self.db_path) as db:
-            # Table events
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS events (
-                    topic TEXT NOT NULL,
-                    event_id TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    source TEXT NOT NULL,
-                    payload TEXT NOT NULL,
-                    UNIQUE(topic, event_id)
-                )
-            """)
-            # Table stats
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS stats (
-                    key TEXT PRIMARY KEY,
-                    value INTEGER
+        cursor = await db.execute("SELECT name FROM archive_segments")
+        names = [row[0] for row in await cursor.fetchall()]
+        await cursor.close()
+        shard.archive.close()
+        await asyncio.get_running_loop().run_in_executor(None, shard.archive.load, names)
+
+    async def _sync_payload_paths(self, shard: _Shard, db):
+        """Samakan isi payload_index dengan path yang dideklarasikan.
+
+        Path yang tidak lagi dideklarasikan dihapus; path baru di-backfill
+        dari event yang sudah ada (tabel events dan tier arsip).
+        """
+        cursor = await db.execute("SELECT topic, path FROM payload_index_paths")
+        stored = {tuple(row) for row in await cursor.fetchall()}
+        await cursor.close()
+        declared = {
+            (topic, path)
+            for topic, paths in self._indexes.declared().items()
+            if self._shard_for(topic) is shard for path in paths
+        }
+        for topic, path in sorted(stored - declared):
+            await db.execute("DELETE FROM payload_index WHERE topic = ? AND path = ?", (topic, path))
+            await db.execute("DELETE FROM payload_index_paths WHERE topic = ? AND path = ?", (topic, path))
+            await db.commit()
+            logger.info("Indeks payload %s %s dihapus", topic, path)
+        added = {}
+        for topic, path in declared - stored:
+            added.setdefault(topic, []).append(path)
+        for topic, paths in sorted(added.items()):
+            count = await self._backfill_payload_index(shard, db, topic, paths)
+            await db.executemany(
+                "INSERT OR IGNORE INTO payload_index_paths (topic, path) VALUES (?, ?)",
+                [(topic, path) for path in paths],
+            )
+            await db.commit()
+            logger.info("Indeks payload %s %s dibangun dari %d event", topic, ", ".join(sorted(paths)), count)
+
+    async def _backfill_payload_index(self, shard: _Shard, db, topic: str, paths: List[str]) -> int:
+        sql = "INSERT OR REPLACE INTO payload_index (seq, path, topic, value) VALUES (?, ?, ?, ?)"
+        count = 0
+        after = 0
+        while True:
+            cursor = await db.execute(
+                "SELECT rowid, payload, codec FROM events WHERE topic = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (topic, after, MIGRATION_CHUNK_ROWS),
+            )
+            rows = await cursor.fetchall()
+            await cursor.close()
+            if not rows:
+                break
+            entries = []
+            for rowid, payload, codec in rows:
+                text = self._codec.decode(payload, codec, shard.index) if codec else payload
+                entries += [(rowid, path, topic, value) for path, value in self._indexes.extract(topic, text, paths)]
+            await db.executemany(sql, entries)
+            await db.commit()
+            count += len(rows)
+            after = rows[-1][0]
+        if shard.archive is not None:
+            for segment in shard.archive.segments(topic):
+                entries = []
+                for i in range(segment.count):
+                    row = segment.row(i)
+                    entries += [(row[0], path, topic, value) for path, value in self._indexes.extract(topic, row[5], paths)]
+                await db.executemany(sql, entries)
+                await db.commit()
+                count += segment.count
+        return count
+
+    async def flush_stats(self):
+        """Tulis counter in-memory setiap shard ke tabel stats (checkpoint)."""
+        for shard in self._shards:
+            if not shard.dirty or not shard.pool.is_open:
+                continue
+            async with shard.pool.write() as db:
+                cursor = await db.execute("SELECT MAX(rowid) FROM events")
+                max_rowid = (await cursor.fetchone())[0] or 0
+                await cursor.close()
+                await db.executemany(
+                    "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+                    [*shard.counters.items(), ("checkpoint_rowid", max_rowid), ("seq", shard.seq)],
                 )
-            """)
-            await db.executemany("""
-                INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)
-            """, [
-                ("received", 0),
-                ("unique_processed", 0),
-                ("duplicate_dropped", 0)
-            ])
+                await db.commit()
+                shard.dirty = False
+
+    def _count(self, shard: _Shard, topics: Sequence[str], sources: Sequence[str], results: Sequence[bool]):
+        for listener in self._ingest_listeners:
+            try:
+                listener(topics, sources, results)
+            except Exception as e:
+                logger.error("Ingest listener gagal: %s", e)
+        stored = 0
+        for topic, ok in zip(topics, results):
+            if ok:
+                stored += 1
+                self._topics.add(topic)
+        shard.counters["received"] += len(results)
+        shard.counters["unique_processed"] += stored
+        shard.counters["duplicate_dropped"] += len(results) - stored
+        shard.dirty = True
+
+    async def _warm_dedup(self, db):
+        """Isi Bloom filter dari key yang sudah ada di tabel events."""
+        cursor = await db.execute("SELECT topic, event_id FROM events")
+        while True:
+            rows = await cursor.fetchmany(WARMUP_FETCH_ROWS)
+            if not rows:
+                break
+            for topic, event_id in rows:
+                self._dedup.add(topic, event_id, remember=False)
+        await cursor.close()
+
+    async def _load_tombstones(self, shard: _Shard, db):
+        shard.tombstone_bloom = BloomFilter(self.tombstone_bloom_bytes)
+        shard.tombstones = 0
+        cursor = await db.execute("SELECT topic, id_hash FROM tombstones")
+        while True:
+            rows = await cursor.fetchmany(WARMUP_FETCH_ROWS)
+            if not rows:
+                break
+            for topic, hashed in rows:
+                shard.tombstone_bloom.add(_tombstone_key(topic, hashed))
+            shard.tombstones += len(rows)
+        await cursor.close()
+
+    async def _load_dictionaries(self, shard: _Shard, db):
+        cursor = await db.execute("SELECT id, topic, codec, data FROM dictionaries ORDER BY id")
+        for dict_id, topic, codec, data in await cursor.fetchall():
+            self._codec.load_dictionary(shard.index, dict_id, topic, codec, data)
+        await cursor.close()
+
+    async def _train_dictionary(self, shard: _Shard, topic: str, samples: List[bytes]):
+        codec = self._codec.spec_for(topic).codec
+        config = self._codec.config
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, train_dictionary, codec, samples, config.dict_size
+            )
+        except Exception as e:
+            logger.warning("Gagal melatih dictionary untuk topic %s: %s", topic, e)
+            return
+        async with shard.pool.write() as db:
+            cursor = await db.execute(
+                "INSERT INTO dictionaries (topic, codec, data) VALUES (?, ?, ?) RETURNING id",
+                (topic, codec, data),
+            )
+            dict_id = (await cursor.fetchone())[0]
+            await cursor.close()
             await db.commit()
-            logger.info(f"Database siap di: {self.db_path}")
+        self._codec.load_dictionary(shard.index, dict_id, topic, codec, data)
+        logger.info("Dictionary kompresi %d dilatih untuk topic %s (%d byte)", dict_id, topic, len(data))
 
-    async def is_duplicate(self, event: Event) -> bool:
-        if self._conn:
-            cursor = await self._conn.execute(
-                "SELECT 1 FROM events WHERE topic = ? AND event_id = ?",
-                (event.topic, event.event_id)
+    async def _encode_payloads(self, shard: _Shard, batch: ColumnBatch):
+        """Kompresi payload sebelum write lock diambil; None jika kompresi nonaktif."""
+        codec = self._codec
+        if not codec.enabled:
+            return None
+        for topic, payload in zip(batch.topics, batch.payloads):
+            if codec.needs_dictionary(topic):
+                samples = codec.add_sample(topic, payload)
+                if samples:
+                    await self._train_dictionary(shard, topic, samples)
+        return [codec.encode(topic, payload) for topic, payload in zip(batch.topics, batch.payloads)]
+
+    async def _tombstoned(self, shard: _Shard, db, rows) -> set:
+        """Key `(topic, event_id)` di `rows` yang event-nya sudah dihapus retensi."""
+        if not shard.tombstones:
+            return set()
+        candidates = {}
+        for row in rows:
+            hashed = id_hash(row[1])
+            if _tombstone_key(row[0], hashed) in shard.tombstone_bloom:
+                candidates.setdefault((row[0], hashed), []).append((row[0], row[1]))
+        found = set()
+        items = list(candidates)
+        for start in range(0, len(items), INSERT_CHUNK_ROWS):
+            chunk = items[start:start + INSERT_CHUNK_ROWS]
+            placeholders = ",".join(["(?, ?)"] * len(chunk))
+            cursor = await db.execute(
+                f"SELECT topic, id_hash FROM tombstones WHERE (topic, id_hash) IN (VALUES {placeholders})",
+                [value for item in chunk for value in item],
             )
-            result = await cursor.fetchone()
+            for topic, hashed in await cursor.fetchall():
+                found.update(candidates[(topic, hashed)])
             await cursor.close()
-            return result is not None
-        async with aiosqlite.connect(self.db_path) as db:
+        return found
+
+    @staticmethod
+    def _archived(shard: _Shard, rows) -> set:
+        """Key `(topic, event_id)` di `rows` yang sudah ada di tier arsip (filter key per segment)."""
+        tier = shard.archive
+        if tier is None or not tier.topics():
+            return set()
+        return {(row[0], row[1]) for row in rows if tier.contains(row[0], row[1])}
+
+    async def is_duplicate(self, event: Event) -> bool:
+        started = time.perf_counter()
+        shard = self._shard_for(event.topic)
+        key = [(event.topic, event.event_id)]
+        known = self._dedup.check(event.topic, event.event_id)
+        if known is not True and self._archived(shard, key):
+            # Event yang sudah dipindah ke tier arsip dicek lewat filter key
+            # arsip; seperti tombstone, tidak disimpan di LRU karena segment bisa di-drop
+            IS_DUPLICATE_SECONDS.since(started)
+            return True
+        if known is False and shard.tombstones:
+            # Bloom dedup hanya diisi dari tabel events (mis. setelah restart);
+            # key yang sudah dihapus retensi dicek lewat Bloom tombstone
+            if _tombstone_key(event.topic, id_hash(event.event_id)) in shard.tombstone_bloom:
+                known = None
+        if known is not None:
+            IS_DUPLICATE_SECONDS.since(started)
+            return known
+        # Bloom filter positif: konfirmasi ke database, termasuk tombstone
+        # retensi yang juga ditolak oleh jalur insert
+        async with shard.pool.read() as db:
             cursor = await db.execute(
                 "SELECT 1 FROM events WHERE topic = ? AND event_id = ?",
                 (event.topic, event.event_id)
             )
-            result = await cursor.fetchone()
+            duplicate = await cursor.fetchone() is not None
             await cursor.close()
-            return result is not None
+            # Tombstone bisa kedaluwarsa, jadi hasilnya tidak disimpan di LRU dedup
+            retained = not duplicate and bool(await self._tombstoned(shard, db, key))
+        if not retained:
+            self._dedup.record(event.topic, event.event_id, duplicate=duplicate)
+        IS_DUPLICATE_SECONDS.since(started)
+        return duplicate or retained
 
     async def store_event(self, event: Event) -> bool:
         """Store event and update stats."""
-        if self._conn:
-            db = self._conn
-            await db.execute("UPDATE stats SET value = value + 1 WHERE key = 'received'")
+        started = time.perf_counter()
+        try:
+            return await self._store_event(event)
+        finally:
+            STORE_SECONDS.since(started, "event")
+
+    async def _store_event(self, event: Event) -> bool:
+        shard = self._shard_for(event.topic)
+        text = encode_payload(event.payload)
+        payload, tag = self._codec.encode(event.topic, text)
+        async with shard.pool.write() as db:
             try:
+                key = [(event.topic, event.event_id)]
+                if await self._tombstoned(shard, db, key):
+                    raise aiosqlite.IntegrityError("event expired by retention")
+                if self._archived(shard, key):
+                    raise aiosqlite.IntegrityError("event already archived")
+                rowid = shard.seq + 1
                 await db.execute(
                     """
-                    INSERT INTO events (topic, event_id, timestamp, source, payload)
-                    VALUES (?, ?, ?, ?, ?)
+                    INSERT INTO events (rowid, topic, event_id, timestamp, source, payload, ts_ms, codec)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     (
+                        rowid,
                         event.topic,
                         event.event_id,
                         event.timestamp.isoformat(),
                         event.source,
-                        json.dumps(event.payload)
+                        payload,
+                        timestamp_ms(event.timestamp),
+                        tag,
                     )
                 )
-
-                await db.execute(
-                    "UPDATE stats SET value = value + 1 WHERE key = 'unique_processed'"
-                )
+                await self._index_payloads(db, [(rowid, event.topic, text)])
+                committing = time.perf_counter()
                 await db.commit()
-                logger.info(f"Event tersimpan: {event.topic}:{event.event_id}")
+                COMMIT_SECONDS.since(committing)
+                shard.seq = rowid
+                self._dedup.add(event.topic, event.event_id)
+                self._count(shard, [event.topic], [event.source], [True])
+                # Per event hanya di level DEBUG; jalur batch mencatat satu ringkasan
+                logger.debug("Event tersimpan: %s:%s", event.topic, event.event_id)
+                self._notify([(
+                    shard.index, rowid, event.topic, event.event_id,
+                    event.timestamp.isoformat(), event.source, text,
+                )])
                 return True
             except aiosqlite.IntegrityError:
                 # Duplicate
-                await db.execute(
-                    "UPDATE stats SET value = value + 1 WHERE key = 'duplicate_dropped'"
-                )
-                await db.commit()
-                logger.warning(f"Duplikat terdeteksi: {event.topic}:{event.event_id}")
+                await db.rollback()
+                self._count(shard, [event.topic], [event.source], [False])
+                logger.warning("Duplikat terdeteksi: %s:%s", event.topic, event.event_id)
                 return False
             except Exception as e:
-                logger.error(f"Kesalahan menyimpan event: {e}")
+                await db.rollback()
+                logger.error("Kesalahan menyimpan event: %s", e)
                 return False
-        # fallback: koneksi file-based per-call
-        async with aiosqlite.connect(self.db_path) as db:
-            # Increment received
-            await db.execute("UPDATE stats SET value = value + 1 WHERE key = 'received'")
-            try:
-                await db.execute(
-                    """
-                    INSERT INTO events (topic, event_id, timestamp, source, payload)
-                    VALUES (?, ?, ?, ?, ?)
+
+    async def store_events(self, events) -> List[bool]:
+        """Simpan satu batch event dalam satu transaksi per shard.
+
+        `events` boleh berupa list `Event` atau `ColumnBatch`. Mengembalikan
+        list bool sejajar dengan batch: True jika event tersimpan, False jika
+        duplikat (termasuk duplikat di dalam batch).
+        """
+        return await self._scatter(ColumnBatch.coerce(events), self._store_shard_batch)
+
+    async def submit_events(self, events) -> List[bool]:
+        """Simpan batch lewat group-commit: batch yang datang bersamaan
+        digabung ke dalam satu transaksi per shard."""
+        return await self._scatter(
+            ColumnBatch.coerce(events),
+            lambda shard, batch: shard.committer.submit(batch),
+        )
+
+    async def _scatter(self, batch: ColumnBatch, write) -> List[bool]:
+        """Pecah batch per shard, tulis paralel, lalu susun ulang hasilnya."""
+        if not batch:
+            return []
+        groups = self._split(batch)
+        if len(groups) == 1:
+            return await write(self._shards[next(iter(groups))], batch)
+        outcomes = await asyncio.gather(*(
+            write(self._shards[index], batch.select(positions))
+            for index, positions in groups.items()
+        ))
+        results = [False] * len(batch)
+        for positions, shard_results in zip(groups.values(), outcomes):
+            for position, ok in zip(positions, shard_results):
+                results[position] = ok
+        return results
+
+    async def _store_shard_batch(self, shard: _Shard, batch: ColumnBatch) -> List[bool]:
+        started = time.perf_counter()
+        encoded = await self._encode_payloads(shard, batch)
+        async with shard.pool.write() as db:
+            results = await self._insert_batch(shard, db, batch, encoded)
+        STORE_SECONDS.since(started, "batch")
+        return results
+
+    async def _insert_batch(self, shard: _Shard, db, batch: ColumnBatch, encoded=None) -> List[bool]:
+        dedup = self._dedup
+        keys = list(zip(batch.topics, batch.event_ids))
+        # Key yang ada di LRU pasti duplikat, tidak perlu menyentuh database
+        checks = [dedup.check(topic, event_id) for topic, event_id in keys]
+        if encoded is None:
+            rows = [(*row, timestamp_ms(row[2]), CODEC_NONE) for row in batch.rows()]
+        else:
+            rows = [
+                (topic, event_id, timestamp, source, value, timestamp_ms(timestamp), tag)
+                for (topic, event_id, timestamp, source, _), (value, tag) in zip(batch.rows(), encoded)
+            ]
+        pending = [row for row, known in zip(rows, checks) if known is not True]
+        inserted = {}
+        try:
+            # Redelivery event yang sudah dihapus retensi atau dipindah ke arsip tetap duplikat
+            gone = await self._tombstoned(shard, db, pending) | self._archived(shard, pending)
+            if gone:
+                pending = [row for row in pending if (row[0], row[1]) not in gone]
+            # Sequence dibagikan berurutan; duplikat yang diabaikan meninggalkan celah
+            seq = shard.seq
+            for start in range(0, len(pending), INSERT_CHUNK_ROWS):
+                chunk = pending[start:start + INSERT_CHUNK_ROWS]
+                params = [value for offset, row in enumerate(chunk, start=seq + start + 1) for value in (offset, *row)]
+                placeholders = ",".join(["(?, ?, ?, ?, ?, ?, ?, ?)"] * len(chunk))
+                cursor = await db.execute(
+                    f"""
+                    INSERT INTO events (rowid, topic, event_id, timestamp, source, payload, ts_ms, codec)
+                    VALUES {placeholders}
+                    ON CONFLICT(topic, event_id) DO NOTHING
+                    RETURNING rowid, topic, event_id
                     """,
-                    (
-                        event.topic,
-                        event.event_id,
-                        event.timestamp.isoformat(),
-                        event.source,
-                        json.dumps(event.payload)
-                    )
+                    params,
                 )
-                # Increment unique_processed
-                await db.execute(
-                    "UPDATE stats SET value = value + 1 WHERE key = 'unique_processed'"
+                inserted.update(((row[1], row[2]), row[0]) for row in await cursor.fetchall())
+                await cursor.close()
+
+            results = []
+            committed = []
+            indexed = []
+            for i, key in enumerate(keys):
+                # Duplikat di dalam batch yang sama hanya dihitung tersimpan sekali
+                rowid = inserted.pop(key, None)
+                results.append(rowid is not None)
+                if rowid is not None and self._listeners:
+                    committed.append((
+                        shard.index, rowid, key[0], key[1],
+                        batch.timestamps[i], batch.sources[i], batch.payloads[i],
+                    ))
+                if rowid is not None and self._indexes.indexed(key[0]):
+                    indexed.append((rowid, key[0], batch.payloads[i]))
+            await self._index_payloads(db, indexed)
+            committing = time.perf_counter()
+            await db.commit()
+            COMMIT_SECONDS.since(committing)
+            shard.seq = seq + len(pending)
+        except Exception:
+            await db.rollback()
+            raise
+
+        self._count(shard, batch.topics, batch.sources, results)
+        stored = sum(results)
+        for (topic, event_id), known, ok in zip(keys, checks, results):
+            if known is None:
+                dedup.record(topic, event_id, duplicate=not ok)
+            if ok:
+                dedup.add(topic, event_id)
+        logger.info("Batch tersimpan: %d unik, %d duplikat", stored, len(results) - stored)
+        self._notify(committed)
+        return results
+
+    async def _index_payloads(self, db, rows: Sequence[Tuple[int, str, str]]):
+        """Tulis nilai path yang diindeks untuk `(rowid, topic, payload_json)` di transaksi yang sama."""
+        entries = [
+            (rowid, path, topic, value)
+            for rowid, topic, payload in rows
+            for path, value in self._indexes.extract(topic, payload)
+        ]
+        if entries:
+            await db.executemany(
+                "INSERT INTO payload_index (seq, path, topic, value) VALUES (?, ?, ?, ?)", entries
+            )
+
+    async def _unindex_payloads(self, db, topic: str, rowids: Sequence[int]):
+        if rowids and self._indexes.indexed(topic):
+            await db.execute(
+                "DELETE FROM payload_index WHERE seq IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(rowids)),),
+            )
+
+    def add_commit_listener(self, listener):
+        """Daftarkan callback `listener(events)` yang dipanggil setelah commit.
+
+        `events` berisi tuple `(shard, rowid, topic, event_id, timestamp,
+        source, payload_json)` untuk event yang benar-benar tersimpan.
+        """
+        self._listeners.append(listener)
+
+    def remove_commit_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def add_ingest_listener(self, listener):
+        """Daftarkan callback `listener(topics, sources, results)` per batch.
+
+        Berbeda dengan commit listener, duplikat ikut dilaporkan (`results`
+        bernilai False untuk event yang ditolak sebagai duplikat).
+        """
+        self._ingest_listeners.append(listener)
+
+    def _notify(self, committed):
+        if not committed:
+            return
+        for listener in self._listeners:
+            try:
+                listener(committed)
+            except Exception as e:
+                logger.error("Commit listener gagal: %s", e)
+
+    async def close(self):
+        """Commit antrean yang tersisa, checkpoint stats, lalu tutup koneksi."""
+        for shard in self._shards:
+            await shard.committer.close()
+        await self.flush_stats()
+        for shard in self._shards:
+            await shard.pool.close()
+            if shard.archive is not None:
+                shard.archive.close()
+
+    def list_topics(self) -> List[str]:
+        return sorted(self._topics)
+
+    async def count_events(self, topic: str) -> int:
+        async with self._shard_for(topic).pool.read() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM events WHERE topic = ?", (topic,))
+            count = (await cursor.fetchone())[0]
+            await cursor.close()
+        return count
+
+    async def delete_oldest(
+        self,
+        topic: str,
+        limit: int,
+        before: Union[str, datetime, None] = None,
+        tombstone_since: Union[str, datetime, None] = None,
+    ) -> int:
+        """Hapus sampai `limit` event tertua (per `ts_ms`) dari satu topic.
+
+        Dengan `before` hanya event dengan timestamp lebih lama yang dihapus.
+        Key event yang dihapus disimpan sebagai tombstone `(topic, hash
+        event_id)` agar redelivery tetap ditolak; event yang lebih lama dari
+        `tombstone_since` (di luar jendela dedup) tidak diberi tombstone.
+        Satu panggilan = satu transaksi pendek.
+        """
+        shard = self._shard_for(topic)
+        params = [topic]
+        condition = ""
+        if before is not None:
+            condition = "AND ts_ms < ?"
+            params.append(timestamp_ms(before))
+        async with shard.pool.write() as db:
+            try:
+                cursor = await db.execute(
+                    f"""
+                    DELETE FROM events WHERE rowid IN (
+                        SELECT rowid FROM events WHERE topic = ? {condition}
+                        ORDER BY ts_ms, rowid LIMIT ?
+                    )
+                    RETURNING rowid, event_id, ts_ms
+                    """,
+                    (*params, limit),
                 )
+                deleted = await cursor.fetchall()
+                await cursor.close()
+                await self._unindex_payloads(db, topic, [row[0] for row in deleted])
+                min_ms = timestamp_ms(tombstone_since) if tombstone_since is not None else None
+                tombstones = [
+                    (topic, id_hash(event_id), ts)
+                    for _, event_id, ts in deleted if min_ms is None or ts >= min_ms
+                ]
+                if tombstones:
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO tombstones (topic, id_hash, ts_ms) VALUES (?, ?, ?)",
+                        tombstones,
+                    )
+                # Baris dengan sequence tertinggi bisa ikut terhapus: simpan batasnya
+                await db.execute("INSERT OR REPLACE INTO stats (key, value) VALUES ('seq', ?)", (shard.seq,))
                 await db.commit()
-                logger.info(f"Event tersimpan: {event.topic}:{event.event_id}")
-                return True
-            except aiosqlite.IntegrityError:
-                # Duplicate
-                await db.execute(
-                    "UPDATE stats SET value = value + 1 WHERE key = 'duplicate_dropped'"
+            except Exception:
+                await db.rollback()
+                raise
+            if deleted:
+                cursor = await db.execute("SELECT 1 FROM events WHERE topic = ? LIMIT 1", (topic,))
+                if await cursor.fetchone() is None and not (shard.archive and shard.archive.segments(topic)):
+                    self._topics.discard(topic)
+                await cursor.close()
+        for _, hashed, _ in tombstones:
+            shard.tombstone_bloom.add(_tombstone_key(topic, hashed))
+        shard.tombstones += len(tombstones)
+        self._retention["deleted"] += len(deleted)
+        return len(deleted)
+
+    async def expire_tombstones(self, before: Union[str, datetime], limit: int = 10_000) -> int:
+        """Hapus tombstone event yang timestamp-nya di luar jendela dedup."""
+        before_ms = timestamp_ms(before)
+        expired = 0
+        for shard in self._shards:
+            async with shard.pool.write() as db:
+                # Tabel WITHOUT ROWID: hapus lewat primary key
+                cursor = await db.execute(
+                    "DELETE FROM tombstones WHERE (topic, id_hash) IN ("
+                    "SELECT topic, id_hash FROM tombstones WHERE ts_ms < ? LIMIT ?)",
+                    (before_ms, limit),
                 )
+                count = cursor.rowcount
+                await cursor.close()
                 await db.commit()
-                logger.warning(f"Duplikat terdeteksi: {event.topic}:{event.event_id}")
-                return False
-            except Exception as e:
-                logger.error(f"Kesalahan menyimpan event: {e}")
-                return False
+            shard.tombstones = max(0, shard.tombstones - count)
+            expired += count
+        self._retention["tombstones_expired"] += expired
+        return expired
 
-    async def get_events(self, topic: str = None):
-        # support both persistent in-memory connection and file-backed DB
-        if self._conn:
-            db = self._conn
-            if topic:
-                query = "SELECT * FROM events WHERE topic = ?"
-                params = (topic,)
-            else:
-                query = "SELECT * FROM events"
-                params = ()
-            cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
+    async def archive_events(self, topic: str, before: Union[str, datetime], limit: int = 100_000) -> int:
+        """Pindahkan sampai `limit` event tertua `topic` ke tier arsip.
+
+        Hanya partisi waktu yang seluruhnya lebih tua dari `before` yang
+        dipindah, sehingga satu partisi umumnya menjadi satu segment. Segment
+        ditulis dan di-fsync tanpa write lock; baris lalu dihapus dari tabel
+        events dan segment dicatat di `archive_segments` dalam satu
+        transaksi. Jika ada baris yang hilang di antaranya (mis. dihapus
+        retensi), segment dibuang dan pemindahan diulang di putaran
+        berikutnya. Baris payload_index tidak dihapus sehingga filter `where`
+        tetap menemukan event yang diarsipkan. Mengembalikan jumlah event
+        yang dipindah.
+        """
+        config = self.archive_config
+        if config is None:
+            raise RuntimeError("Archive tier is not configured")
+        shard = self._shard_for(topic)
+        tier = shard.archive
+        partition_ms = max(1, int(config.partition * 1000))
+        cutoff = timestamp_ms(before) // partition_ms * partition_ms
+        async with shard.pool.read() as db:
+            cursor = await db.execute(
+                "SELECT rowid, event_id, timestamp, source, payload, ts_ms, codec FROM events "
+                "WHERE topic = ? AND ts_ms < ? ORDER BY ts_ms, rowid LIMIT ?",
+                (topic, cutoff, limit),
+            )
+            found = await cursor.fetchall()
             await cursor.close()
-            return [
-                {
-                    "topic": row[0],
-                    "event_id": row[1],
-                    "timestamp": row[2],
-                    "source": row[3],
-                    "payload": json.loads(row[4])
-                }
-                for row in rows
+        if not found:
+            return 0
+        partitions = {}
+        for rowid, event_id, timestamp, source, payload, ts, codec in found:
+            text = self._codec.decode(payload, codec, shard.index) if codec else payload
+            partitions.setdefault(ts // partition_ms * partition_ms, []).append(
+                (rowid, event_id, timestamp, source, text, ts)
+            )
+
+        loop = asyncio.get_running_loop()
+        written = []
+        try:
+            for start_ms, rows in partitions.items():
+                name = tier.segment_name(topic, start_ms, min(row[0] for row in rows))
+                await loop.run_in_executor(
+                    None, write_segment, tier.path(name), topic, rows, config.block_rows, config.bloom_bits_per_key
+                )
+                written.append((name, rows))
+            segments = [Segment(tier.path(name), name) for name, _ in written]
+        except Exception:
+            tier.discard(name for name, _ in written)
+            raise
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        async with shard.pool.write() as db:
+            try:
+                moved = 0
+                for name, rows in written:
+                    cursor = await db.execute(
+                        "DELETE FROM events WHERE rowid IN (SELECT value FROM json_each(?))",
+                        (json.dumps([row[0] for row in rows]),),
+                    )
+                    moved += cursor.rowcount
+                    await cursor.close()
+                    await db.execute(
+                        "INSERT INTO archive_segments (name, topic, min_ts, max_ts, rows, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (name, topic, min(row[5] for row in rows), max(row[5] for row in rows), len(rows), created_at),
+                    )
+                if moved != len(found):
+                    await db.rollback()
+                    for segment in segments:
+                        segment.close()
+                    tier.discard(name for name, _ in written)
+                    logger.warning("Event topic %s berubah selama pengarsipan; diulang di putaran berikutnya", topic)
+                    return 0
+                await db.execute("INSERT OR REPLACE INTO stats (key, value) VALUES ('seq', ?)", (shard.seq,))
+                # Segment dipasang sebelum commit: pembaca bisa sesaat melihat baris di kedua
+                # tier (digabung per rowid di _fetch_page), tetapi tidak pernah kehilangan baris
+                for segment in segments:
+                    tier.add(segment)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                for segment in segments:
+                    if segment in tier.segments(topic):
+                        tier.remove(segment)
+                    else:
+                        segment.close()
+                tier.discard(name for name, _ in written)
+                raise
+        logger.info("Arsip: %d event topic %s dipindah ke %d segment", moved, topic, len(segments))
+        return moved
+
+    def archived_rows(self, topic: str) -> int:
+        """Jumlah event `topic` di tier arsip (dari footer segment, tanpa I/O)."""
+        tier = self._shard_for(topic).archive
+        if tier is None:
+            return 0
+        return sum(segment.count for segment in tier.segments(topic))
+
+    async def drop_archived(
+        self,
+        topic: str,
+        before: Union[str, datetime, None] = None,
+        tombstone_since: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+    ) -> int:
+        """Hapus segment arsip `topic` yang seluruh event-nya lebih tua dari `before`.
+
+        Padanan `delete_oldest` untuk tier arsip: key dengan timestamp sejak
+        `tombstone_since` disimpan sebagai tombstone. Dengan `limit`, segment
+        tertua dihapus utuh selama totalnya tidak melebihi `limit` event.
+        Satu transaksi per segment; mengembalikan jumlah event yang dihapus.
+        """
+        shard = self._shard_for(topic)
+        tier = shard.archive
+        if tier is None:
+            return 0
+        before_ms = timestamp_ms(before) if before is not None else None
+        min_ms = timestamp_ms(tombstone_since) if tombstone_since is not None else None
+        dropped = 0
+        for segment in sorted(tier.segments(topic), key=lambda s: s.max_ts):
+            if before_ms is not None and segment.max_ts >= before_ms:
+                break
+            if limit is not None and dropped + segment.count > limit:
+                break
+            tombstones = [
+                (topic, id_hash(segment.event_id(i)), segment.ts[i])
+                for i in range(segment.count) if min_ms is None or segment.ts[i] >= min_ms
             ]
-        async with aiosqlite.connect(self.db_path) as db:
-            if topic:
-                query = "SELECT * FROM events WHERE topic = ?"
-                params = (topic,)
-            else:
-                query = "SELECT * FROM events"
-                params = ()
-            cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
+            async with shard.pool.write() as db:
+                try:
+                    if tombstones:
+                        await db.executemany(
+                            "INSERT OR REPLACE INTO tombstones (topic, id_hash, ts_ms) VALUES (?, ?, ?)",
+                            tombstones,
+                        )
+                    await db.execute("DELETE FROM archive_segments WHERE name = ?", (segment.name,))
+                    await self._unindex_payloads(db, topic, segment.rowids)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+            for _, hashed, _ in tombstones:
+                shard.tombstone_bloom.add(_tombstone_key(topic, hashed))
+            shard.tombstones += len(tombstones)
+            dropped += segment.count
+            tier.remove(segment)
+        if dropped:
+            async with shard.pool.read() as db:
+                cursor = await db.execute("SELECT 1 FROM events WHERE topic = ? LIMIT 1", (topic,))
+                if await cursor.fetchone() is None and not tier.segments(topic):
+                    self._topics.discard(topic)
+                await cursor.close()
+        self._retention["deleted"] += dropped
+        return dropped
+
+    async def incremental_vacuum(self, pages: int) -> int:
+        """Kembalikan sampai `pages` halaman kosong per shard ke OS."""
+        freed = 0
+        for shard in self._shards:
+            async with shard.pool.write() as db:
+                cursor = await db.execute("PRAGMA freelist_count")
+                before = (await cursor.fetchone())[0]
+                await cursor.close()
+                if not before:
+                    continue
+                # incremental_vacuum membebaskan satu halaman per step: ambil semua baris
+                cursor = await db.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+                await cursor.fetchall()
+                await cursor.close()
+                cursor = await db.execute("PRAGMA freelist_count")
+                freed += before - (await cursor.fetchone())[0]
+                await cursor.close()
+        self._retention["vacuumed_pages"] += freed
+        return freed
+
+    async def consume(self, group: str, topic: str, limit: int = 1000, raw: bool = False) -> Tuple[List[dict], int]:
+        """Ambil sampai `limit` event `topic` setelah offset yang di-commit `group`.
+
+        Satu range scan indeks `(topic, rowid)` mulai dari offset, sehingga
+        biayanya sebanding dengan event baru. Setiap event membawa `seq`
+        (naik monoton per topic). Mengembalikan `(events, offset)`; offset
+        tidak bergeser sampai `commit_offset` dipanggil (at-least-once).
+        """
+        shard = self._shard_for(topic)
+        async with shard.pool.read() as db:
+            cursor = await db.execute(
+                "SELECT seq FROM consumer_offsets WHERE grp = ? AND topic = ?", (group, topic)
+            )
+            row = await cursor.fetchone()
             await cursor.close()
-            return [
-                {
-                    "topic": row[0],
-                    "event_id": row[1],
-                    "timestamp": row[2],
-                    "source": row[3],
-                    "payload": json.loads(row[4])
-                }
-                for row in rows
-            ]
+            offset = row[0] if row else 0
+        # Lewat _fetch_page agar consumer yang tertinggal juga membaca tier arsip
+        rows = await self._fetch_page(shard, self._query(topic, None, None, None, None), limit, offset)
+        events = []
+        for row in rows:
+            event = self._to_event(shard.index, row, raw)
+            event["seq"] = row[0]
+            events.append(event)
+        return events, offset
 
-    async def get_stats(self):
-        if self._conn:
-            db = self._conn
-            cursor = await db.execute("SELECT key, value FROM stats")
+    async def commit_offset(self, group: str, topic: str, offset: int) -> int:
+        """Majukan offset `group` untuk `topic` ke `seq` event terakhir yang diproses.
+
+        Offset tidak pernah mundur; mengembalikan offset yang berlaku.
+        """
+        shard = self._shard_for(topic)
+        if offset < 0 or offset > shard.seq:
+            raise ValueError(f"Offset {offset} is outside the sequence range of topic '{topic}'")
+        async with shard.pool.write() as db:
+            try:
+                cursor = await db.execute(
+                    """
+                    INSERT INTO consumer_offsets (grp, topic, seq, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(grp, topic) DO UPDATE SET
+                        seq = MAX(seq, excluded.seq), updated_at = excluded.updated_at
+                    RETURNING seq
+                    """,
+                    (group, topic, offset, datetime.now(timezone.utc).isoformat()),
+                )
+                committed = (await cursor.fetchone())[0]
+                await cursor.close()
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return committed
+
+    async def add_rollups(self, rows: Sequence[Tuple[int, str, str, int, int]]):
+        """Tambahkan counter `(bucket, topic, source, received, duplicates)` ke tabel rollups."""
+        if not rows:
+            return
+        async with self._shards[0].pool.write() as db:
+            try:
+                await db.executemany(
+                    """
+                    INSERT INTO rollups (bucket, topic, source, received, duplicates) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(bucket, topic, source) DO UPDATE SET
+                        received = received + excluded.received,
+                        duplicates = duplicates + excluded.duplicates
+                    """,
+                    rows,
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    async def query_rollups(
+        self,
+        start: int,
+        end: int,
+        resolution: int = 1,
+        topic: Optional[str] = None,
+        source: Optional[str] = None,
+        group_by: Sequence[str] = ("topic", "source"),
+    ) -> List[Tuple[int, Optional[str], Optional[str], int, int]]:
+        """Jumlahkan rollup menit `[start, end)` ke bucket `resolution` menit.
+
+        Hanya range scan primary key `(bucket, ...)`; tabel events tidak disentuh.
+        """
+        clauses, params = ["bucket >= ? AND bucket < ?"], [start, end]
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        dims = [
+            column if column in group_by else f"NULL AS {column}"
+            for column in ("topic", "source")
+        ]
+        keys = ", ".join(["b", *(column for column in ("topic", "source") if column in group_by)])
+        sql = (
+            f"SELECT bucket / ? * ? AS b, {', '.join(dims)}, SUM(received), SUM(duplicates) "
+            f"FROM rollups WHERE {' AND '.join(clauses)} GROUP BY {keys} ORDER BY {keys}"
+        )
+        async with self._shards[0].pool.read() as db:
+            cursor = await db.execute(sql, (resolution, resolution, *params))
             rows = await cursor.fetchall()
             await cursor.close()
-            stats = {row[0]: row[1] for row in rows}
-            # Include topics dynamically
-            events_cursor = await db.execute("SELECT DISTINCT topic FROM events")
-            topics_rows = await events_cursor.fetchall()
-            await events_cursor.close()
-            stats["topics"] = [row[0] for row in topics_rows]
-            return stats
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT key, value FROM stats")
+        return [tuple(row) for row in rows]
+
+    async def get_events(
+        self,
+        topic: str = None,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        source: Optional[str] = None,
+        topic_prefix: Optional[str] = None,
+        where: Optional[Sequence[str]] = None,
+    ):
+        return [
+            event async for event in self.iter_events(
+                topic, since=since, until=until, source=source, topic_prefix=topic_prefix, where=where
+            )
+        ]
+
+    async def get_events_page(
+        self,
+        topic: str = None,
+        limit: int = 1000,
+        after: Optional[str] = None,
+        raw: bool = False,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        source: Optional[str] = None,
+        topic_prefix: Optional[str] = None,
+        where: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Ambil satu halaman event (keyset pagination).
+
+        Tanpa filter waktu/source event diurutkan per rowid; dengan `since`
+        (inklusif), `until` (eksklusif) atau `source` event diurutkan per
+        waktu lewat indeks `(topic, ts_ms)` / `(source, ts_ms)`. `where`
+        berisi `"path:nilai"` untuk path payload yang diindeks pada `topic`
+        (semua harus cocok); path lain ditolak dengan `InvalidFilter`.
+        Mengembalikan `(events, next_cursor)`; `next_cursor` bernilai None
+        jika tidak ada halaman berikutnya.
+        """
+        query = self._query(topic, topic_prefix, source, since, until, where)
+        found = await self._scan(query, limit + 1, decode_cursor(after))
+        next_cursor = None
+        if len(found) > limit:
+            next_cursor = self._cursor_for(query, *found[limit - 1])
+        return [self._to_event(shard, row, raw) for shard, row in found[:limit]], next_cursor
+
+    async def iter_events(
+        self,
+        topic: str = None,
+        chunk_size: int = 500,
+        after: Optional[str] = None,
+        raw: bool = False,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        source: Optional[str] = None,
+        topic_prefix: Optional[str] = None,
+        where: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[dict]:
+        """Iterasi seluruh event per chunk tanpa memuat tabel ke memori."""
+        query = self._query(topic, topic_prefix, source, since, until, where)
+        position = decode_cursor(after)
+        while True:
+            found = await self._scan(query, chunk_size, position)
+            for shard, row in found:
+                yield self._to_event(shard, row, raw)
+            if len(found) < chunk_size:
+                return
+            shard, row = found[-1]
+            position = (shard, row[0], row[6] if query["by_time"] else None)
+
+    async def iter_positions(
+        self,
+        topic: str = None,
+        after: Optional[str] = None,
+        topic_prefix: Optional[str] = None,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[Tuple[int, int, dict]]:
+        """Seperti `iter_events(raw=True)` tetapi menghasilkan `(shard, rowid, event)`."""
+        query = self._query(topic, topic_prefix, None, None, None)
+        position = decode_cursor(after)
+        while True:
+            found = await self._scan(query, chunk_size, position)
+            for shard, row in found:
+                yield shard, row[0], self._to_event(shard, row, True)
+            if len(found) < chunk_size:
+                return
+            shard, row = found[-1]
+            position = (shard, row[0], None)
+
+    def _to_event(self, shard: int, row, raw: bool) -> dict:
+        # Dekompresi hanya untuk baris yang benar-benar dikembalikan
+        payload = self._codec.decode(row[5], row[7], shard) if row[7] else None
+        return _row_to_event(row, raw, payload)
+
+    def _query(self, topic, topic_prefix, source, since, until, where=None) -> dict:
+        try:
+            conditions = self._indexes.parse_where(topic, where or ())
+        except ValueError as e:
+            raise InvalidFilter(str(e)) from e
+        clauses, params = _filter_clauses(topic, topic_prefix, source, since, until, conditions)
+        return {
+            "topic": topic,
+            "clauses": clauses,
+            "params": params,
+            "where": conditions,
+            # Filter yang sama untuk segment arsip (tanpa SQL)
+            "filters": {
+                "topic": topic,
+                "topic_prefix": topic_prefix,
+                "source": source,
+                "since_ms": timestamp_ms(since) if since is not None else None,
+                "until_ms": timestamp_ms(until) if until is not None else None,
+                # Diisi _fetch_page dari payload_index bila ada filter `where`
+                "seqs": None,
+            },
+            # Filter waktu/source memakai indeks (.., ts_ms) sehingga urut per waktu
+            "by_time": since is not None or until is not None or bool(source),
+        }
+
+    @staticmethod
+    def _cursor_for(query: dict, shard: int, row) -> str:
+        return encode_cursor(row[0], shard, row[6] if query["by_time"] else None)
+
+    async def _scan(self, query: dict, limit: int, position: Tuple[int, int, Optional[int]]):
+        """Ambil sampai `limit` baris `(shard, row)` setelah `position`.
+
+        Query dengan topic hanya menyentuh satu shard. Urutan rowid membaca
+        shard berurutan mulai dari shard di cursor; urutan waktu membaca
+        semua shard lalu menggabungkannya per `(ts_ms, shard, rowid)`.
+        """
+        start_shard, after_rowid, after_ts = position
+        topic = query["topic"]
+        shards = [self._shard_for(topic)] if topic else self._shards
+        stats = {"scanned": 0}
+
+        if query["by_time"]:
+            if after_ts is None and after_rowid:
+                raise InvalidCursor("Cursor does not match time-ordered filters")
+            found = []
+            for shard in shards:
+                bound = None
+                if after_ts is not None:
+                    if shard.index < start_shard:
+                        bound = (after_ts, _MAX_ROWID)
+                    elif shard.index == start_shard:
+                        bound = (after_ts, after_rowid)
+                    else:
+                        bound = (after_ts, -1)
+                rows = await self._fetch_page(shard, query, limit, bound, stats)
+                found.extend((shard.index, row) for row in rows)
+            found.sort(key=lambda item: (item[1][6], item[0], item[1][0]))
+            READ_ROWS_SCANNED.observe(stats["scanned"])
+            READ_ROWS_RETURNED.observe(min(len(found), limit))
+            return found[:limit]
+
+        if not topic:
+            shards = shards[start_shard:]
+        found = []
+        for shard in shards:
+            if not topic and shard.index != start_shard:
+                after_rowid = 0
+            rows = await self._fetch_page(shard, query, limit - len(found), after_rowid, stats)
+            found.extend((shard.index, row) for row in rows)
+            if len(found) >= limit:
+                break
+        READ_ROWS_SCANNED.observe(stats["scanned"])
+        READ_ROWS_RETURNED.observe(len(found))
+        return found
+
+    async def _fetch_page(self, shard: _Shard, query: dict, limit: int, after, stats: Optional[dict] = None):
+        """Satu halaman dari satu shard, tabel events digabung dengan tier arsip.
+
+        `stats["scanned"]` bertambah dengan baris yang dibaca dari SQLite dan
+        baris segment arsip yang diperiksa, sebelum merge dan limit.
+        """
+        clauses, params = list(query["clauses"]), list(query["params"])
+        if query["by_time"]:
+            if after is not None:
+                clauses.append("(ts_ms, rowid) > (?, ?)")
+                params += list(after)
+            order = "ts_ms, rowid"
+        else:
+            clauses.append("rowid > ?")
+            params.append(after)
+            order = "rowid"
+        where = " AND ".join(clauses) or "1"
+        sql = f"SELECT {EVENT_COLUMNS} FROM events WHERE {where} ORDER BY {order} LIMIT ?"
+        async with shard.pool.read() as db:
+            cursor = await db.execute(sql, (*params, limit))
             rows = await cursor.fetchall()
             await cursor.close()
-            stats = {row[0]: row[1] for row in rows}
-            # Include topics dynamically
-            events_cursor = await db.execute("SELECT DISTINCT topic FROM events")
-            topics_rows = await events_cursor.fetchall()
-            await events_cursor.close()
-            stats["topics"] = [row[0] for row in topics_rows]
-            return stats
+        if stats is not None:
+            stats["scanned"] += len(rows)
+        if shard.archive is not None and shard.archive.topics():
+            filters = query["filters"]
+            if query["where"] and shard.archive.segments(query["topic"]):
+                filters = {**filters, "seqs": await self._archived_matches(shard, query)}
+            # Rowid tidak dipakai ulang, jadi baris arsip menyatu dengan urutan dan cursor yang sama
+            archived = shard.archive.fetch(filters, query["by_time"], after, limit, stats)
+            if archived:
+                key = (lambda row: (row[6], row[0])) if query["by_time"] else (lambda row: row[0])
+                merged = heapq.merge(rows, archived, key=key)
+                # Selama pemindahan berlangsung baris yang sama bisa ada di kedua tier
+                rows = list(islice((next(group) for _, group in groupby(merged, key=key)), limit))
+        return rows
+
+    async def _archived_matches(self, shard: _Shard, query: dict) -> set:
+        """Sequence event arsip yang cocok dengan semua kondisi `where` (index seek)."""
+        matches = None
+        bound = max(segment.max_rowid for segment in shard.archive.segments(query["topic"]))
+        async with shard.pool.read() as db:
+            for path, value in query["where"]:
+                cursor = await db.execute(
+                    "SELECT seq FROM payload_index WHERE topic = ? AND path = ? AND value = ? AND seq <= ?",
+                    (query["topic"], path, value, bound),
+                )
+                found = {row[0] for row in await cursor.fetchall()}
+                await cursor.close()
+                matches = found if matches is None else matches & found
+        return matches
+
+    async def get_stats(self):
+        """Statistik dari counter in-memory semua shard, tanpa query ke database."""
+        stats = dict.fromkeys(COUNTER_KEYS, 0)
+        for shard in self._shards:
+            for key in COUNTER_KEYS:
+                stats[key] += shard.counters[key]
+        stats["topics"] = sorted(self._topics)
+        stats["dedup"] = self._dedup.stats()
+        stats["retention"] = {**self._retention, "tombstones": sum(s.tombstones for s in self._shards)}
+        stats["shards"] = len(self._shards)
+        if self.archive_config is not None:
+            tiers = [shard.archive.stats() for shard in self._shards]
+            stats["archive"] = {key: sum(tier[key] for tier in tiers) for key in ("segments", "rows", "bytes")}
+        return stats
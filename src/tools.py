@@ -0,0 +1,417 @@
+"""Import/export massal NDJSON langsung ke `SQLiteEventStore`, tanpa lewat HTTP.
+
+Jalankan dari direktori yang berisi database (seperti service):
+
+    python -m src.tools import data.ndjson [lain.ndjson.gz ...] [--workers 4]
+    python -m src.tools import requests.jsonl --wrap-topic requests --wrap-source backlog --id-field request_id
+    python -m src.tools export --output dump.ndjson [--topic T] [--since ISO] [--until ISO]
+    python -m src.tools export --output dump --compress gzip --segment-events 100000
+
+Parsing dan validasi baris (import) serta kompresi segment (export) berjalan
+di beberapa proses; penulisan tetap lewat satu proses yang memanggil
+`store_events`, sehingga dedup (LRU, Bloom, UNIQUE, tombstone) dan counter
+stats sama persis dengan service. Konfigurasi store (shard, codec, dedup,
+pragma) dibaca dari env yang sama dengan service. Ringkasan dan progres
+ditulis ke stderr.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from .archive import ArchiveConfig
+from .compression import CompressionConfig
+from .dedup import DedupIndex
+from .encoding import render_event
+from .fastpath import BatchValidationError, ColumnBatch, validate_event
+from .payload_index import parse_topic_indexes
+from .rollup import RollupBuffer
+from .store import SQLiteEventStore
+
+# Baris per unit kerja yang dikirim ke proses parser
+PARSE_CHUNK_LINES = 5000
+# Event per panggilan store_events (= satu transaksi per shard)
+IMPORT_BATCH_EVENTS = 50_000
+EXPORT_SEGMENT_EVENTS = 100_000
+EXPORT_READ_CHUNK = 5000
+MAX_REPORTED_ERRORS = 100
+PROGRESS_INTERVAL = 5.0
+
+
+def store_from_env(db_path: str, synchronous: Optional[str] = None) -> SQLiteEventStore:
+    """Store dengan konfigurasi env yang sama dengan `src.main`."""
+    return SQLiteEventStore(
+        db_path,
+        dedup_index=DedupIndex(
+            bloom_bytes_per_topic=int(os.getenv("DEDUP_BLOOM_BYTES", 128 * 1024)),
+            lru_size=int(os.getenv("DEDUP_LRU_SIZE", 100_000)),
+        ),
+        read_pool_size=1,
+        shards=int(os.getenv("SQLITE_SHARDS", 1)),
+        compression=CompressionConfig(
+            default=os.getenv("PAYLOAD_CODEC", "none"),
+            topics=json.loads(os.getenv("PAYLOAD_CODEC_TOPICS", "{}")),
+            min_size=int(os.getenv("PAYLOAD_COMPRESS_MIN_SIZE", 64)),
+            dict_samples=int(os.getenv("PAYLOAD_DICT_SAMPLES", 1000)),
+        ),
+        pragmas={
+            "synchronous": synchronous or os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -65536)),
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 268435456)),
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+        },
+        # Tanpa max_age: tier arsip hanya dibaca (export) dan dipakai untuk dedup (import)
+        archive=ArchiveConfig(directory=os.environ["ARCHIVE_DIR"]) if os.getenv("ARCHIVE_DIR") else None,
+        # Path yang tidak dideklarasikan dihapus dari indeks saat store dibuka
+        payload_indexes=parse_topic_indexes(os.getenv("PAYLOAD_INDEXES", "")),
+    )
+
+
+class Progress:
+    """Laporan baris/detik berkala ke stderr."""
+
+    def __init__(self, label: str, interval: float = PROGRESS_INTERVAL, out=None):
+        self.label = label
+        self.interval = interval
+        self.out = out or sys.stderr
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def rate(self, rows: int) -> float:
+        return rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def tick(self, rows: int):
+        now = time.perf_counter()
+        if self.interval and now - self._last >= self.interval:
+            self._last = now
+            print(f"{self.label}: {rows:,} baris, {self.rate(rows):,.0f} baris/detik", file=self.out)
+
+    def done(self, counts: dict, rows: int) -> dict:
+        seconds = time.perf_counter() - self.started
+        summary = {**counts, "seconds": round(seconds, 3), "rows_per_sec": round(rows / max(seconds, 1e-9), 1)}
+        print(f"{self.label} selesai: {json.dumps(summary)}", file=self.out)
+        return summary
+
+
+# --- import -----------------------------------------------------------------
+
+def _open_input(path: str):
+    if path == "-":
+        return nullcontext(sys.stdin.buffer)
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _read_chunks(paths: Sequence[str], chunk_lines: int) -> Iterator[Tuple[str, int, List[bytes]]]:
+    """Baca file input menjadi `(path, nomor_baris_pertama, baris)` per chunk."""
+    for path in paths:
+        with _open_input(path) as f:
+            lines, first = [], 1
+            for line_no, line in enumerate(f, start=1):
+                lines.append(line)
+                if len(lines) >= chunk_lines:
+                    yield path, first, lines
+                    lines, first = [], line_no + 1
+            if lines:
+                yield path, first, lines
+
+
+def _wrap(item, line: bytes, wrap: dict) -> dict:
+    """Jadikan record JSON sembarang payload event `wrap["topic"]`/`wrap["source"]`.
+
+    `event_id` diambil dari field `wrap["id_field"]` bila ada, selain itu
+    hash isi baris, sehingga import ulang file yang sama terdeteksi duplikat.
+    """
+    id_field = wrap.get("id_field")
+    if isinstance(item, dict) and id_field and item.get(id_field) is not None:
+        event_id = str(item[id_field])
+    else:
+        event_id = hashlib.sha1(line.strip()).hexdigest()
+    return {"topic": wrap["topic"], "source": wrap["source"], "event_id": event_id, "payload": item}
+
+
+def _parse_chunk(path: str, first: int, lines: List[bytes], wrap: Optional[dict]) -> Tuple[ColumnBatch, int, int, List[dict]]:
+    """Validasi satu chunk di proses parser: `(batch, baris, ditolak, error)`."""
+    batch = ColumnBatch()
+    cache = {}
+    seen = rejected = 0
+    errors = []
+    for line_no, line in enumerate(lines, start=first):
+        if not line.strip():
+            continue
+        seen += 1
+        try:
+            item = json.loads(line)
+            if wrap is not None:
+                item = _wrap(item, line, wrap)
+            batch.extend(validate_event(item, (line_no,), cache))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"file": path, "line": line_no, "msg": f"Invalid JSON: {e}"})
+        except BatchValidationError as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.extend({"file": path, "line": line_no, **err} for err in e.errors)
+    return batch, seen, rejected, errors
+
+
+def _executor(workers: int) -> Optional[ProcessPoolExecutor]:
+    # spawn: proses induk sudah punya thread (aiosqlite, log listener), fork tidak aman
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+async def import_files(
+    store: SQLiteEventStore,
+    paths: Sequence[str],
+    workers: int = 0,
+    chunk_lines: int = PARSE_CHUNK_LINES,
+    batch_events: int = IMPORT_BATCH_EVENTS,
+    wrap: Optional[dict] = None,
+    defer_indexes: bool = True,
+    progress: Optional[Progress] = None,
+) -> dict:
+    """Stream file NDJSON ke store; `workers=0` mem-parse di proses ini.
+
+    Urutan event dipertahankan (hasil parser dikonsumsi sesuai urutan
+    submit), sehingga event pertama untuk `(topic, event_id)` yang menang,
+    sama seperti service.
+    """
+    progress = progress or Progress("Import")
+    counts = {"lines": 0, "accepted": 0, "duplicates": 0, "rejected": 0}
+    errors = []
+    rollups = RollupBuffer()
+    store.add_ingest_listener(rollups.record)
+    loop = asyncio.get_running_loop()
+    batch = ColumnBatch()
+
+    async def flush():
+        nonlocal batch
+        if batch:
+            results = await store.store_events(batch)
+            stored = sum(results)
+            counts["accepted"] += stored
+            counts["duplicates"] += len(results) - stored
+            batch = ColumnBatch()
+
+    def collect(parsed):
+        chunk, seen, rejected, chunk_errors = parsed
+        batch.extend(chunk)
+        counts["lines"] += seen
+        counts["rejected"] += rejected
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    if defer_indexes:
+        await store.drop_secondary_indexes()
+    executor = _executor(workers)
+    try:
+        pending = deque()
+        for path, first, lines in _read_chunks(paths, chunk_lines):
+            if executor is None:
+                collect(_parse_chunk(path, first, lines, wrap))
+            else:
+                pending.append(loop.run_in_executor(executor, _parse_chunk, path, first, lines, wrap))
+                # Batasi chunk yang sedang di-parse agar memori tetap terbatas
+                while len(pending) > workers * 2:
+                    collect(await pending.popleft())
+            if len(batch) >= batch_events:
+                await flush()
+                progress.tick(counts["lines"])
+        while pending:
+            collect(await pending.popleft())
+            if len(batch) >= batch_events:
+                await flush()
+                progress.tick(counts["lines"])
+        await flush()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if defer_indexes:
+            await store.rebuild_secondary_indexes()
+        await store.add_rollups(rollups.drain())
+        await store.flush_stats()
+    for error in errors:
+        print(f"Ditolak: {json.dumps(error, default=str)}", file=progress.out)
+    return progress.done(counts, counts["lines"])
+
+
+# --- export -----------------------------------------------------------------
+
+def _write_segment(path: str, data: bytes, compress: str) -> int:
+    """Tulis satu segment (dikompresi di proses worker); kembalikan ukurannya."""
+    if compress == "gzip":
+        data = gzip.compress(data, compresslevel=6)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def segment_path(prefix: str, index: int, compress: str) -> str:
+    return f"{prefix}-{index:05d}.ndjson" + (".gz" if compress == "gzip" else "")
+
+
+async def export_events(
+    store: SQLiteEventStore,
+    output: str,
+    topic: Optional[str] = None,
+    topic_prefix: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    compress: str = "none",
+    segment_events: int = 0,
+    workers: int = 0,
+    progress: Optional[Progress] = None,
+) -> dict:
+    """Tulis slice event ke NDJSON (format yang sama dengan input import).
+
+    Dengan `segment_events` atau `compress="gzip"` output dipecah menjadi
+    segment `<output>-00000.ndjson[.gz]` yang masing-masing bisa di-import
+    sendiri; kompresi segment berjalan paralel di proses worker.
+    """
+    progress = progress or Progress("Export")
+    counts = {"events": 0, "segments": 0, "bytes": 0}
+    events = store.iter_events(
+        topic, chunk_size=EXPORT_READ_CHUNK, raw=True,
+        since=since, until=until, source=source, topic_prefix=topic_prefix,
+    )
+
+    if not segment_events and compress == "none":
+        with nullcontext(sys.stdout) if output == "-" else open(output, "w", encoding="utf-8") as f:
+            async for event in events:
+                line = render_event(event) + "\n"
+                f.write(line)
+                counts["events"] += 1
+                counts["bytes"] += len(line)
+                progress.tick(counts["events"])
+        counts["segments"] = 1
+        return progress.done(counts, counts["events"])
+
+    if output == "-":
+        raise ValueError("Output segment harus berupa prefix path, bukan stdout")
+    segment_events = segment_events or EXPORT_SEGMENT_EVENTS
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    loop = asyncio.get_running_loop()
+    executor = _executor(workers)
+    pending = deque()
+
+    async def write(lines: List[str]):
+        path = segment_path(output, counts["segments"], compress)
+        counts["segments"] += 1
+        data = "".join(lines).encode()
+        if executor is None:
+            counts["bytes"] += _write_segment(path, data, compress)
+            return
+        pending.append(loop.run_in_executor(executor, _write_segment, path, data, compress))
+        while len(pending) > workers * 2:
+            counts["bytes"] += await pending.popleft()
+
+    try:
+        lines = []
+        async for event in events:
+            lines.append(render_event(event) + "\n")
+            counts["events"] += 1
+            if len(lines) >= segment_events:
+                await write(lines)
+                lines = []
+                progress.tick(counts["events"])
+        if lines:
+            await write(lines)
+        while pending:
+            counts["bytes"] += await pending.popleft()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return progress.done(counts, counts["events"])
+
+
+# --- CLI --------------------------------------------------------------------
+
+async def _run(args) -> dict:
+    store = store_from_env(args.db, synchronous=getattr(args, "synchronous", None))
+    await store.initialize()
+    try:
+        if args.command == "import":
+            wrap = None
+            if args.wrap_topic or args.wrap_source:
+                if not (args.wrap_topic and args.wrap_source):
+                    raise SystemExit("--wrap-topic dan --wrap-source harus dipakai bersama")
+                wrap = {"topic": args.wrap_topic, "source": args.wrap_source, "id_field": args.id_field}
+            return await import_files(
+                store, args.files,
+                workers=args.workers,
+                chunk_lines=args.chunk_lines,
+                batch_events=args.batch_events,
+                wrap=wrap,
+                defer_indexes=not args.keep_indexes,
+                progress=Progress("Import", args.progress_interval),
+            )
+        return await export_events(
+            store, args.output,
+            topic=args.topic,
+            topic_prefix=args.topic_prefix,
+            source=args.source,
+            since=args.since,
+            until=args.until,
+            compress=args.compress,
+            segment_events=args.segment_events,
+            workers=args.workers,
+            progress=Progress("Export", args.progress_interval),
+        )
+    finally:
+        await store.close()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="events.db", help="path database (default: events.db)")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imp = commands.add_parser("import", help="import file NDJSON (boleh .gz, '-' untuk stdin)")
+    imp.add_argument("files", nargs="+")
+    imp.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="proses parser (0 = tanpa proses)")
+    imp.add_argument("--chunk-lines", type=int, default=PARSE_CHUNK_LINES)
+    imp.add_argument("--batch-events", type=int, default=IMPORT_BATCH_EVENTS, help="event per transaksi")
+    imp.add_argument("--keep-indexes", action="store_true",
+                     help="jangan drop indeks sekunder selama import (mis. service sedang membaca)")
+    imp.add_argument("--synchronous", default=None,
+                     help="PRAGMA synchronous selama import (default SQLITE_SYNCHRONOUS/NORMAL); "
+                          "OFF lebih cepat tetapi crash atau mati listrik bisa merusak seluruh database")
+    imp.add_argument("--wrap-topic", help="bungkus setiap record sebagai payload event topic ini")
+    imp.add_argument("--wrap-source", help="source untuk record yang dibungkus")
+    imp.add_argument("--id-field", help="field record yang dipakai sebagai event_id saat membungkus")
+
+    exp = commands.add_parser("export", help="export slice event ke NDJSON atau segment terkompresi")
+    exp.add_argument("--output", default="-", help="file output, '-' untuk stdout, atau prefix segment")
+    exp.add_argument("--topic")
+    exp.add_argument("--topic-prefix")
+    exp.add_argument("--source")
+    exp.add_argument("--since", help="ISO8601, inklusif")
+    exp.add_argument("--until", help="ISO8601, eksklusif")
+    exp.add_argument("--compress", choices=["none", "gzip"], default="none")
+    exp.add_argument("--segment-events", type=int, default=0, help="event per segment (0 = satu file)")
+    exp.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="proses kompresi segment")
+
+    args = parser.parse_args(argv)
+    # Log per batch/duplikat dari store tidak berguna untuk jutaan baris; ERROR tetap tampil
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logging.disable(logging.WARNING)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
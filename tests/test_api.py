@@ -1,13 +1,16 @@
 import pytest
 import asyncio
+import gzip
+import json
 from datetime import datetime, UTC
 from fastapi.testclient import TestClient
 from src.main import app, event_service
 
 @pytest.fixture(scope="module")
 def client():
-    """Membuat TestClient untuk API FastAPI"""
-    return TestClient(app)
+    """Membuat TestClient untuk API FastAPI (lifespan ikut dijalankan)"""
+    with TestClient(app) as c:
+        yield c
 
 @pytest.fixture(scope="module", autouse=True)
 def event_loop():
@@ -132,3 +135,242 @@ def test_performance(client):
     assert response.status_code == 200
     processing_time = (end_time - start_time).total_seconds()
     assert processing_time < 5.0, f"Processing too slow: {processing_time}s"
+
+
+def test_events_cursor_pagination(client):
+    events = {
+        "events": [
+            {
+                "topic": "test.page",
+                "event_id": f"page-{i}",
+                "timestamp": datetime.now(UTC).isoformat(),
+                "source": "test",
+                "payload": {"index": i}
+            } for i in range(7)
+        ]
+    }
+    assert client.post("/publish", json=events).status_code == 200
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"topic": "test.page", "limit": 3}
+        if cursor:
+            params["after"] = cursor
+        body = client.get("/events", params=params).json()
+        seen.extend(e["event_id"] for e in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(f"page-{i}" for i in range(7))
+    assert len(seen) == len(set(seen))
+
+    assert client.get("/events", params={"after": "!!not-a-cursor"}).status_code == 400
+
+
+def test_events_ndjson_stream(client):
+    response = client.get("/events", params={"topic": "test.page", "format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) >= 7
+    assert all(e["topic"] == "test.page" for e in lines)
+
+    limited = client.get("/events", params={"topic": "test.page", "format": "ndjson", "limit": 2})
+    assert len(limited.text.splitlines()) == 2
+
+
+def test_events_time_and_source_filters(client):
+    events = {
+        "events": [
+            {
+                "topic": "test.window",
+                "event_id": f"window-{i}",
+                "timestamp": f"2020-05-01T00:00:0{i}Z",
+                "source": "sensor-a" if i % 2 else "sensor-b",
+                "payload": {"index": i}
+            } for i in range(6)
+        ]
+    }
+    assert client.post("/publish", json=events).status_code == 200
+
+    body = client.get("/events", params={
+        "topic": "test.window", "source": "sensor-a",
+        "since": "2020-05-01T00:00:02Z", "until": "2020-05-01T00:00:06Z",
+    }).json()
+    assert [e["event_id"] for e in body["data"]] == ["window-3", "window-5"]
+
+    empty = client.get("/events", params={"topic": "test.window", "since": "2030-01-01T00:00:00Z"})
+    assert empty.status_code == 200 and empty.json()["data"] == []
+
+    prefixed = client.get("/events", params={"topic_prefix": "test.win", "format": "ndjson"})
+    assert len(prefixed.text.splitlines()) == 6
+
+    # Path payload yang tidak ada di PAYLOAD_INDEXES ditolak, bukan di-scan
+    for format in ("json", "ndjson"):
+        unindexed = client.get("/events", params={"topic": "test.window", "where": "index:3", "format": format})
+        assert unindexed.status_code == 400
+
+
+def test_events_payload_roundtrip(client):
+    payload = {"nested": {"list": [1, 2.5, None, True]}, "text": "héllo \"quoted\""}
+    event = {
+        "events": [{
+            "topic": "test.raw",
+            "event_id": "raw-1",
+            "timestamp": datetime.now(UTC).isoformat(),
+            "source": "test",
+            "payload": payload
+        }]
+    }
+    assert client.post("/publish", json=event).status_code == 200
+
+    body = client.get("/events", params={"topic": "test.raw"}).json()
+    assert body["data"][0]["payload"] == payload
+
+
+def test_publish_fast_mode(client):
+    batch = {
+        "events": [
+            {
+                "topic": "test.fast",
+                "event_id": f"fast-{i % 3}",
+                "timestamp": datetime.now(UTC).isoformat(),
+                "source": "test",
+                "payload": {"index": i}
+            } for i in range(5)
+        ]
+    }
+    response = client.post("/publish/fast", json=batch)
+    assert response.status_code == 200
+    assert response.json()["processed_count"] + response.json()["duplicate_dropped"] == 5
+
+    invalid = client.post("/publish/fast", json={"events": [{"topic": "", "source": "s", "payload": {}}]})
+    assert invalid.status_code == 422
+    assert invalid.json()["detail"][0]["loc"] == ["body", "events", 0, "topic"]
+
+
+def test_publish_ndjson_stream(client):
+    lines = [
+        json.dumps({
+            "topic": "test.stream",
+            "event_id": f"stream-{i % 4}",
+            "timestamp": datetime.now(UTC).isoformat(),
+            "source": "test",
+            "payload": {"index": i}
+        }) for i in range(6)
+    ]
+    lines.insert(2, "{not json")
+    lines.insert(4, json.dumps({"topic": "test.stream", "payload": {}}))
+    body = ("\n".join(lines) + "\n\n").encode()
+
+    response = client.post("/publish/stream", content=gzip.compress(body), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["lines"] == 8
+    assert data["rejected"] == 2
+    assert data["accepted"] + data["duplicates"] == 6
+    assert data["duplicates"] >= 2
+    assert {e["line"] for e in data["errors"]} == {3, 5}
+
+
+def test_subscribe_rejects_bad_cursor(client):
+    """
+    Test bahwa /subscribe menolak cursor resume yang tidak valid.
+    """
+    response = client.get("/subscribe", params={"topic": "test.#", "after": "!!"})
+    assert response.status_code == 400
+    response = client.get("/subscribe", params={"topic": "test.#", "policy": "block"})
+    assert response.status_code == 422
+
+
+def test_consume_and_commit_offsets(client):
+    """
+    Test bahwa /consume melanjutkan dari offset yang di-commit dan offset
+    tidak bergeser tanpa /commit.
+    """
+    group = f"group-{datetime.now(UTC).timestamp()}"
+    events = [
+        {"topic": "test.consume", "event_id": f"{group}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(5)
+    ]
+    assert client.post("/publish", json={"events": events}).status_code == 200
+
+    first = client.get("/consume", params={"group": group, "topic": "test.consume", "max": 1000}).json()
+    mine = [e for e in first["data"] if e["event_id"].startswith(group)]
+    assert [e["payload"]["i"] for e in mine] == list(range(5))
+    seqs = [e["seq"] for e in first["data"]]
+    assert seqs == sorted(seqs)
+
+    # Tanpa commit, halaman yang sama dikirim ulang
+    again = client.get("/consume", params={"group": group, "topic": "test.consume", "max": 2}).json()
+    assert [e["seq"] for e in again["data"]] == seqs[:2]
+
+    response = client.post("/commit", json={"group": group, "topic": "test.consume", "offset": seqs[-2]})
+    assert response.json()["offset"] == seqs[-2]
+    after = client.get("/consume", params={"group": group, "topic": "test.consume"}).json()
+    assert after["offset"] == seqs[-2]
+    assert [e["seq"] for e in after["data"]] == seqs[-1:]
+
+    # Offset tidak mundur, dan offset di luar sequence ditolak
+    assert client.post("/commit", json={"group": group, "topic": "test.consume", "offset": 0}).json()["offset"] == seqs[-2]
+    assert client.post("/commit", json={"group": group, "topic": "test.consume", "offset": 10**12}).status_code == 400
+
+
+def test_stats_timeseries_rollups(client):
+    """
+    Test bahwa /stats/timeseries menghitung event dan duplikat per topic
+    dan source dari rollup, juga setelah downsampling ke jam.
+    """
+    source = f"rollup-{datetime.now(UTC).timestamp()}"
+    events = [
+        {"topic": "test.rollup", "event_id": f"{source}-{i % 3}", "source": source, "payload": {"i": i}}
+        for i in range(5)
+    ]
+    assert client.post("/publish", json={"events": events}).status_code == 200
+
+    minute = client.get("/stats/timeseries", params={"source": source}).json()["data"]
+    assert sum(p["received"] for p in minute) == 5
+    assert sum(p["duplicates"] for p in minute) == 2
+    assert {p["topic"] for p in minute} == {"test.rollup"}
+
+    hourly = client.get("/stats/timeseries", params={"resolution": "hour", "source": source, "group_by": ""}).json()
+    assert sum(p["unique"] for p in hourly["data"]) == 3
+    assert "topic" not in hourly["data"][0]
+    assert client.get("/stats/timeseries", params={"group_by": "payload"}).status_code == 400
+
+
+def test_metrics_endpoint(client):
+    """
+    Test bahwa /metrics menampilkan histogram jalur publish dalam format Prometheus.
+    """
+    events = [{"topic": "test.metrics", "source": "test", "payload": {"i": i}} for i in range(3)]
+    assert client.post("/publish/fast", json={"events": events}).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'event_publish_seconds_count{path="/publish/fast"}' in response.text
+    assert "# TYPE event_commit_seconds histogram" in response.text
+    assert "event_batch_validation_seconds_count" in response.text
+    assert "event_queue_depth 0" in response.text
+
+
+def test_events_and_stats_etag(client):
+    """
+    Test bahwa polling /events dan /stats dengan If-None-Match dijawab 304
+    sampai ada event baru untuk topic tersebut.
+    """
+    topic = f"test.etag{datetime.now(UTC).timestamp()}"
+    event = {"topic": topic, "source": "test", "payload": {}}
+    assert client.post("/publish", json={"events": [event]}).status_code == 200
+
+    first = client.get("/events", params={"topic": topic})
+    etag = first.headers["etag"]
+    assert client.get("/events", params={"topic": topic}, headers={"If-None-Match": etag}).status_code == 304
+    stats_etag = client.get("/stats").headers["etag"]
+    assert client.get("/stats", headers={"If-None-Match": stats_etag}).status_code == 304
+
+    assert client.post("/publish", json={"events": [event]}).status_code == 200
+    refreshed = client.get("/events", params={"topic": topic}, headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.json()["count"] == 2
+    assert client.get("/stats", headers={"If-None-Match": stats_etag}).status_code == 200
@@ -0,0 +1,203 @@
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.archive import ArchiveConfig, ArchiveTier, Segment, write_segment
+from src.fastpath import validate_batch
+from src.models import Event
+from src.retention import RetentionConfig, RetentionPolicy
+from src.service import EventService
+from src.store import SQLiteEventStore
+
+DAY = timedelta(days=1)
+
+
+def make_batch(topic, prefix, n, start, source="test"):
+    return validate_batch({"events": [
+        {
+            "topic": topic, "event_id": f"{prefix}-{i}", "source": source if i % 3 else "other",
+            "timestamp": (start + timedelta(minutes=i)).isoformat(), "payload": {"i": i, "pad": "x" * 40},
+        }
+        for i in range(n)
+    ]})
+
+
+async def all_events(store, **filters):
+    return [(ev["event_id"], ev["payload"]) async for ev in store.iter_events(chunk_size=7, **filters)]
+
+
+async def paged(store, limit=9, **filters):
+    found, cursor = [], None
+    while True:
+        page, cursor = await store.get_events_page(limit=limit, after=cursor, raw=True, **filters)
+        found += [ev["event_id"] for ev in page]
+        if cursor is None:
+            return found
+
+
+def test_segment_roundtrip(tmp_path):
+    """
+    Test bahwa segment kolumnar bisa dibaca kembali lewat mmap: baris urut
+    waktu, filter source/rentang waktu, dan filter key dedup.
+    """
+    rows = [(100 + i, f"e-{i}", f"ts-{i}", "a" if i % 2 else "b", f'{{"i":{i}}}', 1000 - i) for i in range(600)]
+    path = str(tmp_path / "t" / "0-100.seg")
+    size = write_segment(path, "orders", rows, block_rows=64)
+    segment = Segment(path)
+    assert (segment.count, segment.bytes, segment.topic) == (600, size, "orders")
+    assert (segment.min_ts, segment.max_ts, segment.min_rowid, segment.max_rowid) == (401, 1000, 100, 699)
+    assert segment.row(0) == (699, "orders", "e-599", "ts-599", "a", '{"i":599}', 401, 0)
+
+    filters = {"topic": "orders", "topic_prefix": None, "source": "b", "since_ms": 500, "until_ms": 510}
+    assert [segment.ts[i] for i in segment.select(filters, True, None, 100)] == [500, 502, 504, 506, 508]
+    stats = {"scanned": 0}
+    assert [segment.rowids[i] for i in segment.select(filters, False, 595, 2, stats)] == [596, 598]
+    assert [segment.ts[i] for i in segment.select(filters, True, None, 2, stats)] == [500, 502]
+    # Yang dihitung adalah baris yang diperiksa, bukan yang cocok: 596..598 lalu 500, 501, 502
+    assert stats["scanned"] == 6
+    # Paginasi urut rowid (berlawanan dengan urutan waktu) lewat permutasi rowid
+    everything = {**filters, "source": None, "since_ms": None, "until_ms": None}
+    paged, after = [], 0
+    while page := segment.select(everything, False, after, 64):
+        paged += [segment.rowids[i] for i in page]
+        after = paged[-1]
+    assert paged == list(range(100, 700))
+    assert segment.contains("e-17") and not segment.contains("e-600")
+    # Key dedup dicari lewat kolom hash di mmap, bukan set event_id di memori
+    assert all(isinstance(column, memoryview) for column in segment.key_hashes())
+    assert all(segment.contains(f"e-{i}") for i in range(0, 600, 37))
+    segment.close()
+
+
+def test_tier_key_filter_skips_segments(tmp_path, monkeypatch):
+    """
+    Test bahwa cek dedup tier memakai satu filter key per topic: key baru
+    hampir tidak pernah memeriksa segment, walau jumlah segment bertambah.
+    """
+    tier = ArchiveTier(str(tmp_path / "tier"))
+    for n in range(30):
+        rows = [(n * 100 + i, f"k-{n}-{i}", "ts", "a", "{}", n * 100 + i) for i in range(100)]
+        name = tier.segment_name("orders", n, n * 100)
+        write_segment(tier.path(name), "orders", rows)
+        tier.add(Segment(tier.path(name), name))
+    checked = []
+    original = Segment.contains
+    monkeypatch.setattr(Segment, "contains", lambda self, *args: checked.append(self) or original(self, *args))
+
+    assert all(tier.contains("orders", f"k-{n}-7") for n in range(30))
+    checked.clear()
+    assert not any(tier.contains("orders", f"new-{i}") for i in range(1000))
+    assert len(checked) < 300
+    tier.remove(tier.segments("orders")[0])
+    assert not tier.contains("orders", "k-0-7") and tier.contains("orders", "k-1-7")
+    tier.close()
+
+
+@pytest.mark.asyncio
+async def test_archive_merges_with_hot_tier_and_keeps_dedup(tmp_path):
+    """
+    Test bahwa event lama dipindah ke segment arsip, pembacaan (urut rowid
+    maupun waktu, dengan cursor) tetap mengembalikan hasil yang sama seperti
+    sebelum dipindah, redelivery key yang diarsipkan ditolak sebagai
+    duplikat (juga oleh `is_duplicate`), dan semuanya bertahan setelah restart.
+    """
+    now = datetime.now(timezone.utc)
+    config = ArchiveConfig(directory=str(tmp_path / "archive"), max_age=2 * 24 * 3600, segment_rows=50)
+    store = SQLiteEventStore(str(tmp_path / "archive.db"), archive=config)
+    await store.initialize()
+    await store.store_events(make_batch("orders", "old", 80, now - 5 * DAY))
+    await store.store_events(make_batch("orders", "new", 20, now - timedelta(hours=1)))
+    await store.store_events(make_batch("audit", "old", 10, now - 6 * DAY))
+
+    since = (now - 5 * DAY + timedelta(minutes=30)).isoformat()
+    queries = [{}, {"topic": "orders"}, {"topic": "orders", "source": "other"}, {"since": since}]
+    before = [await all_events(store, **q) for q in queries]
+    pages_before = await paged(store, topic="orders", since=since)
+
+    service = EventService(store)
+    result = await service.run_archive()
+    assert result["archived"] == 90
+    assert await store.count_events("orders") == 20
+    assert [await all_events(store, **q) for q in queries] == before
+    assert await paged(store, topic="orders", since=since) == pages_before
+    events, _ = await store.consume("g", "orders", limit=3)
+    assert [ev["event_id"] for ev in events] == ["old-0", "old-1", "old-2"]
+
+    archived = Event(topic="orders", event_id="old-3", source="test", payload={})
+    assert await store.is_duplicate(archived) is True
+    results = await store.store_events(make_batch("orders", "old", 2, now - 5 * DAY))
+    assert results == [False, False]
+    stats = await store.get_stats()
+    assert stats["archive"]["segments"] >= 2 and stats["archive"]["rows"] == 90
+    await store.close()
+
+    # Restart: katalog segment dibaca ulang, file yatim dibuang, sequence tidak dipakai ulang
+    orphan = tmp_path / "archive" / "shard0" / "orders" / "0-1.seg"
+    orphan.write_bytes(b"partial")
+    store = SQLiteEventStore(str(tmp_path / "archive.db"), archive=config)
+    await store.initialize()
+    assert not orphan.exists()
+    assert await store.is_duplicate(archived) is True
+    assert [await all_events(store, **q) for q in queries] == before
+    assert await store.store_events(make_batch("audit", "old", 1, now - 6 * DAY)) == [False]
+    assert await store.store_events(make_batch("audit", "fresh", 1, now)) == [True]
+    page, _ = await store.get_events_page("audit", limit=20)
+    assert page[-1]["event_id"] == "fresh-0" and len(page) == 11
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_retention_drops_expired_segments_with_tombstones(tmp_path):
+    """
+    Test bahwa retensi umur menghapus segment arsip yang seluruhnya
+    kedaluwarsa dan key-nya tetap ditolak lewat tombstone.
+    """
+    now = datetime.now(timezone.utc)
+    config = ArchiveConfig(directory=str(tmp_path / "archive"), max_age=24 * 3600)
+    store = SQLiteEventStore(str(tmp_path / "drop.db"), archive=config)
+    await store.initialize()
+    await store.store_events(make_batch("orders", "old", 10, now - 10 * DAY))
+    await store.store_events(make_batch("orders", "mid", 10, now - 3 * DAY))
+    service = EventService(store, retention=RetentionConfig(
+        default=RetentionPolicy(max_age=5 * 24 * 3600), dedup_window=None,
+    ))
+    assert (await service.run_archive())["archived"] == 20
+
+    result = await service.run_retention()
+    assert result["deleted"] == 10
+    assert [ev_id for ev_id, _ in await all_events(store)] == [f"mid-{i}" for i in range(10)]
+    assert len(os.listdir(tmp_path / "archive" / "shard0" / "orders")) == 1
+    assert await store.store_events(make_batch("orders", "old", 1, now - 10 * DAY)) == [False]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_retention_max_rows_counts_archived_segments(tmp_path):
+    """
+    Test bahwa `max_rows` menghitung event di tier arsip, membuang segment
+    tertua secara utuh lebih dulu, dan baru menghapus event hot setelah
+    tidak ada segment tersisa.
+    """
+    now = datetime.now(timezone.utc)
+    config = ArchiveConfig(directory=str(tmp_path / "archive"), max_age=2 * 24 * 3600, segment_rows=30)
+    store = SQLiteEventStore(str(tmp_path / "cap.db"), archive=config)
+    await store.initialize()
+    await store.store_events(make_batch("orders", "old", 80, now - 5 * DAY))
+    await store.store_events(make_batch("orders", "new", 20, now - timedelta(hours=1)))
+    service = EventService(store, retention=RetentionConfig(
+        topics={"orders": RetentionPolicy(max_rows=50)}, dedup_window=None,
+    ))
+    assert (await service.run_archive())["archived"] == 80
+    newest = [ev_id for ev_id, _ in await all_events(store, topic="orders")]
+
+    await service.run_retention()
+    kept = [ev_id for ev_id, _ in await all_events(store, topic="orders")]
+    assert await store.count_events("orders") == 20
+    assert 50 <= len(kept) < 50 + 30 and kept == newest[-len(kept):]
+    assert len(kept) == await store.count_events("orders") + store.archived_rows("orders")
+
+    service.retention.topics["orders"] = RetentionPolicy(max_rows=15)
+    await service.run_retention()
+    assert store.archived_rows("orders") == 0
+    assert [ev_id for ev_id, _ in await all_events(store, topic="orders")] == newest[-15:]
+    assert await store.store_events(make_batch("orders", "old", 1, now - 5 * DAY)) == [False]
+    await store.close()
@@ -0,0 +1,65 @@
+import pytest
+import asyncio
+from datetime import datetime, UTC
+from src.store import SQLiteEventStore
+from src.models import Event
+
+
+def make_event(topic, event_id, **payload):
+    return Event(
+        topic=topic,
+        event_id=event_id,
+        timestamp=datetime.now(UTC),
+        source="test",
+        payload=payload or {"id": event_id},
+    )
+
+
+@pytest.mark.asyncio
+async def test_store_events_single_transaction():
+    """
+    Test bahwa store_events menandai duplikat (termasuk di dalam batch)
+    dan memperbarui statistik sekali per batch.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+
+    await store.store_event(make_event("test.batch", "b-0"))
+    batch = [make_event("test.batch", f"b-{i}") for i in range(400)]
+    batch.append(make_event("test.batch", "b-1"))
+
+    results = await store.store_events(batch)
+    assert len(results) == 401
+    assert results[0] is False  # sudah tersimpan sebelumnya
+    assert all(results[1:400])
+    assert results[400] is False  # duplikat di dalam batch
+
+    stats = await store.get_stats()
+    assert stats["received"] == 402
+    assert stats["unique_processed"] == 400
+    assert stats["duplicate_dropped"] == 2
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_group_commit_merges_concurrent_batches():
+    """
+    Test bahwa batch yang dikirim bersamaan digabung ke dalam satu commit
+    dan setiap pemanggil menerima hasil miliknya sendiri.
+    """
+    store = SQLiteEventStore(":memory:", commit_max_delay=0.05)
+    await store.initialize()
+
+    batches = [
+        [make_event("test.group", f"g-{n}-{i}") for i in range(10)]
+        for n in range(5)
+    ]
+    batches.append([make_event("test.group", "g-0-0")])
+
+    results = await asyncio.gather(*(store.submit_events(b) for b in batches))
+    assert [len(r) for r in results] == [10, 10, 10, 10, 10, 1]
+    assert all(all(r) for r in results[:5])
+    assert results[5] == [False]
+    assert store._shards[0].committer.commits == 1
+
+    await store.close()
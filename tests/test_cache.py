@@ -0,0 +1,79 @@
+import pytest
+from src.cache import ResponseCache, etag_matches, stats_etag
+from src.fastpath import validate_batch
+from src.service import EventService
+from src.store import SQLiteEventStore
+
+
+def make_batch(topic, prefix, n):
+    return validate_batch({"events": [
+        {"topic": topic, "event_id": f"{prefix}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(n)
+    ]})
+
+
+def test_cache_lru_bounded_by_bytes():
+    """
+    Test bahwa cache membuang entri yang paling lama tidak dipakai saat
+    total byte melewati batas, dan entri generasi lama tidak dipakai.
+    """
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", 0, "xxxx", 1)
+    cache.put("b", 0, "yyyy", 1)
+    assert cache.get("a", 0).body == "xxxx"
+    cache.put("c", 0, "zzzz", 1)
+    assert cache.get("b", 0) is None
+    assert cache.stats()["bytes"] == 8
+    assert cache.get("a", 1) is None
+    cache.put("big", 0, "x" * 11, 1)
+    assert cache.get("big", 0) is None
+    assert etag_matches('W/"abc", "def"', '"abc"') and etag_matches("*", '"x"')
+    assert not etag_matches(None, '"x"')
+
+
+@pytest.mark.asyncio
+async def test_stats_etag_follows_volatile_sections():
+    """
+    Test bahwa ETag /stats ikut berubah saat bagian yang tidak terkait
+    ingest (hit cache, subscriber) berubah, sehingga 304 tidak basi.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    etag = stats_etag(await service.get_stats())
+    assert stats_etag(await service.get_stats()) == etag
+    await service.get_events_cached("test.a", limit=10)
+    assert stats_etag(await service.get_stats()) != etag
+    etag = stats_etag(await service.get_stats())
+    service.broker.subscribe("test.#")
+    assert stats_etag(await service.get_stats()) != etag
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_events_cache_invalidated_per_topic():
+    """
+    Test bahwa halaman /events dilayani dari cache sampai topic tersebut
+    menerima commit baru, sedangkan commit topic lain tidak membuangnya.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    await store.store_events(make_batch("test.a", "a", 3))
+    await store.store_events(make_batch("test.b", "b", 3))
+
+    etag, body, count = await service.get_events_cached("test.a", limit=10)
+    assert count == 3
+    assert await service.get_events_cached("test.a", limit=10) == (etag, body, 3)
+    assert service.cache.hits == 1
+    assert await service.get_events_cached("test.a", limit=10, if_none_match=etag) == (etag, None, 0)
+
+    await store.store_events(make_batch("test.b", "b2", 1))
+    assert (await service.get_events_cached("test.a", limit=10, if_none_match=etag))[1] is None
+    await service.get_events_cached(limit=10)  # isi cache query lintas topic
+
+    await store.store_events(make_batch("test.a", "a2", 1))
+    new_etag, new_body, new_count = await service.get_events_cached("test.a", limit=10, if_none_match=etag)
+    assert new_etag != etag and new_count == 4 and '"a2-0"' in new_body
+    assert '"a2-0"' in (await service.get_events_cached(limit=10))[1]
+    await store.close()
@@ -0,0 +1,197 @@
+import pytest
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from src.cluster import RemoteEventService, WriterServer
+from src.metrics import Registry
+from src.fastpath import validate_batch
+from src.service import EventService
+from src.store import InvalidCursor, SQLiteEventStore
+
+
+def make_batch(prefix, n):
+    return validate_batch({"events": [
+        {"topic": "test.cluster", "event_id": f"{prefix}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(n)
+    ]})
+
+
+@pytest.mark.asyncio
+async def test_remote_workers_share_one_writer(tmp_path):
+    """
+    Test bahwa beberapa klien (mewakili worker HTTP) menulis lewat satu
+    proses writer dan semuanya melihat stats yang sama.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    await service.start()
+    server = WriterServer(service, str(tmp_path / "writer.sock"))
+    await server.start()
+
+    workers = [RemoteEventService(server.path) for _ in range(3)]
+    results = await asyncio.gather(*(
+        worker.process_events(make_batch(f"w{n}", 20))
+        for n, worker in enumerate(workers)
+    ))
+    assert all(r == {"processed": 20, "duplicates": 0} for r in results)
+    assert await workers[0].process_events(make_batch("w1", 5)) == {"processed": 0, "duplicates": 5}
+
+    for worker in workers:
+        stats = await worker.get_stats()
+        assert (stats["received"], stats["unique_processed"], stats["duplicate_dropped"]) == (65, 60, 5)
+
+    streamed = [ev async for ev in workers[1].iter_events("test.cluster")]
+    assert len(streamed) == 60 and streamed[0]["payload"] == {"i": 0}
+    with pytest.raises(InvalidCursor):
+        await workers[2].get_events_page(after="!!")
+
+    # Event ter-commit di-push writer ke worker yang punya subscriber
+    _, cursor = await workers[0].get_events_page("test.cluster", limit=58)
+    frames = await workers[2].subscribe("test.#", after=cursor, heartbeat=1)
+    backfill = await anext(frames)
+    assert len(backfill[1]) == 2
+    await workers[0].process_events(make_batch("live", 3))
+    live = await anext(frames)
+    assert len(live[1]) == 3 and live[1][-1][1].count('"live-2"') == 1
+    await frames.aclose()
+
+    assert "event_store_seconds" in await workers[0].get_metrics()
+
+    for worker in workers:
+        await worker.stop()
+    await server.close()
+    await service.stop()
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_writer_close_with_connected_worker(tmp_path, caplog):
+    """
+    Test bahwa writer bisa ditutup saat worker masih terhubung: handler
+    koneksi dihentikan tanpa traceback dan worker melihat koneksi putus.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    await service.start()
+    server = WriterServer(service, str(tmp_path / "writer.sock"))
+    await server.start()
+    worker = RemoteEventService(server.path)
+    await worker.process_events(make_batch("c", 2))
+
+    await asyncio.wait_for(server.close(), 5)
+    assert not server._connections
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(worker.get_stats(), 5)
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
+
+    await worker.stop()
+    await service.stop()
+    await store.close()
+
+
+def publish_count(text):
+    """Jumlah `_count` event_publish_seconds di semua label path."""
+    return sum(int(n) for n in re.findall(r'^event_publish_seconds_count\{[^}]*\} (\d+)$', text, re.M))
+
+
+@pytest.mark.asyncio
+async def test_metrics_rendered_by_writer_from_every_worker(tmp_path):
+    """
+    Test bahwa /metrics dari worker mana pun berisi histogram semua worker
+    (lewat snapshot yang dikirim ke writer), dan counter tidak turun walau
+    scrape berganti worker atau worker berhenti.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    await service.start()
+    registries = [Registry() for _ in range(3)]
+    for registry in registries:
+        registry.histogram("event_publish_seconds", "Latensi uji", labelnames=("path",))
+    server = WriterServer(service, str(tmp_path / "writer.sock"), registry=registries[0])
+    await server.start()
+    workers = [
+        RemoteEventService(server.path, registry=registry, metrics_interval=0.02) for registry in registries[1:]
+    ]
+    for worker in workers:
+        await worker.start()
+
+    seen = []
+    for round_no in range(6):
+        worker, registry = workers[round_no % 2], registries[1 + round_no % 2]
+        for _ in range(round_no + 1):
+            registry._metrics["event_publish_seconds"].observe(0.01, "/publish")
+        seen.append(publish_count(await worker.get_metrics()))
+        await asyncio.sleep(0.05)
+    assert seen == sorted(seen)
+    assert publish_count(await workers[0].get_metrics()) == 21
+
+    await workers[1].stop()
+    await asyncio.sleep(0.05)
+    assert publish_count(await workers[0].get_metrics()) == 21
+
+    await workers[0].stop()
+    await server.close()
+    await service.stop()
+    await store.close()
+
+
+def test_metrics_monotonic_with_two_http_workers(tmp_path):
+    """
+    Test mode multi-worker sungguhan (dua worker uvicorn): `_count`
+    event_publish_seconds tidak pernah turun di antara scrape dan akhirnya
+    mencakup semua publish di kedua worker.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "WRITER_SOCKET_PATH": str(tmp_path / "writer.sock"),
+        "METRICS_PUSH_INTERVAL": "0.1",
+        "LOG_LEVEL": "WARNING",
+    }
+    code = f"from src.cluster import serve; serve(2, host='127.0.0.1', port={port})"
+    with open(tmp_path / "server.log", "wb") as log:
+        process = subprocess.Popen([sys.executable, "-c", code], cwd=tmp_path, env=env, stdout=log, stderr=log)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(base + "/metrics", timeout=1).read()
+                break
+            except OSError:
+                assert process.poll() is None and time.monotonic() < deadline, (tmp_path / "server.log").read_text()
+                time.sleep(0.1)
+
+        seen = []
+        for i in range(40):
+            body = json.dumps({"events": [
+                {"topic": "test.workers", "event_id": f"w-{i}", "source": "test", "payload": {}}
+            ]}).encode()
+            request = urllib.request.Request(
+                base + "/publish", data=body, headers={"Content-Type": "application/json"}
+            )
+            urllib.request.urlopen(request, timeout=5).read()
+            seen.append(publish_count(urllib.request.urlopen(base + "/metrics", timeout=5).read().decode()))
+        time.sleep(0.5)
+        final = publish_count(urllib.request.urlopen(base + "/metrics", timeout=5).read().decode())
+        assert seen == sorted(seen) and final == 40
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
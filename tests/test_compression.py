@@ -0,0 +1,62 @@
+import pytest
+from src.compression import CODEC_NONE, CompressionConfig, PayloadCodec, unpack_tag
+from src.encoding import render_event
+from src.fastpath import validate_batch
+from src.store import SQLiteEventStore
+
+
+def make_batch(topic, prefix, n):
+    return validate_batch({"events": [
+        {
+            "topic": topic, "event_id": f"{prefix}-{i}", "source": "sensor",
+            "payload": {"device": f"dev-{i % 7}", "reading": {"temperature": 20 + i % 5, "unit": "celsius"},
+                        "tags": ["building-a", "floor-3"], "seq": i},
+        }
+        for i in range(n)
+    ]})
+
+
+def test_codec_roundtrip_and_small_payloads():
+    codec = PayloadCodec(CompressionConfig(default="zlib", topics={"plain": "none"}, min_size=32))
+    text = '{"message":"' + "abc" * 50 + '"}'
+    value, tag = codec.encode("any", text)
+    assert isinstance(value, bytes) and len(value) < len(text)
+    assert codec.decode(value, tag) == text
+    assert codec.encode("any", '{"a":1}') == ('{"a":1}', CODEC_NONE)
+    assert codec.encode("plain", text) == (text, CODEC_NONE)
+
+
+@pytest.mark.asyncio
+async def test_compressed_store_reads_old_and_new_rows(tmp_path):
+    """
+    Test bahwa baris lama (tanpa kompresi) tetap terbaca setelah kompresi
+    diaktifkan, dan dictionary per topic dipakai serta bertahan setelah restart.
+    """
+    db_path = str(tmp_path / "compressed.db")
+    plain = SQLiteEventStore(db_path)
+    await plain.initialize()
+    await plain.store_events(make_batch("test.zip", "old", 10))
+    await plain.close()
+
+    config = CompressionConfig(topics={"test.zip": "zlib+dict"}, dict_samples=20, min_size=16)
+    store = SQLiteEventStore(db_path, compression=config)
+    await store.initialize()
+    await store.submit_events(make_batch("test.zip", "new", 50))
+
+    events = await store.get_events("test.zip")
+    assert len(events) == 60
+    assert events[0]["payload"]["seq"] == 0 and events[-1]["payload"]["seq"] == 49
+    raw, _ = await store.get_events_page("test.zip", limit=60, raw=True)
+    assert all(render_event(ev) for ev in raw)
+
+    async with store._shards[0].pool.read() as db:
+        cursor = await db.execute("SELECT codec FROM events WHERE topic = 'test.zip' ORDER BY rowid")
+        tags = [row[0] for row in await cursor.fetchall()]
+    assert tags[:10] == [CODEC_NONE] * 10
+    assert all(unpack_tag(tag)[1] for tag in tags[-10:])  # baris terakhir memakai dictionary
+    await store.close()
+
+    reopened = SQLiteEventStore(db_path)
+    await reopened.initialize()
+    assert [e["payload"]["seq"] for e in await reopened.get_events("test.zip")][-3:] == [47, 48, 49]
+    await reopened.close()
@@ -4,6 +4,7 @@ import os
 from datetime import datetime, UTC
 from src.store import SQLiteEventStore
 from src.models import Event
+from src.dedup import DedupIndex
 
 
 @pytest.mark.asyncio
@@ -35,6 +36,8 @@ async def test_dedup_store_persistence(tmp_path):
 
     is_duplicate = await store2.is_duplicate(event)
     assert is_duplicate is True
+    await store1.close()
+    await store2.close()
 
 
 @pytest.mark.asyncio
@@ -63,6 +66,7 @@ async def test_dedup_detection():
 
     stats = await store.get_stats()
     assert stats["duplicate_dropped"] == 1
+    await store.close()
 
 
 @pytest.mark.asyncio
@@ -93,3 +97,282 @@ async def test_event_retrieval():
     topic_events = await store.get_events("test.retrieve.0")
     assert len(topic_events) == 1
     assert topic_events[0]["topic"] == "test.retrieve.0"
+    await store.close()
+
+
+def test_bloom_filter_no_false_negatives():
+    """
+    Test bahwa Bloom filter tidak pernah memberi false negative
+    dan LRU tetap dibatasi ukurannya.
+    """
+    index = DedupIndex(bloom_bytes_per_topic=4096, lru_size=100)
+    for i in range(1000):
+        index.add("test.bloom", f"id-{i}")
+
+    assert all(index.check("test.bloom", f"id-{i}") is not False for i in range(1000))
+    assert len(index._recent) == 100
+    assert index.check("test.bloom", "id-999") is True
+    assert index.check("other.topic", "id-1") is False
+
+
+@pytest.mark.asyncio
+async def test_dedup_index_warmup_and_fp_rate(tmp_path):
+    """
+    Test bahwa indeks dedup diisi ulang dari database saat initialize()
+    dan /stats melaporkan false-positive rate.
+    """
+    db_path = tmp_path / "test_bloom.db"
+    store1 = SQLiteEventStore(str(db_path))
+    await store1.initialize()
+    events = [
+        Event(topic="test.warm", event_id=f"warm-{i}", source="test", payload={"i": i})
+        for i in range(50)
+    ]
+    assert all(await store1.store_events(events))
+    await store1.close()
+
+    # Filter sangat kecil agar false positive pasti muncul
+    store2 = SQLiteEventStore(str(db_path), dedup_index=DedupIndex(bloom_bytes_per_topic=8, lru_size=0))
+    await store2.initialize()
+    for ev in events:
+        assert await store2.is_duplicate(ev) is True
+
+    fresh = [
+        Event(topic="test.warm", event_id=f"fresh-{i}", source="test", payload={"i": i})
+        for i in range(50)
+    ]
+    assert await store2.store_events(fresh) == [True] * 50
+
+    stats = await store2.get_stats()
+    assert 0 < stats["dedup"]["false_positive_rate"] <= 1
+    await store2.close()
+
+
+@pytest.mark.asyncio
+async def test_file_store_uses_wal_and_reader_pool(tmp_path):
+    """
+    Test bahwa database file dibuka dalam mode WAL dan reader pool
+    melihat data yang sudah di-commit writer.
+    """
+    store = SQLiteEventStore(str(tmp_path / "test_wal.db"), read_pool_size=2)
+    await store.initialize()
+
+    async with store._shards[0].pool.read() as db:
+        cursor = await db.execute("PRAGMA journal_mode")
+        assert (await cursor.fetchone())[0] == "wal"
+        await cursor.close()
+
+    event = Event(topic="test.wal", event_id="wal-1", source="test", payload={"a": 1})
+    assert await store.store_event(event) is True
+
+    results = await asyncio.gather(*(store.get_events("test.wal") for _ in range(5)))
+    assert all(len(r) == 1 for r in results)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_store_reads_wait_for_open_transaction():
+    """
+    Test bahwa pembacaan pada store `:memory:` (berbagi koneksi writer)
+    menunggu transaksi yang sedang terbuka, sehingga baris yang akhirnya
+    di-rollback tidak pernah terlihat.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    pool = store._shards[0].pool
+    async with pool.write() as db:
+        await db.execute(
+            "INSERT INTO events (topic, event_id, timestamp, source, payload) VALUES ('t', 'x', 'ts', 's', '{}')"
+        )
+        read = asyncio.create_task(store.get_events("t"))
+        await asyncio.sleep(0.05)
+        assert not read.done()
+        await db.rollback()
+    assert await read == []
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_event_pages_and_iteration():
+    """
+    Test bahwa keyset pagination dan iterasi per chunk mengembalikan
+    setiap event tepat sekali.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    await store.store_events([
+        Event(topic=f"test.iter.{i % 2}", event_id=f"iter-{i}", source="test", payload={"i": i})
+        for i in range(25)
+    ])
+
+    page, cursor = await store.get_events_page(limit=10)
+    ids = [e["event_id"] for e in page]
+    while cursor:
+        page, cursor = await store.get_events_page(limit=10, after=cursor)
+        ids.extend(e["event_id"] for e in page)
+    assert ids == [f"iter-{i}" for i in range(25)]
+
+    streamed = [e async for e in store.iter_events("test.iter.0", chunk_size=4)]
+    assert [e["payload"]["i"] for e in streamed] == list(range(0, 25, 2))
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_checkpoint_and_crash_recovery(tmp_path):
+    """
+    Test bahwa counter in-memory di-checkpoint saat close() dan event yang
+    ter-commit setelah checkpoint terakhir dihitung ulang saat startup.
+    """
+    db_path = str(tmp_path / "test_stats.db")
+    store1 = SQLiteEventStore(db_path)
+    await store1.initialize()
+    batch = [
+        Event(topic="test.ckpt", event_id=f"ckpt-{i}", source="test", payload={"i": i})
+        for i in range(5)
+    ]
+    await store1.store_events(batch + batch[:2])
+    await store1.close()
+
+    store2 = SQLiteEventStore(db_path)
+    await store2.initialize()
+    stats = await store2.get_stats()
+    assert (stats["received"], stats["unique_processed"], stats["duplicate_dropped"]) == (7, 5, 2)
+    assert stats["topics"] == ["test.ckpt"]
+
+    # Simulasi crash: event ter-commit tapi stats tidak pernah di-flush
+    await store2.store_events([
+        Event(topic="test.crash", event_id=f"crash-{i}", source="test", payload={"i": i})
+        for i in range(3)
+    ])
+    store2._shards[0].dirty = False
+    await store2.close()
+
+    store3 = SQLiteEventStore(db_path)
+    await store3.initialize()
+    stats = await store3.get_stats()
+    assert stats["unique_processed"] == 8
+    assert stats["received"] == 10
+    assert stats["topics"] == ["test.ckpt", "test.crash"]
+    await store3.close()
+
+
+@pytest.mark.asyncio
+async def test_sharded_store_routing_and_scatter_reads(tmp_path):
+    """
+    Test bahwa event dibagi per topic ke beberapa file, dedup tetap berjalan,
+    dan pembacaan tanpa filter serta stats menggabungkan semua shard.
+    """
+    from src.store import shard_index, shard_path
+
+    db_path = str(tmp_path / "sharded.db")
+    store = SQLiteEventStore(db_path, shards=3)
+    await store.initialize()
+    topics = [f"test.shard.{n}" for n in range(6)]
+    batch = [
+        Event(topic=topics[i % 6], event_id=f"s-{i}", source="test", payload={"i": i})
+        for i in range(30)
+    ]
+    assert all(await store.submit_events(batch))
+    assert not any(await store.store_events(batch[:5]))
+
+    for n in range(3):
+        assert os.path.exists(shard_path(db_path, n))
+    for topic in topics:
+        events = await store.get_events(topic)
+        assert len(events) == 5
+        assert store._shard_for(topic).index == shard_index(topic, 3)
+
+    ids = []
+    page, cursor = await store.get_events_page(limit=7)
+    ids.extend(e["event_id"] for e in page)
+    while cursor:
+        page, cursor = await store.get_events_page(limit=7, after=cursor)
+        ids.extend(e["event_id"] for e in page)
+    assert sorted(ids) == sorted(f"s-{i}" for i in range(30))
+
+    stats = await store.get_stats()
+    assert (stats["received"], stats["unique_processed"], stats["duplicate_dropped"]) == (35, 30, 5)
+    assert stats["topics"] == sorted(topics)
+    await store.close()
+
+    reopened = SQLiteEventStore(db_path, shards=3)
+    await reopened.initialize()
+    assert (await reopened.get_stats())["unique_processed"] == 30
+    await reopened.close()
+
+    mismatched = SQLiteEventStore(db_path, shards=2)
+    with pytest.raises(RuntimeError):
+        await mismatched.initialize()
+    await mismatched.close()
+
+
+@pytest.mark.asyncio
+async def test_time_source_and_prefix_filters():
+    """
+    Test filter since/until/source/topic_prefix dan pagination urut waktu.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    await store.store_events([
+        Event(
+            topic=f"test.filter.{i % 2}", event_id=f"f-{i}", source=f"src-{i % 3}",
+            timestamp=datetime(2024, 1, 1, 0, 0, 29 - i, tzinfo=UTC), payload={"i": i},
+        )
+        for i in range(30)
+    ])
+
+    window = await store.get_events(
+        "test.filter.0", since="2024-01-01T00:00:10Z", until=datetime(2024, 1, 1, 0, 0, 20, tzinfo=UTC)
+    )
+    # Urut berdasarkan timestamp, bukan urutan insert
+    assert [e["payload"]["i"] for e in window] == [18, 16, 14, 12, 10]
+
+    by_source = []
+    page, cursor = await store.get_events_page(limit=4, source="src-1")
+    by_source.extend(page)
+    while cursor:
+        page, cursor = await store.get_events_page(limit=4, source="src-1", after=cursor)
+        by_source.extend(page)
+    assert [e["payload"]["i"] for e in by_source] == list(range(28, 0, -3))
+
+    prefixed = await store.get_events(topic_prefix="test.filter.")
+    assert len(prefixed) == 30
+    assert await store.get_events(topic_prefix="test.filtex") == []
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_migration_adds_timestamp_column(tmp_path):
+    """
+    Test bahwa database dengan skema lama (tanpa ts_ms) dimigrasi saat startup.
+    """
+    import sqlite3
+
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE events (
+            topic TEXT NOT NULL, event_id TEXT NOT NULL, timestamp TEXT NOT NULL,
+            source TEXT NOT NULL, payload TEXT NOT NULL, UNIQUE(topic, event_id)
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+        [("test.legacy", f"l-{i}", f"2024-01-01T00:00:0{i}+00:00", "old", "{}") for i in range(5)],
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteEventStore(db_path)
+    await store.initialize()
+    events = await store.get_events("test.legacy", since="2024-01-01T00:00:02+00:00")
+    assert [e["event_id"] for e in events] == ["l-2", "l-3", "l-4"]
+    await store.close()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] >= 1
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM events WHERE source = 'old' AND ts_ms >= 0 ORDER BY ts_ms"
+    ))
+    assert "idx_events_source_ts" in plan
+    conn.close()
@@ -0,0 +1,27 @@
+import json
+from src.encoding import encode_payload, render_event, render_events_page
+
+
+def test_render_event_splices_payload_text():
+    payload = {"a": [1, {"b": "ü"}], "c": None}
+    ev = {
+        "topic": "t\"q",
+        "event_id": "e-1",
+        "timestamp": "2024-04-01T09:00:00+00:00",
+        "source": "src",
+        "payload": encode_payload(payload),
+    }
+    assert encode_payload(payload) == '{"a":[1,{"b":"ü"}],"c":null}'
+    assert json.loads(render_event(ev)) == {**ev, "payload": payload}
+
+
+def test_render_events_page_matches_json_encoding():
+    events = [
+        {"topic": "t", "event_id": str(i), "timestamp": "ts", "source": "s", "payload": encode_payload({"i": i})}
+        for i in range(3)
+    ]
+    body = json.loads(render_events_page(events, 3, "abc"))
+    assert body["count"] == 3
+    assert body["next_cursor"] == "abc"
+    assert [e["payload"]["i"] for e in body["data"]] == [0, 1, 2]
+    assert json.loads(render_events_page([], 0, None))["data"] == []
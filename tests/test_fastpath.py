@@ -0,0 +1,67 @@
+import pytest
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from src.fastpath import BatchValidationError, ColumnBatch, validate_batch
+from src.models import EventBatch
+
+
+VALID_EVENTS = [
+    {
+        "topic": "payment.initiated",
+        "event_id": "pmt-1",
+        "timestamp": "2024-04-01T09:00:00Z",
+        "source": "payment_gateway",
+        "payload": {"payment_id": "P1001", "amount": 150000},
+    },
+    {
+        "topic": "shipment.scheduled",
+        "event_id": "shp-1",
+        "timestamp": "2024-04-01T16:05:00+07:00",
+        "source": "logistics",
+        "payload": {"order_id": "A124", "items": [1, 2], "note": "ünïcode"},
+    },
+    {
+        "topic": "user.created",
+        "event_id": "usr-1",
+        "timestamp": datetime(2024, 4, 1, 9, 10, tzinfo=timezone.utc),
+        "source": "auth",
+        "payload": {},
+    },
+]
+
+INVALID_BATCHES = [
+    {"events": [{"event_id": "x", "source": "s", "payload": {}}]},
+    {"events": [{"topic": "  ", "source": "s", "payload": {}}]},
+    {"events": [{"topic": "t", "source": "", "payload": {}}]},
+    {"events": [{"topic": 1, "event_id": 2, "source": None, "payload": []}]},
+    {"events": [{"topic": "t", "source": "s", "payload": {}, "timestamp": "yesterday"}]},
+    {"events": [{"topic": "t", "source": "s", "payload": {}, "timestamp": 1700000000}]},
+    {"events": [VALID_EVENTS[0], "not-an-object"]},
+    {"events": "nope"},
+    {"items": []},
+]
+
+
+def test_fast_validation_matches_pydantic_output():
+    data = {"events": VALID_EVENTS}
+    fast = validate_batch(data)
+    reference = ColumnBatch.from_events(EventBatch.model_validate(data).events)
+    assert fast == reference
+
+
+def test_fast_validation_defaults_match_pydantic():
+    fast = validate_batch({"events": [{"topic": "t", "source": "s", "payload": {"a": 1}}]})
+    assert len(fast.event_ids[0]) == 36
+    assert datetime.fromisoformat(fast.timestamps[0]).tzinfo == timezone.utc
+
+
+@pytest.mark.parametrize("data", INVALID_BATCHES)
+def test_fast_validation_errors_match_pydantic(data):
+    with pytest.raises(ValidationError) as ref:
+        EventBatch.model_validate(data)
+    with pytest.raises(BatchValidationError) as fast:
+        validate_batch(data)
+
+    expected = [(e["type"], tuple(e["loc"]), e["msg"]) for e in ref.value.errors()]
+    actual = [(e["type"], tuple(e["loc"]), e["msg"]) for e in fast.value.errors]
+    assert actual == expected
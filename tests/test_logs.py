@@ -0,0 +1,57 @@
+import pytest
+import logging
+from src.fastpath import validate_batch
+from src.logs import DeferredQueueHandler, SamplingFilter
+from src.store import SQLiteEventStore
+
+
+def make_record(msg, *args, level=logging.WARNING):
+    return logging.LogRecord("event_aggregator.test", level, __file__, 1, msg, args, None)
+
+
+def test_sampling_filter_rate_limits_per_template():
+    """
+    Test bahwa record WARNING dengan template sama dibatasi per interval
+    dan jumlah yang dilewati dilaporkan di record berikutnya.
+    """
+    now = [0.0]
+    sampler = SamplingFilter(burst=2, interval=1.0, clock=lambda: now[0])
+    passed = [sampler.filter(make_record("Duplikat terdeteksi: %s", i)) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(make_record("Template lain %s", 1))
+    assert sampler.filter(make_record("Info %s", 1, level=logging.INFO))
+
+    now[0] = 1.5
+    record = make_record("Duplikat terdeteksi: %s", 9)
+    assert sampler.filter(record) and record.suppressed == 3
+
+
+def test_queue_handler_defers_formatting():
+    """
+    Test bahwa record masuk antrean tanpa diformat di thread pemanggil.
+    """
+    records = []
+    handler = DeferredQueueHandler(records)
+    handler.enqueue = records.append
+    handler.emit(make_record("Batch tersimpan: %d unik", 5))
+    assert records[0].msg == "Batch tersimpan: %d unik" and records[0].args == (5,)
+
+
+@pytest.mark.asyncio
+async def test_batch_logs_one_summary(caplog):
+    """
+    Test bahwa satu batch (termasuk duplikat) menghasilkan satu record log
+    ringkasan, bukan satu baris per event.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    batch = validate_batch({"events": [
+        {"topic": "test.logs", "event_id": f"e-{i % 800}", "source": "test", "payload": {}}
+        for i in range(1000)
+    ]})
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger="event_aggregator.store"):
+        await store.store_events(batch)
+    records = [r for r in caplog.records if r.name == "event_aggregator.store"]
+    assert [r.getMessage() for r in records] == ["Batch tersimpan: 800 unik, 200 duplikat"]
+    await store.close()
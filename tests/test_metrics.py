@@ -0,0 +1,28 @@
+from src import metrics
+from src.metrics import Registry
+
+
+def test_histogram_render_and_merge():
+    """
+    Test bahwa histogram dirender kumulatif dan snapshot proses lain
+    (mis. writer pada mode multi-worker) ikut dijumlahkan.
+    """
+    registry = Registry()
+    latency = registry.histogram("test_seconds", "Latensi uji", buckets=(0.1, 1.0), labelnames=("op",))
+    latency.observe(0.05, "read")
+    latency.observe(0.5, "read")
+    remote = {"test_seconds": {"read": [0, 0, 1, 3.0], "write": [1, 0, 0, 0.01]}}
+
+    text = registry.render(remote)
+    assert 'test_seconds_bucket{op="read",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{op="read",le="1"} 2' in text
+    assert 'test_seconds_bucket{op="read",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{op="read"} 3.55' in text
+    assert 'test_seconds_count{op="write"} 1' in text
+
+    metrics.set_enabled(False)
+    try:
+        latency.observe(0.05, "read")
+    finally:
+        metrics.set_enabled(True)
+    assert latency.snapshot()["read"][0] == 1
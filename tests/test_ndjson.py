@@ -0,0 +1,35 @@
+import gzip
+import pytest
+from src.ndjson import LineTooLong, iter_ndjson_lines
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(data, size, **kwargs):
+    return [item async for item in iter_ndjson_lines(chunked(data, size), **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_lines_split_across_chunks():
+    data = b'{"a":1}\n\n{"b":2}\n{"c":3}'
+    for size in (1, 3, 100):
+        assert await collect(data, size) == [(1, b'{"a":1}'), (3, b'{"b":2}'), (4, b'{"c":3}')]
+
+
+@pytest.mark.asyncio
+async def test_gzip_and_line_limit():
+    raw = b"\n".join(b'{"i":%d}' % i for i in range(1000))
+    lines = await collect(gzip.compress(raw), 7, gzip=True)
+    assert len(lines) == 1000 and lines[-1] == (1000, b'{"i":999}')
+
+    with pytest.raises(LineTooLong):
+        await collect(b"x" * 50, 10, max_line_bytes=20)
+    # Baris lengkap dalam satu chunk, juga baris terakhir tanpa newline
+    with pytest.raises(LineTooLong):
+        await collect(b'{"a":1}\n' + b"x" * 50 + b"\n{}", 100, max_line_bytes=20)
+    with pytest.raises(LineTooLong):
+        await collect(b'{"a":1}\n' + b"x" * 50, 100, max_line_bytes=20)
+    assert await collect(b"x" * 20 + b"\n" + b"y" * 20, 100, max_line_bytes=20) == [(1, b"x" * 20), (2, b"y" * 20)]
@@ -0,0 +1,148 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.archive import ArchiveConfig
+from src.compression import CompressionConfig
+from src.fastpath import validate_batch
+from src.models import Event
+from src.payload_index import PayloadIndexes, format_path, index_value, parse_path
+from src.store import InvalidFilter, SQLiteEventStore
+
+INDEXES = {"order.paid": ["$.order_id", "customer.tier", "$.items[0].qty"]}
+
+
+def make_batch(n, start, topic="order.paid", first=0):
+    return validate_batch({"events": [
+        {
+            "topic": topic, "event_id": f"o-{i}", "source": "shop" if i % 2 else "pos",
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "payload": {
+                "order_id": f"A{i % 10}", "customer": {"tier": "gold" if i % 3 == 0 else "silver"},
+                "items": [{"qty": i % 4}], "note": "x" * 80,
+            },
+        }
+        for i in range(first, first + n)
+    ]})
+
+
+async def ids(store, **filters):
+    return [ev["event_id"] async for ev in store.iter_events(chunk_size=3, **filters)]
+
+
+def index_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM payload_index").fetchone()[0]
+    conn.close()
+    return rows
+
+
+def test_parse_paths_and_where():
+    """
+    Test parsing JSON path, normalisasi nilai skalar, dan validasi `where`.
+    """
+    assert parse_path("$.items[0].sku") == ("items", 0, "sku")
+    assert format_path(parse_path("customer.tier")) == "$.customer.tier"
+    with pytest.raises(ValueError):
+        parse_path("$.a..b")
+    assert [index_value(v) for v in ("A1", 3, 2.5, True, None, {"a": 1})] == ["A1", "3", "2.5", "true", None, None]
+
+    indexes = PayloadIndexes(INDEXES)
+    payload = '{"order_id": "A1", "customer": {"tier": "gold"}, "items": []}'
+    assert indexes.extract("order.paid", payload) == [("$.customer.tier", "gold"), ("$.order_id", "A1")]
+    assert indexes.extract("other", payload) == []
+    assert indexes.parse_where("order.paid", ["order_id:A:1"]) == [("$.order_id", "A:1")]
+    for topic, where in [("order.paid", ["$.note:x"]), (None, ["order_id:A1"]), ("order.paid", ["order_id"])]:
+        with pytest.raises(ValueError):
+            indexes.parse_where(topic, where)
+
+
+@pytest.mark.asyncio
+async def test_where_filter_is_index_seek(tmp_path):
+    """
+    Test bahwa filter `where` menemukan event lewat payload_index (juga untuk
+    payload terkompresi dan event tunggal), bisa digabung dengan filter lain
+    dan paginasi, memakai index seek, dan menolak path yang tidak diindeks.
+    """
+    db_path = str(tmp_path / "payload.db")
+    store = SQLiteEventStore(
+        db_path, payload_indexes=INDEXES, compression=CompressionConfig(default="zlib", min_size=16),
+    )
+    await store.initialize()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await store.store_events(make_batch(40, start))
+    await store.store_events(make_batch(5, start, topic="order.other"))
+    await store.store_event(Event(
+        topic="order.paid", event_id="single", source="pos", timestamp=start + timedelta(days=1),
+        payload={"order_id": "A3", "customer": {"tier": "gold"}, "items": [{"qty": 1}]},
+    ))
+
+    assert await ids(store, topic="order.paid", where=["order_id:A3"]) == ["o-3", "o-13", "o-23", "o-33", "single"]
+    assert await ids(store, topic="order.paid", where=["order_id:A3", "customer.tier:gold"]) == [
+        "o-3", "o-33", "single",
+    ]
+    assert await ids(store, topic="order.paid", where=["$.items[0].qty:1", "order_id:A3"]) == ["o-13", "o-33", "single"]
+    assert await ids(store, topic="order.paid", source="shop", where=["order_id:A3"]) == ["o-3", "o-13", "o-23", "o-33"]
+    since = (start + timedelta(minutes=20)).isoformat()
+    assert await ids(store, topic="order.paid", since=since, where=["order_id:A3"]) == ["o-23", "o-33", "single"]
+    page, cursor = await store.get_events_page("order.paid", limit=2, where=["order_id:A3"])
+    assert [ev["payload"]["order_id"] for ev in page] == ["A3", "A3"]
+    page, _ = await store.get_events_page("order.paid", limit=2, after=cursor, where=["order_id:A3"])
+    assert [ev["event_id"] for ev in page] == ["o-23", "o-33"]
+    assert await ids(store, topic="order.paid", where=["order_id:missing"]) == []
+
+    with pytest.raises(InvalidFilter):
+        await store.get_events_page("order.paid", where=["note:x"])
+    with pytest.raises(InvalidFilter):
+        await store.get_events_page("order.other", where=["order_id:A3"])
+    with pytest.raises(InvalidFilter):
+        await store.get_events_page(topic_prefix="order.", where=["order_id:A3"])
+
+    query = store._query("order.paid", None, "shop", since, None, ["order_id:A3"])
+    sql = f"EXPLAIN QUERY PLAN SELECT rowid FROM events WHERE {' AND '.join(query['clauses'])} ORDER BY ts_ms"
+    await store.close()
+
+    conn = sqlite3.connect(db_path)
+    plan = " ".join(str(row) for row in conn.execute(sql, query["params"]))
+    conn.close()
+    assert "idx_payload_lookup" in plan and "INTEGER PRIMARY KEY" in plan
+    assert "idx_events_topic" not in plan and "idx_events_source_ts" not in plan
+
+
+@pytest.mark.asyncio
+async def test_backfill_archive_and_retention(tmp_path):
+    """
+    Test bahwa path yang baru dideklarasikan di-backfill saat startup, event
+    yang diarsipkan tetap bisa dicari, baris indeks ikut terhapus oleh
+    retensi, dan path yang tidak lagi dideklarasikan dibuang dari indeks.
+    """
+    db_path = str(tmp_path / "backfill.db")
+    archive = ArchiveConfig(directory=str(tmp_path / "archive"), segment_rows=10)
+    now = datetime.now(timezone.utc)
+    store = SQLiteEventStore(db_path, archive=archive)
+    await store.initialize()
+    await store.store_events(make_batch(20, now - timedelta(days=10)))
+    await store.close()
+
+    store = SQLiteEventStore(db_path, archive=archive, payload_indexes=INDEXES)
+    await store.initialize()
+    assert await ids(store, topic="order.paid", where=["order_id:A4"]) == ["o-4", "o-14"]
+    assert await store.archive_events("order.paid", now - timedelta(days=1)) == 20
+    await store.store_events(make_batch(10, now, first=20))
+    assert await ids(store, topic="order.paid", where=["order_id:A4"]) == ["o-4", "o-14", "o-24"]
+    since = (now - timedelta(days=11)).isoformat()
+    assert await ids(store, topic="order.paid", since=since, where=["order_id:A4", "customer.tier:silver"]) == [
+        "o-4", "o-14",
+    ]
+    assert index_rows(db_path) == 30 * 3
+
+    assert await store.drop_archived("order.paid", now - timedelta(days=1)) == 20
+    assert await store.delete_oldest("order.paid", limit=5) == 5
+    assert await ids(store, topic="order.paid", where=["order_id:A4"]) == []
+    assert index_rows(db_path) == 5 * 3
+    await store.close()
+
+    store = SQLiteEventStore(db_path, payload_indexes={"order.paid": ["$.order_id"]})
+    await store.initialize()
+    assert index_rows(db_path) == 5
+    assert await ids(store, topic="order.paid", where=["order_id:A7"]) == ["o-27"]
+    await store.close()
@@ -0,0 +1,78 @@
+import pytest
+import json
+from src.fastpath import validate_batch
+from src.pubsub import Broker, TopicMatcher, literal_prefix
+from src.service import EventService
+from src.store import SQLiteEventStore
+
+
+def make_batch(topic, prefix, n):
+    return validate_batch({"events": [
+        {"topic": topic, "event_id": f"{prefix}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(n)
+    ]})
+
+
+def committed(rowid, topic="test.a"):
+    return (0, rowid, topic, f"e-{rowid}", "2024-01-01T00:00:00+00:00", "test", "{}")
+
+
+def test_topic_matcher_wildcards():
+    """
+    Test bahwa `*` cocok dengan tepat satu segmen dan `#` dengan sisa segmen.
+    """
+    matcher = TopicMatcher()
+    for pattern in ("orders.created", "orders.*", "orders.#", "#", "*.created.eu"):
+        matcher.add(pattern, pattern)
+    assert matcher.match("orders.created") == {"orders.created", "orders.*", "orders.#", "#"}
+    assert matcher.match("orders.created.eu") == {"orders.#", "#", "*.created.eu"}
+    assert matcher.match("payments") == {"#"}
+    assert literal_prefix("orders.*.eu") == "orders."
+    assert literal_prefix("#") == ""
+    assert literal_prefix("orders.created") is None
+
+
+def test_slow_consumer_policies():
+    """
+    Test bahwa subscriber lambat kehilangan frame tertua (drop) atau
+    diputus (disconnect) saat ring buffer penuh.
+    """
+    broker = Broker()
+    dropping = broker.subscribe("test.#", buffer_size=3, policy="drop")
+    closing = broker.subscribe("test.a", buffer_size=3, policy="disconnect")
+    broker.publish([committed(rowid) for rowid in range(1, 6)])
+
+    assert dropping.dropped == 2
+    assert [item[1] for item in dropping._buffer] == [3, 4, 5]
+    assert closing.closed_reason == "slow consumer"
+    assert broker.stats()["subscribers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_subscribe_backfill_then_live():
+    """
+    Test bahwa subscribe dengan cursor mengirim event lama dari store lebih
+    dulu, lalu event live tanpa duplikat.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    await store.store_events(make_batch("test.a", "old", 5))
+    page, cursor = await store.get_events_page("test.a", limit=2)
+
+    frames = await service.subscribe("test.*", after=cursor, heartbeat=0.05)
+    first = await anext(frames)
+    assert first[0] == "events"
+    assert [json.loads(data)["event_id"] for _, data in first[1]] == ["old-2", "old-3", "old-4"]
+
+    await store.store_events(make_batch("test.a", "old", 5))  # duplikat tidak di-publish
+    await store.store_events(make_batch("test.b", "new", 2))
+    await store.store_events(make_batch("other.a", "skip", 2))
+    live = await anext(frames)
+    assert [json.loads(data)["event_id"] for _, data in live[1]] == ["new-0", "new-1"]
+    assert await anext(frames) == ("keepalive",)
+    assert service.broker.stats()["subscribers"] == 1
+
+    await frames.aclose()
+    assert service.broker.stats()["subscribers"] == 0
+    await store.close()
@@ -0,0 +1,119 @@
+import pytest
+import os
+from datetime import datetime, timedelta, timezone
+from src.fastpath import validate_batch
+from src.models import Event
+from src.retention import RetentionConfig, RetentionPolicy
+from src.service import EventService
+from src.store import SQLiteEventStore
+
+
+def make_batch(topic, prefix, n, age_days=0):
+    start = datetime.now(timezone.utc) - timedelta(days=age_days)
+    return validate_batch({"events": [
+        {
+            "topic": topic, "event_id": f"{prefix}-{i}", "source": "test",
+            "timestamp": (start + timedelta(seconds=i)).isoformat(), "payload": {"i": i},
+        }
+        for i in range(n)
+    ]})
+
+
+@pytest.mark.asyncio
+async def test_retention_age_rows_and_tombstones(tmp_path):
+    """
+    Test bahwa retensi umur dan jumlah baris menghapus event tertua dalam
+    chunk, dan redelivery event yang sudah dihapus tetap ditolak.
+    """
+    store = SQLiteEventStore(str(tmp_path / "retention.db"))
+    await store.initialize()
+    service = EventService(store, retention=RetentionConfig(
+        default=RetentionPolicy(max_age=24 * 3600),
+        topics={"test.capped": RetentionPolicy(max_rows=10)},
+        chunk_rows=7,
+        pause=0,
+    ))
+    await store.store_events(make_batch("test.aged", "old", 20, age_days=3))
+    await store.store_events(make_batch("test.aged", "new", 5))
+    await store.store_events(make_batch("test.capped", "c", 25))
+
+    result = await service.run_retention()
+    assert result["deleted"] == 35
+    assert len(await store.get_events("test.aged")) == 5
+    capped = await store.get_events("test.capped")
+    assert [e["payload"]["i"] for e in capped] == list(range(15, 25))
+
+    # Key yang sudah dihapus masih diingat lewat tombstone
+    assert await store.is_duplicate(Event(topic="test.aged", event_id="old-0", source="test", payload={})) is True
+    assert await store.store_events(make_batch("test.aged", "old", 3, age_days=3)) == [False] * 3
+    stats = await store.get_stats()
+    assert stats["retention"]["tombstones"] == 35
+    await store.close()
+
+    # Tombstone bertahan setelah restart (Bloom dibangun ulang dari tabel)
+    reopened = SQLiteEventStore(str(tmp_path / "retention.db"))
+    await reopened.initialize()
+    expired_event = Event(topic="test.capped", event_id="c-1", source="test", payload={})
+    assert await reopened.is_duplicate(expired_event) is True
+    assert await reopened.is_duplicate(expired_event) is True
+    assert await reopened.store_events(make_batch("test.capped", "c", 2)) == [False, False]
+    expired = await reopened.expire_tombstones(datetime.now(timezone.utc) + timedelta(days=1))
+    assert expired == 35
+    assert await reopened.store_events(make_batch("test.capped", "c", 2)) == [True, True]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_retention_vacuum_returns_pages(tmp_path):
+    """
+    Test bahwa database baru memakai auto_vacuum incremental dan ukuran
+    file turun setelah event dihapus.
+    """
+    db_path = str(tmp_path / "vacuum.db")
+    store = SQLiteEventStore(db_path)
+    await store.initialize()
+    service = EventService(store, retention=RetentionConfig(
+        default=RetentionPolicy(max_rows=0), dedup_window=0, chunk_rows=5000, pause=0,
+    ))
+    batch = validate_batch({"events": [
+        {"topic": "test.vacuum", "event_id": f"v-{i}", "source": "test", "payload": {"blob": "x" * 500}}
+        for i in range(5000)
+    ]})
+    await store.store_events(batch)
+    async with store._shards[0].pool.write() as db:
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size_before = os.path.getsize(db_path)
+
+    result = await service.run_retention()
+    assert result["deleted"] == 5000
+    assert result["vacuumed_pages"] > 0
+    async with store._shards[0].pool.write() as db:
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    assert os.path.getsize(db_path) < size_before
+    assert (await store.get_stats())["topics"] == []
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sequence_not_reused_after_retention(tmp_path):
+    """
+    Test bahwa seq event terus naik walau event terbaru ikut dihapus
+    retensi dan database dibuka ulang, sehingga offset consumer tetap valid.
+    """
+    db_path = str(tmp_path / "seq.db")
+    store = SQLiteEventStore(db_path)
+    await store.initialize()
+    await store.store_events(make_batch("test.seq", "a", 3))
+    events, _ = await store.consume("billing", "test.seq")
+    assert [e["seq"] for e in events] == [1, 2, 3]
+    assert await store.commit_offset("billing", "test.seq", 3) == 3
+    assert await store.delete_oldest("test.seq", 10) == 3
+    await store.close()
+
+    reopened = SQLiteEventStore(db_path)
+    await reopened.initialize()
+    await reopened.store_events(make_batch("test.seq", "b", 2))
+    events, offset = await reopened.consume("billing", "test.seq")
+    assert offset == 3
+    assert [(e["event_id"], e["seq"]) for e in events] == [("b-0", 4), ("b-1", 5)]
+    await reopened.close()
@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timezone
+from src.fastpath import validate_batch
+from src.service import EventService
+from src.store import SQLiteEventStore
+
+T0 = datetime(2024, 4, 1, 9, 0, tzinfo=timezone.utc).timestamp()
+
+
+def make_batch(topic, source, ids):
+    return validate_batch({"events": [
+        {"topic": topic, "event_id": event_id, "source": source, "payload": {}}
+        for event_id in ids
+    ]})
+
+
+@pytest.mark.asyncio
+async def test_rollups_flush_and_downsample():
+    """
+    Test bahwa rollup per menit digabung dari tabel dan counter yang belum
+    di-flush, lalu di-downsample ke jam.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    now = [T0]
+    service.rollups._clock = lambda: now[0]
+
+    await store.store_events(make_batch("orders", "web", ["a", "b", "a"]))
+    await store.store_events(make_batch("orders", "mobile", ["c"]))
+    await service.flush_rollups()
+    now[0] = T0 + 90
+    await store.store_events(make_batch("orders", "web", ["b", "d"]))
+    await store.store_events(make_batch("payments", "web", ["p"]))
+
+    window = {"since": "2024-04-01T09:00:00Z", "until": "2024-04-01T10:00:00Z"}
+    minute = await service.get_timeseries("minute", topic="orders", source="web", **window)
+    assert [(p["bucket"], p["received"], p["duplicates"]) for p in minute] == [
+        ("2024-04-01T09:00:00+00:00", 3, 1),
+        ("2024-04-01T09:01:00+00:00", 2, 1),
+    ]
+
+    hourly = await service.get_timeseries("hour", group_by=("source",), **window)
+    assert [(p["source"], p["received"], p["unique"]) for p in hourly] == [("mobile", 1, 1), ("web", 6, 4)]
+    assert hourly[1]["duplicate_rate"] == round(2 / 6, 4)
+
+    await service.flush_rollups()
+    assert len(service.rollups) == 0
+    total = await service.get_timeseries("day", group_by=(), **window)
+    assert [(p["bucket"], p["received"]) for p in total] == [("2024-04-01T00:00:00+00:00", 7)]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_rollup_flush_keeps_counts_visible_and_survives_failure():
+    """
+    Test bahwa selama flush berjalan timeseries tidak kehilangan counter,
+    event yang masuk saat flush ikut flush berikutnya, dan flush yang gagal
+    tidak membuang counter.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store)
+    service.rollups._clock = lambda: T0
+    window = {"since": "2024-04-01T09:00:00Z", "until": "2024-04-01T10:00:00Z", "group_by": ()}
+    await store.store_events(make_batch("orders", "web", ["a", "b"]))
+
+    add_rollups = store.add_rollups
+    seen = []
+
+    async def slow_add(rows):
+        seen.append(await service.get_timeseries("day", **window))
+        await store.store_events(make_batch("orders", "web", ["c"]))
+        await add_rollups(rows)
+
+    store.add_rollups = slow_add
+    await service.flush_rollups()
+    assert [p["received"] for p in seen[0]] == [2]
+    assert service.rollups.rows() == [(int(T0) // 60, "orders", "web", 1, 0)]
+
+    async def failing_add(rows):
+        raise RuntimeError("disk penuh")
+
+    store.add_rollups = failing_add
+    with pytest.raises(RuntimeError):
+        await service.flush_rollups()
+    store.add_rollups = add_rollups
+    assert [p["received"] for p in await service.get_timeseries("day", **window)] == [3]
+    await service.flush_rollups()
+    assert len(service.rollups) == 0
+    assert [p["received"] for p in await service.get_timeseries("day", **window)] == [3]
+    await store.close()
@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+from src.fastpath import validate_batch
+from src.service import EventService, QueueFullError
+from src.store import SQLiteEventStore
+
+
+def make_batch(prefix, n):
+    return validate_batch({"events": [
+        {"topic": "test.queue", "event_id": f"{prefix}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(n)
+    ]})
+
+
+class SlowStore(SQLiteEventStore):
+    """Store yang menahan commit sampai `release` di-set."""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.release = asyncio.Event()
+
+    async def submit_events(self, events):
+        await self.release.wait()
+        return await super().submit_events(events)
+
+
+@pytest.mark.asyncio
+async def test_workers_drain_micro_batches():
+    """
+    Test bahwa batch dari banyak producer diproses worker dan setiap
+    producer menerima hasilnya sendiri.
+    """
+    store = SQLiteEventStore(":memory:")
+    await store.initialize()
+    service = EventService(store, queue_maxsize=4, workers=2)
+    await service.start()
+
+    results = await asyncio.gather(*(service.process_events(make_batch(f"p{n}", 10)) for n in range(12)))
+    assert all(r == {"processed": 10, "duplicates": 0} for r in results)
+    assert await service.process_events(make_batch("p0", 3)) == {"processed": 0, "duplicates": 3}
+
+    stats = await service.get_stats()
+    assert stats["queue"]["enqueued"] == 13
+    assert stats["queue"]["depth"] == 0
+    await service.stop()
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_reject_policy_sheds_load_when_full():
+    """
+    Test bahwa producer langsung ditolak dengan QueueFullError saat
+    antrean penuh dan kebijakan overflow adalah 'reject'.
+    """
+    store = SlowStore()
+    await store.initialize()
+    service = EventService(store, queue_maxsize=1, workers=1, overflow="reject", retry_after=2)
+    await service.start()
+
+    first = asyncio.create_task(service.process_events(make_batch("a", 1)))
+    await asyncio.sleep(0.01)  # worker mengambil batch pertama lalu tertahan
+    second = asyncio.create_task(service.process_events(make_batch("b", 1)))
+    await asyncio.sleep(0.01)  # batch kedua mengisi antrean
+    with pytest.raises(QueueFullError) as exc:
+        await service.process_events(make_batch("c", 1))
+    assert exc.value.retry_after == 2
+    assert service.queue_stats()["rejected"] == 1
+
+    store.release.set()
+    assert (await first)["processed"] == 1
+    assert (await second)["processed"] == 1
+    await service.stop()
+    await store.close()
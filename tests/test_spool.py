@@ -0,0 +1,78 @@
+import pytest
+import asyncio
+from src.fastpath import validate_batch
+from src.service import EventService
+from src.spool import Spool
+from src.store import SQLiteEventStore
+
+
+def make_batch(prefix, n):
+    return validate_batch({"events": [
+        {"topic": "test.spool", "event_id": f"{prefix}-{i}", "source": "test", "payload": {"i": i}}
+        for i in range(n)
+    ]})
+
+
+@pytest.mark.asyncio
+async def test_spool_roundtrip_and_truncated_tail(tmp_path):
+    """
+    Test bahwa batch di spool terbaca kembali dan record terakhir yang
+    terpotong (crash saat menulis) diabaikan.
+    """
+    spool = Spool(str(tmp_path / "spool"), segment_bytes=200)
+    spool.open()
+    await asyncio.gather(*(spool.append(make_batch(f"s{n}", 3)) for n in range(4)))
+    paths = await spool.seal()
+    assert len(paths) > 1  # segment dirotasi
+
+    with open(paths[-1], "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+    batches = [b for p in paths for b in Spool.read_segment(p)]
+    assert sum(len(b) for b in batches) == 12
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_queued_ack_applied_by_background_writer(tmp_path):
+    """
+    Test bahwa ack=queued langsung kembali dan writer menerapkan spool
+    ke store; stop() menguras sisa spool.
+    """
+    store = SQLiteEventStore(str(tmp_path / "queued.db"))
+    await store.initialize()
+    service = EventService(store, spool=Spool(str(tmp_path / "spool")))
+    await service.replay_spool()
+    await service.start()
+
+    assert await service.process_events(make_batch("w", 4), ack="queued") == {"queued": 4}
+    assert await service.process_events(make_batch("w", 4), ack="queued") == {"queued": 4}
+    await service.stop()
+
+    stats = await store.get_stats()
+    assert (stats["unique_processed"], stats["duplicate_dropped"]) == (4, 4)
+    assert service.spool.stats()["segments"] == 0
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_queued_events_replayed_after_crash(tmp_path):
+    """
+    Test bahwa batch yang sudah ter-fsync ke spool (sudah di-ack) tetap
+    tersimpan setelah restart walaupun belum sempat diterapkan.
+    """
+    db_path = str(tmp_path / "crash.db")
+    spool_dir = str(tmp_path / "spool")
+
+    # Proses pertama mati setelah ack, sebelum writer berjalan
+    spool = Spool(spool_dir)
+    spool.open()
+    await spool.append(make_batch("q", 5))
+    await spool.close()
+
+    store = SQLiteEventStore(db_path)
+    await store.initialize()
+    service = EventService(store, spool=Spool(spool_dir))
+    assert await service.replay_spool() == 5
+    assert len(await store.get_events("test.spool")) == 5
+    assert service.spool.stats()["segments"] == 0
+    await store.close()